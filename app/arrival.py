@@ -0,0 +1,206 @@
+import numpy as np
+from numpy import ndarray
+
+
+class ArrivalProcess:
+    """
+    Class describing how many vehicles arrive for a Direction each cycle
+
+    Subclasses implement sample(), which draws the arrivals for many cycles at once, so a whole run's arrivals can be
+    made in a single call. A process may keep track of how many cycles it has sampled, for arrivals that change over
+    the course of a run
+
+    Attributes
+        avg_flow: float for the average number of vehicles arriving per cycle
+    """
+    __slots__ = ()
+    avg_flow: float = 0
+
+    @property
+    def can_arrive(self) -> bool:
+        """
+        Finds if any vehicle could still arrive in a later sample. Processes that cannot tell always say so
+
+        :return: bool as described
+        """
+        return True
+
+    def sample(self, n_cycles: int, rng: np.random.Generator, replicas: int = None) -> ndarray:
+        """
+        Draws the number of vehicles arriving for each of the next cycles
+
+        :param n_cycles: int for the number of cycles to draw arrivals for
+        :param rng: Generator to draw from
+        :param replicas: int for the number of independent replicas to draw each cycle for, if None then one
+        :return: ndarray of non-negative ints, of shape (n_cycles,), or (n_cycles, replicas) if replicas is given
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _shape(n_cycles: int, replicas: int = None) -> tuple:
+        """
+        Finds the shape of a sample
+
+        :param n_cycles: int for the number of cycles sampled
+        :param replicas: int for the number of replicas sampled, if None then one
+        :return: tuple as described
+        """
+        assert isinstance(n_cycles, int) and n_cycles >= 0, "Number of cycles must be a non-negative integer!"
+        return (n_cycles,) if replicas is None else (n_cycles, replicas)
+
+
+class NormalArrivals(ArrivalProcess):
+    """
+    Arrivals following a normal distribution around an average flow, with a standard deviation of one vehicle. Draws
+    are rounded down and made positive, so the number of arrivals is never negative
+    """
+    __slots__ = ("avg_flow",)
+
+    def __init__(self, avg_flow: float = 0):
+        """
+        Initializer for a NormalArrivals object
+
+        :param avg_flow: float for the mean of the normal distribution
+        """
+        self.avg_flow = avg_flow
+
+    def sample(self, n_cycles: int, rng: np.random.Generator, replicas: int = None) -> ndarray:
+        noise = rng.standard_normal(ArrivalProcess._shape(n_cycles, replicas))
+        return np.abs(np.floor(self.avg_flow + noise)).astype(np.int64)
+
+
+class PoissonArrivals(ArrivalProcess):
+    """
+    Arrivals following a Poisson distribution, as for vehicles arriving independently of each other at a steady rate
+    """
+    __slots__ = ("avg_flow",)
+
+    def __init__(self, avg_flow: float = 0):
+        """
+        Initializer for a PoissonArrivals object
+
+        :param avg_flow: float for the rate of the Poisson distribution, the mean number of arrivals per cycle
+        """
+        assert avg_flow >= 0, "Rate must be non-negative!"
+        self.avg_flow = avg_flow
+
+    @property
+    def can_arrive(self) -> bool:
+        return self.avg_flow > 0
+
+    def sample(self, n_cycles: int, rng: np.random.Generator, replicas: int = None) -> ndarray:
+        return rng.poisson(self.avg_flow, ArrivalProcess._shape(n_cycles, replicas)).astype(np.int64)
+
+
+class TimeOfDayArrivals(ArrivalProcess):
+    """
+    Poisson arrivals whose rate follows a daily profile, such as a morning and an evening peak
+
+    The profile is piecewise constant, with time measured in cycles. Starting at each breakpoint the rate changes to
+    the matching rate, and the whole profile repeats every period cycles
+
+    Attributes
+        breakpoints: ndarray of ints for the cycle of the day each rate starts at, increasing from 0
+        rates: ndarray of floats for the rate from each breakpoint to the next
+        period: int for the number of cycles in a day
+        cycle: int for the number of cycles sampled so far, that the next sample starts from
+    """
+    __slots__ = ("breakpoints", "rates", "period", "cycle")
+
+    def __init__(self, breakpoints: list, rates: list, period: int, start: int = 0):
+        """
+        Initializer for a TimeOfDayArrivals object
+
+        :param breakpoints: list of ints for the cycle of the day each rate starts at. Must start at 0 and increase
+        :param rates: list of floats for the rate from each breakpoint to the next, each non-negative
+        :param period: int for the number of cycles in a day, more than the last breakpoint
+        :param start: int for the cycle of the day the first sample starts at
+        """
+        self.breakpoints = np.asarray(breakpoints, dtype=np.int64)
+        self.rates = np.asarray(rates, dtype=float)
+        assert self.breakpoints.size == self.rates.size > 0, "Each breakpoint must have a rate!"
+        assert self.breakpoints[0] == 0 and np.all(np.diff(self.breakpoints) > 0), \
+            "Breakpoints must start at 0 and increase!"
+        assert np.all(self.rates >= 0), "Rates must be non-negative!"
+        assert period > self.breakpoints[-1], "Period must be longer than the last breakpoint!"
+        self.period = period
+        self.cycle = start
+
+    @property
+    def avg_flow(self) -> float:
+        """
+        Finds the average number of arrivals per cycle over a whole day
+
+        :return: float as described
+        """
+        durations = np.diff(np.append(self.breakpoints, self.period))
+        return float(np.dot(durations, self.rates) / self.period)
+
+    @property
+    def can_arrive(self) -> bool:
+        return bool(self.rates.any())
+
+    def rates_for(self, cycles: ndarray) -> ndarray:
+        """
+        Finds the rate of arrivals at each of a number of cycles
+
+        :param cycles: ndarray of ints for the cycles, counted from the start of the first day
+        :return: ndarray of floats for the rates
+        """
+        return self.rates[np.searchsorted(self.breakpoints, cycles % self.period, side="right") - 1]
+
+    def sample(self, n_cycles: int, rng: np.random.Generator, replicas: int = None) -> ndarray:
+        shape = ArrivalProcess._shape(n_cycles, replicas)
+        rates = self.rates_for(np.arange(self.cycle, self.cycle + n_cycles))
+        self.cycle += n_cycles
+        return rng.poisson(rates.reshape((n_cycles,) + (1,) * (len(shape) - 1)), shape).astype(np.int64)
+
+
+class ReplayArrivals(ArrivalProcess):
+    """
+    Arrivals replayed from recorded counts, such as those from a detector on the approach
+
+    Attributes
+        counts: ndarray of ints for the recorded number of arrivals in each cycle
+        loop: bool for if the counts start again from the beginning once they run out
+        cycle: int for the number of cycles sampled so far, that the next sample starts from
+    """
+    __slots__ = ("counts", "loop", "cycle")
+
+    def __init__(self, counts: list, loop: bool = True):
+        """
+        Initializer for a ReplayArrivals object
+
+        :param counts: list of non-negative ints for the recorded number of arrivals in each cycle
+        :param loop: bool for if the counts should start again from the beginning once they run out, otherwise no
+        vehicles arrive past the end
+        """
+        self.counts = np.asarray(counts, dtype=np.int64)
+        assert self.counts.size > 0 and np.all(self.counts >= 0), "Counts must be non-empty and non-negative!"
+        self.loop = loop
+        self.cycle = 0
+
+    @property
+    def avg_flow(self) -> float:
+        """
+        Finds the average number of arrivals per cycle of the recorded counts
+
+        :return: float as described
+        """
+        return float(self.counts.mean())
+
+    @property
+    def can_arrive(self) -> bool:
+        return bool(self.counts.any() if self.loop else self.counts[self.cycle:].any())
+
+    def sample(self, n_cycles: int, rng: np.random.Generator, replicas: int = None) -> ndarray:
+        shape = ArrivalProcess._shape(n_cycles, replicas)
+        if self.loop:
+            counts = self.counts[np.arange(self.cycle, self.cycle + n_cycles) % self.counts.size]
+        else:
+            # Arrivals are drawn ahead, so a sample past the end is padded with no arrivals
+            counts = np.zeros(n_cycles, dtype=np.int64)
+            left = self.counts[self.cycle:self.cycle + n_cycles]
+            counts[:left.size] = left
+        self.cycle += n_cycles
+        return counts if replicas is None else np.repeat(counts[:, np.newaxis], replicas, axis=1)
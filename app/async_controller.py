@@ -0,0 +1,157 @@
+import asyncio
+
+from app.controller import Controller
+from app.intersection import Intersection
+from app.signal_policy import SignalPolicy
+
+
+class AsyncController(Controller):
+    """
+    Class to control an Intersection in real time on an asyncio event loop
+
+    Each cycle is decided as soon as it starts, so the lights can be set, and the coroutine then awaits for as long as
+    the cycle lasts, leaving the event loop free to pace other intersections meanwhile. Rather than sleeping for the
+    duration of each cycle in turn, which lets the small lateness of every wake up add up over a run, each cycle is
+    given a deadline measured from the start of the run, and is waited for until that deadline
+
+    A cycle is run and waited for by cycle_async, while cycle is left as for any Controller, running a cycle without
+    waiting for it
+
+    Attributes
+        time_scale: float for the number of real seconds that each second of the intersection takes
+        max_lateness: float for the most that a cycle has finished after its deadline, in real seconds
+    """
+
+    def __init__(self, _intersection: Intersection, _pass_durr, time_scale: float = 1.0, policy: SignalPolicy = None):
+        """
+        Initializer for an AsyncController object
+
+        :param _intersection: Intersection object to be set to this object
+        :param _pass_durr: int for the length of time that it takes for a car to exit the intersection being controlled
+        :param time_scale: float for the number of real seconds that each second of the intersection takes, must be
+        positive
+        :param policy: SignalPolicy object to pick the Direction to be emptied each cycle, if None then Directions are
+        emptied in turn
+        """
+        super().__init__(_intersection, _pass_durr, policy)
+        assert time_scale > 0, "Time scale must be positive!"
+        self.time_scale = time_scale
+        self.max_lateness = 0.0
+        self.__epoch = None
+        self.__epoch_clock = 0.0
+
+    def start_pacing(self, epoch: float = None) -> None:
+        """
+        Starts measuring the deadlines of cycles from a time of the event loop, with the current time of the
+        intersection falling at it
+
+        :param epoch: float for the time of the running event loop to measure from, if None then its current time
+        :return: None
+        """
+        self.__epoch = asyncio.get_running_loop().time() if epoch is None else epoch
+        self.__epoch_clock = self.intersection.clock
+
+    async def cycle_async(self) -> float:
+        """
+        Handles cycling through to the next direction, emptying this direction, then waiting in real time for the cycle
+        to finish
+
+        :return: float for the lateness of the cycle, in real seconds
+        """
+        if self.__epoch is None:
+            self.start_pacing()
+        self.run(1)
+        loop = asyncio.get_running_loop()
+        deadline = self.__epoch + (self.intersection.clock - self.__epoch_clock) * self.time_scale
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        lateness = max(0.0, loop.time() - deadline)
+        self.max_lateness = max(self.max_lateness, lateness)
+        return lateness
+
+    async def run_async(self, n_cycles: int = None, until_time: float = None, report=None, epoch: float = None) -> int:
+        """
+        Runs this Controller in real time, for either a number of cycles or until a time is reached
+
+        :param n_cycles: int for the number of cycles to be run, must be given if until_time is not
+        :param until_time: float for the time of the intersection to run until, must be given if n_cycles is not
+        :param report: function taking this Controller, called after every cycle, such as to set live signals
+        :param epoch: float for the time of the running event loop that the run is paced from, if None then its
+        current time
+        :return: int for the number of cycles that were run
+        """
+        assert (n_cycles is None) != (until_time is None), "Exactly one of n_cycles and until_time must be given!"
+        assert n_cycles is None or (isinstance(n_cycles, int) and n_cycles >= 0), \
+            "Number of cycles must be an integer greater than or equal to zero!"
+        self.start_pacing(epoch)
+        cycles = 0
+        while cycles < n_cycles if n_cycles is not None else self.intersection.clock < until_time:
+            await self.cycle_async()
+            cycles += 1
+            if report is not None:
+                report(self)
+        return cycles
+
+
+class Supervisor:
+    """
+    Class to run many AsyncControllers concurrently on one event loop, such as for a corridor of live signals
+
+    Every controller is paced from the same epoch, so intersections that start together stay in step with each other
+    and with the wall clock however long they run
+
+    Attributes
+        controllers: list of AsyncController objects being supervised
+    """
+
+    def __init__(self, controllers: list = ()):
+        """
+        Initializer for a Supervisor object
+
+        :param controllers: list of AsyncController objects to be supervised
+        """
+        self.controllers = []
+        for controller in controllers:
+            self.add_controller(controller)
+
+    def add_controller(self, controller: AsyncController) -> None:
+        """
+        Adds a controller to be supervised from the next run
+
+        :param controller: AsyncController object to be added
+        :return: None
+        """
+        assert isinstance(controller, AsyncController), "Controller must be an AsyncController!"
+        self.controllers.append(controller)
+
+    @property
+    def max_lateness(self) -> float:
+        """
+        Finds the most that any cycle of any controller has finished after its deadline
+
+        :return: float for the lateness in real seconds, zero if there are no controllers
+        """
+        return max((controller.max_lateness for controller in self.controllers), default=0.0)
+
+    async def run_async(self, n_cycles: int = None, until_time: float = None, report=None) -> list:
+        """
+        Runs every controller concurrently in real time, for either a number of cycles or until a time is reached
+
+        :param n_cycles: int for the number of cycles each controller runs, must be given if until_time is not
+        :param until_time: float for the time of the intersections to run until, must be given if n_cycles is not
+        :param report: function taking a controller, called after every cycle of every controller
+        :return: list of ints for the number of cycles each controller ran
+        """
+        epoch = asyncio.get_running_loop().time()
+        return list(await asyncio.gather(*(controller.run_async(n_cycles, until_time, report, epoch)
+                                           for controller in self.controllers)))
+
+    def run(self, n_cycles: int = None, until_time: float = None, report=None) -> list:
+        """
+        Runs every controller concurrently in real time on a new event loop, blocking until they have all finished
+
+        :param n_cycles: int for the number of cycles each controller runs, must be given if until_time is not
+        :param until_time: float for the time of the intersections to run until, must be given if n_cycles is not
+        :param report: function taking a controller, called after every cycle of every controller
+        :return: list of ints for the number of cycles each controller ran
+        """
+        return asyncio.run(self.run_async(n_cycles, until_time, report))
@@ -16,6 +16,7 @@ class CommandLine:
         """
         self.controller = controller
         self.intersection = controller.intersection
+        self.wants_auto = False
 
     def start(self) -> None:
         """
@@ -27,9 +28,27 @@ class CommandLine:
         """
         if CommandLine.__wants_to_start():
             self.setup()
-            self.__cycle_manual()
+            if self.wants_auto:
+                self.__cycle_auto()
+            else:
+                self.__cycle_manual()
         self.__exit()
 
+    def run_headless(self, n_cycles: int = None, until_time: float = None, report_every: int = None) -> None:
+        """
+        Runs this application without asking a user anything, for either a number of cycles or until a time is reached
+
+        Only a summary of the state every report_every cycles, and at the end of the run, is displayed
+
+        :param n_cycles: int for the number of cycles to be run, must be given if until_time is not
+        :param until_time: float for the time of the intersection to run until, must be given if n_cycles is not
+        :param report_every: int for the number of cycles between each summary, if None then only the final one is shown
+        :return: None
+        """
+        cycles = self.controller.run(n_cycles, until_time, report_every, lambda controller: self.__display_summary())
+        if report_every is None or cycles % report_every != 0:
+            self.__display_summary()
+
     def setup(self) -> None:
         """
         Handles setting up this application, after a user has indicated that they would like to start
@@ -37,7 +56,7 @@ class CommandLine:
         :return: None
         """
         self.controller.should_wait = self.wants_to_wait()
-        #self.wants_auto = self.__wants_to_automate()
+        self.wants_auto = self.__wants_to_automate()
 
     def __wants_to_automate(self) -> bool:
         """
@@ -73,11 +92,30 @@ class CommandLine:
             .format(num_vehicles, avg_waiting_time)
         print(msg)
 
+    def __display_summary(self) -> None:
+        """
+        Displays a summary of the state of this application during a run, along with how far through the run it is
+
+        :return: None
+        """
+        print("Cycle {}, time {:.0f}: ".format(self.controller.num_cycles, self.intersection.clock), end="")
+        self.__display_state()
+
     def __cycle_auto(self) -> None:
+        """
+        Automatically cycles through each direction for the intersection being managed, without asking a user to
+        continue, until they stop it with a keyboard interrupt
+
+        :return: None
+        """
         self.__display_state()
-        self.controller.cycle()
-        #self.cy
-        pass
+        print("Press Ctrl+C to stop")
+        try:
+            while True:
+                self.controller.cycle()
+                self.__display_state()
+        except KeyboardInterrupt:
+            pass
 
     def __cycle_manual(self) -> None:
         """
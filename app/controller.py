@@ -1,5 +1,13 @@
+import copy
+
+import numpy as np
+
+from app import kernels
 from app.intersection import Intersection
 from app.direction import Direction
+from app.instrument import Instruments
+from app.signal_policy import SignalPolicy, RoundRobin, PhasePlan
+from app.trace import TraceRecorder
 
 
 class Controller:
@@ -9,22 +17,35 @@ class Controller:
     Attributes
         intersection: Intersection object that is being controlled
         pass_durr: int for the amount of time that it takes for a vehicle to exit an intersection
-        next_direction: Direction object for the next Direction that will be emptied
+        next_direction: Direction object for the next Direction in the linked list after the one last emptied, that
+        will be emptied next under a RoundRobin policy, or the Phase to be served next under a PhasePlan
+        policy: SignalPolicy object that picks the Direction to be emptied each cycle, and how many vehicles to empty
         should_wait: bool for if a user would like to wait in real time for a cycle to finish or not. Sleep refers to
         actually sleeping the application using sleep(time)
+        num_cycles: int for the number of cycles that have been completed
+        trace: TraceRecorder object that a row is recorded to at the end of every cycle, if None then nothing is recorded
+        instruments: Instruments object that each phase of every cycle is timed with, if None then nothing is timed.
+        The kernels are warmed up when it is set, so compiling them is not timed
     """
     __should_wait : bool = False
 
-    def __init__(self, _intersection: Intersection, _pass_durr):
+    def __init__(self, _intersection: Intersection, _pass_durr, policy: SignalPolicy = None):
         """
         Initializer for a Controller object
 
         :param _intersection: Intersection object to be set to this object
         :param _pass_durr: int for the length of time that it takes for a car to exit the intersection being controlled
+        :param policy: SignalPolicy object to pick the Direction to be emptied each cycle, if None then Directions are
+        emptied in turn
         """
         self.intersection: Intersection = _intersection
         self.pass_durr = _pass_durr
         self.next_direction = _intersection.head_direction
+        self.policy = policy if policy is not None else RoundRobin()
+        self.num_cycles = 0
+        self.trace: TraceRecorder = None
+        self.__instruments: Instruments = None
+        self.__served: Direction = None
 
     def cycle(self) -> None:
         """
@@ -32,9 +53,175 @@ class Controller:
 
         :return: None
         """
-        prev_cycle_durr = self.__start_cycle(self.next_direction)
+        prev_cycle_durr = self.__start_cycle()
         self.__end_cycle(prev_cycle_durr)
 
+    def run(self, n_cycles: int = None, until_time: float = None, report_every: int = None, report=None) -> int:
+        """
+        Runs this Controller without any interaction, for either a number of cycles or until a time is reached
+
+        Cycles are completed as fast as possible, never sleeping regardless of should_wait, and nothing is output other
+        than through report
+
+        Under a RoundRobin policy, with nothing traced or timed, a number of cycles are run a block of arrivals at a
+        time by kernels.run_cycles, which only returns to Python between blocks when Numba is installed
+
+        :param n_cycles: int for the number of cycles to be run, must be given if until_time is not
+        :param until_time: float for the time of the intersection to run until, must be given if n_cycles is not
+        :param report_every: int for the number of cycles between each call of report, if None then it is never called
+        :param report: function taking this Controller, called every report_every cycles
+        :return: int for the number of cycles that were run
+        """
+        assert (n_cycles is None) != (until_time is None), "Exactly one of n_cycles and until_time must be given!"
+        assert n_cycles is None or (isinstance(n_cycles, int) and n_cycles >= 0), \
+            "Number of cycles must be an integer greater than or equal to zero!"
+        assert report_every is None or (isinstance(report_every, int) and report_every > 0 and report is not None), \
+            "Report interval must be a positive integer, with a function to report to!"
+        if n_cycles is not None and self.__can_run_fused():
+            return self.__run_fused(n_cycles, report_every, report)
+        cycles = 0
+        while cycles < n_cycles if n_cycles is not None else self.intersection.clock < until_time:
+            self.__end_cycle(self.__start_cycle(should_sleep=False))
+            cycles += 1
+            if report_every is not None and cycles % report_every == 0:
+                if self.instruments is not None:
+                    self.instruments.start()
+                report(self)
+                if self.instruments is not None:
+                    self.instruments.lap("report")
+        return cycles
+
+    def __can_run_fused(self) -> bool:
+        """
+        Finds if cycles of this Controller can be run by kernels.run_cycles, giving the same run as one at a time
+
+        :return: bool as described
+        """
+        return type(self.policy) is RoundRobin and self.trace is None and self.instruments is None \
+            and not self.intersection.state.lanes and self.next_direction in self.intersection
+
+    def __run_fused(self, n_cycles: int, report_every: int = None, report=None) -> int:
+        """
+        Runs a number of cycles of this Controller with kernels.run_cycles, a block of arrivals at a time, stopping
+        between blocks to report every report_every cycles
+
+        :param n_cycles: int for the number of cycles to be run
+        :param report_every: int for the number of cycles between each call of report, if None then it is never called
+        :param report: function taking this Controller, called every report_every cycles
+        :return: int for the number of cycles that were run
+        """
+        intersection, state = self.intersection, self.intersection.state
+        directions, following = intersection.directions, intersection.following
+        index = self.next_direction.index
+        cycles = 0
+        while cycles < n_cycles:
+            if state.arrival_pos == state.arrival_block.shape[0]:
+                intersection.draw_arrivals()
+            num_cycles = min(n_cycles - cycles, state.arrival_block.shape[0] - state.arrival_pos)
+            if report_every is not None:
+                num_cycles = min(num_cycles, report_every - cycles % report_every)
+            index, served_rows, volumes, waits = kernels.run_cycles(state, num_cycles, following, index, self.pass_durr)
+            # The delays of each Direction are added together, in the order its vehicles were served
+            owners = np.repeat(served_rows, volumes)
+            counts = np.bincount(owners, minlength=len(directions))
+            bounds = np.concatenate(([0], np.cumsum(counts)))
+            waits = waits[np.argsort(owners, kind="stable")]
+            for row in np.flatnonzero(counts):
+                directions[row].delays.add(waits[bounds[row]:bounds[row + 1]])
+            cycles += num_cycles
+            self.num_cycles += num_cycles
+            self.__served = directions[served_rows[-1]]
+            self.next_direction = directions[index]
+            if report_every is not None and cycles % report_every == 0:
+                report(self)
+        return cycles
+
+    def snapshot(self) -> bytes:
+        """
+        Takes a snapshot of the state of the run of this Controller, the state of its Intersection along with its next
+        direction and number of cycles
+
+        :return: bytes of the snapshot, as taken by Intersection.snapshot
+        """
+        return self.intersection.snapshot(self.next_direction, self.num_cycles)
+
+    def restore(self, blob) -> None:
+        """
+        Restores the state of the run of this Controller from a snapshot, so it carries on exactly as it would have from
+        when the snapshot was taken
+
+        :param blob: bytes of a snapshot, taken from a Controller of an Intersection with as many Directions, or the
+        dict of arrays found from it by Intersection.load_snapshot
+        :return: None
+        """
+        arrays = blob if isinstance(blob, dict) else Intersection.load_snapshot(blob)
+        next_direction, self.num_cycles = self.intersection.restore(arrays)
+        self.next_direction = next_direction if next_direction is not None else self.intersection.head_direction
+        next_phase = int(arrays.get("next_phase", -1))
+        if next_phase >= 0 and isinstance(self.policy, PhasePlan):
+            self.next_direction = self.policy.resolve(self.intersection)[next_phase]
+
+    def fork(self, blob=None, rng: np.random.Generator = None):
+        """
+        Makes a new Controller, of a new Intersection like the one of this Controller, with the state of a snapshot
+
+        Only the snapshot is copied, so many branches can be cheaply forked from one warm state taken once, best
+        decoded once with Intersection.load_snapshot too. A branch shares the policy of this Controller but no state with
+        it, and is not traced
+
+        :param blob: bytes of a snapshot to fork from, or the dict of arrays found from it by
+        Intersection.load_snapshot, if None then one is taken of this Controller as it is now
+        :param rng: Generator to spawn new streams of arrivals for each Direction of the branch from, so branches take
+        different paths. If None then the branch draws the same arrivals as this Controller would have
+        :return: Controller object for the branch
+        """
+        blob = blob if blob is not None else self.snapshot()
+        directions = [Direction(direction.name, [], 0, direction.cycle_size, _arrivals=copy.deepcopy(direction.arrivals),
+                                _lanes=copy.deepcopy(direction.lanes))
+                      for direction in self.intersection.directions]
+        order = [direction.index for direction in self.intersection]
+        branch = Controller(Intersection.from_directions(directions, order=order), self.pass_durr, self.policy)
+        branch.restore(blob)
+        if rng is not None:
+            branch.intersection.rng = rng
+            for direction, child in zip(directions, rng.spawn(len(directions))):
+                direction.rng = child
+        return branch
+
+    @property
+    def instruments(self) -> Instruments:
+        """
+        Getter method for the Instruments that each phase of every cycle is timed with
+
+        :return: Instruments object as described, None if nothing is timed
+        """
+        return self.__instruments
+
+    @instruments.setter
+    def instruments(self, new_instruments: Instruments) -> None:
+        """
+        Setter method for the Instruments that each phase of every cycle is timed with. The kernels are warmed up first,
+        so the first cycle timed is not charged for compiling them under Numba
+
+        :param new_instruments: Instruments object to be set, None to stop timing
+        :return: None
+        """
+        if new_instruments is not None:
+            Controller.warm_up()
+        self.__instruments = new_instruments
+
+    @staticmethod
+    def warm_up() -> None:
+        """
+        Runs a few cycles of a small throwaway Controller, one at a time, so every kernel a cycle calls has been
+        compiled for the current backend
+
+        :return: None
+        """
+        controller = Controller(Intersection.from_arrays(["North", "East"], [[3, 2, 1], [2, 1]], [1, 1]), 1)
+        for i in range(4):
+            controller.cycle()
+
     @property
     def should_wait(self) -> bool:
         """
@@ -55,14 +242,34 @@ class Controller:
         assert isinstance(new_val, bool)
         self.__should_wait = new_val
 
-    def __start_cycle(self, next_direction: Direction) -> None:
+    def __start_cycle(self, should_sleep: bool = None) -> float:
         """
-        Handles starting the next cycle of traffic from a direction
+        Handles starting the next cycle of traffic, from the direction picked by the policy
 
-        :param next_direction: Direction object to be emptied
-        :return:
+        :param should_sleep: bool for if the cycle should be waited for in real time, if None then should_wait is used
+        :return: float for the duration of the cycle
         """
-        cycle_durr = next_direction.cycle(self.pass_durr, should_sleep=self.should_wait)
+        if should_sleep is None:
+            should_sleep = self.should_wait
+        instruments = self.instruments
+        if instruments is None:
+            direction, volume = self.policy.choose(self)
+        elif type(self.policy).choose is SignalPolicy.choose:
+            # The cycle volume is timed apart from picking the Direction
+            instruments.start()
+            direction = self.policy.pick(self)
+            instruments.lap("choose")
+            volume = self.policy.volume(direction)
+            instruments.lap("cycle_volume")
+        else:
+            instruments.start()
+            direction, volume = self.policy.choose(self)
+            instruments.lap("choose")
+        cycle_durr = direction.cycle(self.pass_durr, should_sleep=should_sleep, volume=volume)
+        if instruments is not None:
+            instruments.lap("discharge")
+        self.next_direction = direction.next
+        self.__served = direction
         return cycle_durr
 
     def __end_cycle(self, prev_cycle_durr) -> None:
@@ -72,6 +279,17 @@ class Controller:
         :param prev_cycle_durr: float for the length of the previous cycle of traffic
         :return: None
         """
+        instruments = self.instruments
         self.intersection.add_waiting_time(prev_cycle_durr)
+        if instruments is not None:
+            instruments.lap("add_waiting_time")
         self.intersection.add_vehicles()
-        self.next_direction = self.next_direction.next
+        if instruments is not None:
+            instruments.lap("add_vehicles")
+        self.num_cycles += 1
+        if self.trace is not None:
+            state = self.intersection.state
+            self.trace.record(self.num_cycles, state.clock, self.__served.index, prev_cycle_durr, state.lengths,
+                              state.cum_waiting_times())
+            if instruments is not None:
+                instruments.lap("trace")
@@ -1,7 +1,15 @@
+import json
 from time import sleep
 import numpy as np
 from numpy import ndarray
 
+from app.arrival import ArrivalProcess, NormalArrivals
+from app.intersection_state import IntersectionState
+from app.metrics import DelayStats
+
+NO_ARRIVALS = np.empty(0, dtype=np.int64)
+NO_ARRIVALS.flags.writeable = False
+
 
 class Direction:
     """
@@ -11,16 +19,34 @@ class Direction:
 
     Directions form nodes in a circular linked list that makes up a complete intersection
 
+    A Direction does not hold its queue of vehicles itself, it is a view over a row of an IntersectionState. Until it
+    is added to an Intersection, a Direction is the only row of an IntersectionState of its own
+
+    A Direction can have several lanes, each for a movement such as turning left, that discharge in parallel at their
+    own saturation flows. Their queues are held by a Lanes object, which the IntersectionState passes every operation on
+    the row of this Direction on to. A Direction of a single lane has none, and takes the same path as it always has
+
+    As a network can have very many Directions, their attributes are kept in slots rather than a dict, and those with
+    no arrivals drawn ahead share a single empty buffer
+
     Attributes
         next: the next Direction object in the linked list as described
         waiting_times: ndarray representing the waiting times of each of the vehicles in this intersection
         name: str for the name of this intersection
+        state: IntersectionState object that holds the queue of this Direction
+        index: int for the row of state that belongs to this Direction
+        rng: Generator that the arrivals of this Direction are drawn from
+        arrivals: ArrivalProcess that the number of vehicles arriving each cycle follows
+        delays: DelayStats object of how long each vehicle served from this Direction had waited
+        lanes: Lanes object for the lanes of this Direction, None if it has a single lane
     """
-    next = None
-    waiting_times: ndarray = None
-    __name: str = None
+    __slots__ = ("next", "state", "index", "delays", "__name", "__rng", "__seed", "__arrivals", "__buffered",
+                 "__buffered_pos")
+    ARRIVAL_BLOCK: int = 4096
 
-    def __init__(self, _name: str, _waiting_times: list = [], _avg_flow: int = 0, _cycle_size: int = 0.5):
+    def __init__(self, _name: str, _waiting_times: list = [], _avg_flow: int = 0, _cycle_size: int = 0.5,
+                 _rng: np.random.Generator = None, _arrivals: ArrivalProcess = None, _state: IntersectionState = None,
+                 _index: int = 0, _lanes=None):
         """
         Initializer for a Direction object
 
@@ -28,11 +54,232 @@ class Direction:
         :param _waiting_times: list for the current waiting times for this direction
         :param _avg_flow: int for the average flow for this Direction per cycle
         :param _cycle_size: float for the proportion of vehicles to be emptied from this intersection per cycle
+        :param _rng: Generator for the arrivals of this Direction, or a seed for one, anything accepted by
+        np.random.default_rng. A seed is only turned into a Generator once arrivals are first drawn, so building many
+        Directions stays cheap. If None then a freshly seeded one is used
+        :param _arrivals: ArrivalProcess for the arrivals of this Direction, if None then they follow a normal
+        distribution around _avg_flow
+        :param _state: IntersectionState object that already holds the queue of this Direction, to be viewed rather
+        than copying _waiting_times into a state of its own, as when many Directions are built at once
+        :param _index: int for the row of _state that belongs to this Direction
+        :param _lanes: Lanes object for the lanes of this Direction, the vehicles already queued being divided between
+        them. If None then this Direction has a single lane
         """
+        self.next = None
         self.__name: str = _name
-        self.waiting_times = np.array(_waiting_times)
-        self.avg_flow: int = _avg_flow
+        self.__rng = _rng if isinstance(_rng, np.random.Generator) else None
+        self.__seed = _rng
+        self.__arrivals = _arrivals if _arrivals is not None else NormalArrivals(_avg_flow)
+        self.delays = DelayStats()
+        if _state is None:
+            self.bind(IntersectionState([_waiting_times], [self.__arrivals.avg_flow], [0.5]), 0)
+        else:
+            self.bind(_state, _index)
+            _state.avg_flows[_index] = self.__arrivals.avg_flow
         self.cycle_size = _cycle_size
+        if _lanes is not None:
+            self.state.set_lanes(self.index, _lanes)
+        self.__redraw()
+
+    def bind(self, state: IntersectionState, index: int) -> None:
+        """
+        Makes this Direction a view over a row of an IntersectionState
+
+        The row must already hold the queue of this Direction, this method does not copy anything
+
+        :param state: IntersectionState object to be viewed
+        :param index: int for the row of state that belongs to this Direction
+        :return: None
+        """
+        self.state = state
+        self.index = index
+
+    @property
+    def lanes(self):
+        """
+        Getter method for the lanes of this Direction
+
+        :return: Lanes object as described, None if this Direction has a single lane
+        """
+        return self.state.lanes_of(self.index)
+
+    @property
+    def rng(self) -> np.random.Generator:
+        """
+        Getter method for the Generator that the arrivals of this Direction are drawn from
+
+        :return: Generator as described
+        """
+        if self.__rng is None:
+            self.__rng = np.random.default_rng(self.__seed)
+        return self.__rng
+
+    @rng.setter
+    def rng(self, new_rng: np.random.Generator) -> None:
+        """
+        Setter method for the Generator that the arrivals of this Direction are drawn from. Any arrivals already drawn
+        from the previous Generator are drawn again
+
+        :param new_rng: Generator to be set
+        :return: None
+        """
+        self.__rng = new_rng
+        self.__redraw(rewind=True)
+
+    @property
+    def arrivals(self) -> ArrivalProcess:
+        """
+        Getter method for the ArrivalProcess that the arrivals of this Direction follow
+
+        :return: ArrivalProcess as described
+        """
+        return self.__arrivals
+
+    @arrivals.setter
+    def arrivals(self, new_arrivals: ArrivalProcess) -> None:
+        """
+        Setter method for the ArrivalProcess that the arrivals of this Direction follow. Any arrivals already drawn
+        from the previous ArrivalProcess are drawn again
+
+        :param new_arrivals: ArrivalProcess to be set
+        :return: None
+        """
+        assert isinstance(new_arrivals, ArrivalProcess), "Arrivals must be an ArrivalProcess!"
+        self.__arrivals = new_arrivals
+        self.state.avg_flows[self.index] = new_arrivals.avg_flow
+        self.__redraw()
+
+    @property
+    def can_arrive(self) -> bool:
+        """
+        Finds if any vehicle could still arrive for this Direction, either among the arrivals already drawn ahead or
+        from its ArrivalProcess
+
+        :return: bool as described
+        """
+        return bool(self.__buffered[self.__buffered_pos:].any()) or self.__arrivals.can_arrive
+
+    def take_arrivals(self, n: int) -> ndarray:
+        """
+        Takes the number of vehicles arriving for this Direction for each of the next cycles
+
+        Arrivals are sampled from the ArrivalProcess ahead of time and handed out from a buffer, rather than one cycle at
+        a time. A single cycle is sampled a block of ARRIVAL_BLOCK at a time, while larger requests, as made by an
+        Intersection for all its Directions at once, are sampled just as needed, so no Direction holds on to a large
+        buffer
+
+        :param n: int for the number of cycles to take arrivals for
+        :return: ndarray of ints for the arrivals, in order of cycle
+        """
+        available = self.__buffered.size - self.__buffered_pos
+        if available < n:
+            fresh = self.__arrivals.sample(Direction.ARRIVAL_BLOCK if n == 1 else n - available, self.rng)
+            self.__buffered = np.concatenate((self.__buffered[self.__buffered_pos:], fresh))
+            self.__buffered_pos = 0
+        arrivals = self.__buffered[self.__buffered_pos:self.__buffered_pos + n]
+        self.__buffered_pos += n
+        if self.__buffered_pos == self.__buffered.size:
+            self.__buffered = NO_ARRIVALS
+            self.__buffered_pos = 0
+        return arrivals
+
+    def snapshot(self) -> dict:
+        """
+        Copies the state of the arrivals and delays of this Direction into a dict of arrays, so it can be restored later
+
+        The state of the Generator is kept as json, along with the arrivals already drawn but not yet taken, and the
+        number of cycles sampled by the ArrivalProcess if it keeps track of them. The queue itself belongs to the
+        IntersectionState, and is not included
+
+        :return: dict mapping the name of each field to an ndarray
+        """
+        snapshot = {"rng": np.array(json.dumps(self.rng.bit_generator.state)),
+                    "buffered": self.__buffered[self.__buffered_pos:].copy(),
+                    "arrival_cycle": np.array(getattr(self.__arrivals, "cycle", -1))}
+        for name, value in self.delays.snapshot().items():
+            snapshot["delays_" + name] = value
+        return snapshot
+
+    def restore(self, snapshot: dict) -> None:
+        """
+        Replaces the state of the arrivals and delays of this Direction with a snapshot
+
+        A new Generator is made from the state kept, so a Direction restored from the same snapshot as another never
+        shares a Generator with it
+
+        :param snapshot: dict of arrays as made by snapshot
+        :return: None
+        """
+        state = json.loads(str(snapshot["rng"]))
+        bit_generator = getattr(np.random, state["bit_generator"])()
+        bit_generator.state = state
+        self.__rng = np.random.Generator(bit_generator)
+        self.__buffered = np.array(snapshot["buffered"], dtype=np.int64)
+        self.__buffered_pos = 0
+        if hasattr(self.__arrivals, "cycle"):
+            self.__arrivals.cycle = int(snapshot["arrival_cycle"])
+        self.delays.restore({name[len("delays_"):]: value for name, value in snapshot.items()
+                             if name.startswith("delays_")})
+
+    def __redraw(self, rewind: bool = False) -> None:
+        """
+        Discards any arrivals of this Direction drawn ahead of time, so they are drawn again when next needed. This
+        includes those already taken by the Intersection this Direction belongs to for cycles still to come
+
+        :param rewind: bool for if the ArrivalProcess is wound back by the number of cycles discarded, if it keeps track
+        of them, so they are drawn again from the same point in its schedule
+        :return: None
+        """
+        remaining = self.state.arrival_block.shape[0] - self.state.arrival_pos
+        if rewind and hasattr(self.__arrivals, "cycle"):
+            self.__arrivals.cycle -= self.__buffered.size - self.__buffered_pos + max(remaining, 0)
+        self.__buffered = NO_ARRIVALS
+        self.__buffered_pos = 0
+        if remaining > 0:
+            self.state.arrival_block[self.state.arrival_pos:, self.index] = self.take_arrivals(remaining)
+
+    @property
+    def waiting_times(self) -> ndarray:
+        """
+        Getter method for the waiting times of the vehicles in this Direction, from the front of the queue to the back
+
+        :return: ndarray, a copy of the waiting times as described
+        """
+        return self.state.queue(self.index)
+
+    @waiting_times.setter
+    def waiting_times(self, new_waiting_times) -> None:
+        """
+        Setter method for the waiting times of the vehicles in this Direction
+
+        :param new_waiting_times: array-like for the new waiting times, from the front of the queue to the back
+        :return: None
+        """
+        self.state.set_queue(self.index, new_waiting_times)
+
+    @property
+    def avg_flow(self) -> float:
+        """
+        Getter method for the average flow of vehicles per cycle for this Direction
+
+        :return: float for the average flow
+        """
+        return float(self.state.avg_flows[self.index])
+
+    @avg_flow.setter
+    def avg_flow(self, val: float) -> None:
+        """
+        Setter method for the average flow of vehicles per cycle for this Direction
+
+        Sets the average flow of the ArrivalProcess of this Direction, which must allow it to be set, and draws any
+        arrivals already drawn again
+
+        :param val: float for the new average flow
+        :return: None
+        """
+        self.__arrivals.avg_flow = val
+        self.state.avg_flows[self.index] = val
+        self.__redraw()
 
     @property
     def cycle_size(self) -> float:
@@ -41,7 +288,7 @@ class Direction:
 
         :return: float for cycle size
         """
-        return self.__cycle_size
+        return float(self.state.cycle_sizes[self.index])
 
     @cycle_size.setter
     def cycle_size(self, val: float) -> None:
@@ -54,7 +301,7 @@ class Direction:
         :return:
         """
         assert isinstance(val, float) and 0 < val < 1
-        self.__cycle_size = val
+        self.state.cycle_sizes[self.index] = val
 
     @property
     def cum_waiting_time(self) -> int:
@@ -63,7 +310,7 @@ class Direction:
 
         :return: int for the total waiting time of this intersection
         """
-        return np.sum(self.waiting_times)
+        return self.state.cum_waiting_time(self.index)
 
     @property
     def name(self) -> str:
@@ -92,21 +339,34 @@ class Direction:
         """
         return self.num_vehicles == 0
 
-    def cycle(self, p, should_sleep : bool = False) -> float:
+    def cycle(self, p, should_sleep : bool = False, volume: int = None, movements: list = None) -> float:
         """
         Empties this direction for the required volume as specified by self.cycle_volume()
 
+        If this Direction has lanes, every lane served is emptied at once, each for its own cycle volume, and the cycle
+        lasts as long as the slowest of them takes to discharge at its saturation flow
+
         :param p: the required time for a single vehicle to exit the intersection given a green light
         :param should_sleep bool if a user would like to sleep the application in real time to reflect the passing of
         traffic through the intersection. Useful for doing integration and performance testing
+        :param volume: int for the number of vehicles to be emptied, at most the number queued, if None then the cycle
+        volume is emptied
+        :param movements: list of str for the movements of the lanes to be served, if None then every lane is. Ignored
+        if this Direction has a single lane
         :return: float for the total length of this cycle for this direction. Used to add waiting times to the rest of
         vehicles that are still waiting their turn
         """
         cycle_durr = 0
         if not self.is_empty:
-            cycle_volume = self.cycle_volume()
-            cycle_durr = cycle_volume * p
-            self.waiting_times = self.waiting_times[cycle_volume:]
+            lanes = self.state.lanes_of(self.index)
+            if lanes is None:
+                cycle_volume = self.cycle_volume() if volume is None else volume
+                cycle_durr = cycle_volume * p
+                self.delays.add(self.state.dequeue(self.index, cycle_volume))
+            else:
+                volumes = lanes.allot(volume, movements)
+                cycle_durr = lanes.green_time(volumes) * p
+                self.delays.add(self.state.discharge(self.index, volumes))
             if should_sleep:
                 sleep(cycle_durr)
         return cycle_durr + 2  # To account for time to switch between directions
@@ -118,7 +378,15 @@ class Direction:
 
         :return: integer as described
         """
-        return self.waiting_times.size
+        return int(self.state.lengths[self.index])
+
+    def __len__(self) -> int:
+        """
+        Returns the number of vehicles in this direction
+
+        :return: integer as described
+        """
+        return self.num_vehicles
 
     def add_waiting_time(self, waiting_time) -> None:
         """
@@ -127,7 +395,7 @@ class Direction:
         :param waiting_time: the waiting time to be added to all cars for this direction
         :return: None
         """
-        self.waiting_times += waiting_time
+        self.state.add_waiting_time(waiting_time, self.index)
 
     def add_vehicles(self, num_vehicles: int = None) -> None:
         """
@@ -135,7 +403,7 @@ class Direction:
 
         Assumes that a 'pod' of vehicles arrives in this direction all at once, which is basically what happens anyway.
 
-        If num_vehicles is left empty, then it adds vehicles based on a normal distribution around the avg flow
+        If num_vehicles is left empty, then the number of vehicles added follows the ArrivalProcess of this direction
 
         :param num_vehicles: number of vehicles to be added. Must be a positive integer
         :return: None
@@ -144,8 +412,8 @@ class Direction:
             assert isinstance(num_vehicles, int) and num_vehicles >= 0, \
                 "Number of vehicles must be an integer greater than or equal to zero!"
         else:
-            num_vehicles = int(abs(np.floor(np.random.normal(self.avg_flow))))
-        np.concatenate((self.waiting_times, [0] * num_vehicles))
+            num_vehicles = int(self.take_arrivals(1)[0])
+        self.state.enqueue(self.index, np.zeros(num_vehicles))
 
     def cycle_volume(self) -> int:
         """
@@ -157,11 +425,4 @@ class Direction:
 
         :return: cycle volume as described
         """
-        curr_total = self.cum_waiting_time
-        req_total = int(curr_total * self.cycle_size)
-        volume = 0
-        i = 0
-        while curr_total > req_total:
-            volume += 1
-            curr_total -= self.waiting_times[i]
-        return volume
+        return self.state.cycle_volume(self.index)
@@ -0,0 +1,220 @@
+from statistics import NormalDist
+
+import copy
+
+import numpy as np
+from numpy import ndarray
+
+from app import kernels
+from app.controller import Controller
+from app.intersection_state import IntersectionState
+
+
+class Ensemble:
+    """
+    Class to run many independent replicas of an Intersection at once, each with its own random arrivals
+
+    Every replica starts from the same state as the Intersection of a Controller, and is cycled in the same way as a
+    Controller would, serving directions in turn. Rather than cycling each replica in Python, the state of all replicas is
+    stacked along a leading axis, so each cycle is a handful of array operations covering every replica. This makes it
+    cheap to run thousands of replications, for instance to find a confidence interval for the average waiting time
+
+    The queues of every replica are held in a single IntersectionState, built by IntersectionState.build_many, with a
+    row for each direction of each replica, replica by replica. Each replica keeps its own clock, so the state is worked
+    on with the kernels of app.kernels that take a clock for each row, which are compiled with Numba when it is
+    installed, and each segment grows on its own as for an Intersection
+
+    Attributes
+        num_replicas: int for the number of replicas being run
+        pass_durr: int for the amount of time that it takes for a vehicle to exit an intersection
+        next_index: int for the index of the next direction to be emptied, the same for every replica
+        following: ndarray of ints for the index of the direction after each one, as Intersection.following gives, so
+        directions are served in the order of the linked list whatever order their indices are in
+        num_cycles: int for the number of cycles that have been completed
+        state: IntersectionState object holding the queues of every replica, direction d of replica r being row
+        r * num_directions + d
+        clocks: ndarray of shape (replicas,) for the current time of each replica
+        arrivals: list of the ArrivalProcess of each direction, copied from the Directions of the Intersection
+        cycle_sizes: ndarray for the cycle size of each direction
+        rng: Generator that the arrivals of every replica are drawn from
+    """
+    SWITCH_DURR: float = 2
+    ARRIVAL_BLOCK_SIZE: int = 1 << 18
+
+    def __init__(self, controller: Controller, num_replicas: int, seed=None):
+        """
+        Initializer for an Ensemble object
+
+        :param controller: Controller object whose Intersection, pass duration and next direction every replica starts
+        from. It is not changed by this Ensemble
+        :param num_replicas: int for the number of replicas to be run, must be positive
+        :param seed: seed for the random arrivals of the replicas, anything accepted by np.random.default_rng
+        """
+        assert isinstance(num_replicas, int) and num_replicas > 0, "Number of replicas must be a positive integer!"
+        intersection = controller.intersection
+        state = intersection.state
+        num_directions = state.num_directions
+        self.num_replicas = num_replicas
+        self.pass_durr = controller.pass_durr
+        self.next_index = controller.next_direction.index
+        self.following = intersection.following
+        self.num_cycles = 0
+        self.arrivals = [copy.deepcopy(direction.arrivals) for direction in intersection.directions]
+        self.cycle_sizes = state.cycle_sizes.copy()
+        self.rng = np.random.default_rng(seed)
+        self.__arrival_block = np.zeros((0, num_replicas, num_directions), dtype=np.int64)
+        self.__arrival_pos = 0
+
+        # Measured against a clock of zero, the waiting times are taken back from the clock of the Intersection, so each
+        # vehicle keeps the time it arrived at
+        waiting_times = np.concatenate([state.queue(index) for index in range(num_directions)]) - state.clock
+        self.state = IntersectionState.build_many([num_replicas * num_directions], np.tile(state.lengths, num_replicas),
+                                                  np.tile(waiting_times, num_replicas),
+                                                  np.tile(state.avg_flows, num_replicas),
+                                                  np.tile(self.cycle_sizes, num_replicas))[0]
+        self.clocks = np.full(num_replicas, state.clock)
+        self.__replica_rows = np.arange(num_replicas) * num_directions
+
+    @property
+    def num_directions(self) -> int:
+        """
+        Finds the number of directions of each replica
+
+        :return: int as described
+        """
+        return self.cycle_sizes.size
+
+    @property
+    def lengths(self) -> ndarray:
+        """
+        Finds the number of vehicles in each queue of each replica
+
+        :return: ndarray of ints of shape (replicas, directions), a view over the lengths of state
+        """
+        return self.state.lengths.reshape(self.num_replicas, self.num_directions)
+
+    @property
+    def num_vehicles(self) -> ndarray:
+        """
+        Finds the number of vehicles at each replica
+
+        :return: ndarray of ints as described
+        """
+        return self.lengths.sum(axis=1)
+
+    @property
+    def cum_waiting_times(self) -> ndarray:
+        """
+        Finds the total waiting time of the vehicles at each replica
+
+        :return: ndarray of floats as described
+        """
+        arrival_sums = self.state.arrival_sums.reshape(self.num_replicas, self.num_directions)
+        return self.num_vehicles * self.clocks - arrival_sums.sum(axis=1)
+
+    @property
+    def avg_waiting_times(self) -> ndarray:
+        """
+        Finds the average waiting time per vehicle at each replica, zero for a replica with no vehicles
+
+        :return: ndarray of floats as described
+        """
+        num_vehicles = self.num_vehicles
+        return np.divide(self.cum_waiting_times, num_vehicles, out=np.zeros(self.num_replicas), where=num_vehicles > 0)
+
+    def summary(self, confidence: float = 0.95) -> dict:
+        """
+        Summarises the replicas, giving the mean, standard deviation and a confidence interval for the mean of both the
+        average waiting time and the number of vehicles across the replicas
+
+        The confidence interval uses a normal approximation, which suits the large number of replicas an Ensemble is
+        meant for
+
+        :param confidence: float for the confidence level of the intervals, between 0 and 1
+        :return: dict mapping each statistic to a dict of its mean, std, ci_low and ci_high
+        """
+        assert 0 < confidence < 1, "Confidence must be between 0 and 1!"
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        summary = {}
+        for name, values in (("avg_waiting_time", self.avg_waiting_times), ("num_vehicles", self.num_vehicles)):
+            mean = float(values.mean())
+            std = float(values.std(ddof=1)) if values.size > 1 else 0.0
+            half_width = float(z * std / np.sqrt(values.size))
+            summary[name] = {"mean": mean, "std": std, "ci_low": mean - half_width, "ci_high": mean + half_width}
+        return summary
+
+    def cycle(self) -> ndarray:
+        """
+        Cycles every replica once, emptying the next direction, adding waiting time and adding new vehicles
+
+        :return: ndarray for the duration of the cycle at each replica
+        """
+        cycle_durrs = self.__empty_direction(self.next_index)
+        self.clocks += cycle_durrs
+        self.__add_vehicles()
+        self.next_index = int(self.following[self.next_index])
+        self.num_cycles += 1
+        return cycle_durrs
+
+    def run(self, n_cycles: int) -> None:
+        """
+        Cycles every replica a number of times
+
+        :param n_cycles: int for the number of cycles to be run, must be non-negative
+        :return: None
+        """
+        assert isinstance(n_cycles, int) and n_cycles >= 0, \
+            "Number of cycles must be an integer greater than or equal to zero!"
+        for i in range(n_cycles):
+            self.cycle()
+
+    def cycle_volumes(self, index: int) -> ndarray:
+        """
+        Finds the volume of vehicles to be emptied from a direction of every replica, as Direction.cycle_volume does,
+        with kernels.cycle_volumes
+
+        :param index: int for the index of the direction
+        :return: ndarray of ints for the cycle volume at each replica
+        """
+        state = self.state
+        return kernels.cycle_volumes(state.prefix, state.offsets, state.heads, state.capacities, state.prefix_bases,
+                                     state.lengths, state.arrival_sums, state.cycle_sizes, self.clocks,
+                                     self.__replica_rows + index)
+
+    def __empty_direction(self, index: int) -> ndarray:
+        """
+        Empties a direction of every replica for its cycle volume
+
+        :param index: int for the index of the direction
+        :return: ndarray for the duration of the cycle at each replica
+        """
+        state = self.state
+        volumes = self.cycle_volumes(index)
+        removed = kernels.discharge_many(state.prefix, state.offsets, state.heads, state.capacities, state.lengths,
+                                         state.prefix_bases, state.arrival_sums, self.__replica_rows + index, volumes)
+        state.total_vehicles -= int(volumes.sum())
+        state.total_arrival_sum = float(state.total_arrival_sum - removed.sum()) if state.total_vehicles > 0 else 0.0
+        return volumes * self.pass_durr + Ensemble.SWITCH_DURR
+
+    def __add_vehicles(self) -> None:
+        """
+        Adds vehicles to each direction of every replica, following the ArrivalProcess of the direction
+
+        Arrivals are sampled ahead of time for a block of cycles, each ArrivalProcess sampling every replica at once
+
+        :return: None
+        """
+        if self.__arrival_pos == self.__arrival_block.shape[0]:
+            num_cycles = max(1, Ensemble.ARRIVAL_BLOCK_SIZE // self.state.num_directions)
+            self.__arrival_block = np.stack([arrivals.sample(num_cycles, self.rng, self.num_replicas)
+                                             for arrivals in self.arrivals], axis=2)
+            self.__arrival_pos = 0
+        counts = self.__arrival_block[self.__arrival_pos].ravel()
+        self.__arrival_pos += 1
+        clocks = np.repeat(self.clocks, self.num_directions)
+        state = self.state
+        state.reserve(counts)
+        kernels.insert_arrivals_many(state.buffer, state.prefix, state.offsets, state.heads, state.capacities,
+                                     state.lengths, state.prefix_bases, state.arrival_sums, counts, clocks)
+        state.total_vehicles += int(counts.sum())
+        state.total_arrival_sum += float(counts @ clocks)
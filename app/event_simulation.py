@@ -0,0 +1,291 @@
+import heapq
+import itertools
+
+import numpy as np
+
+from app.controller import Controller
+from app.signal_policy import PhasePlan
+
+
+class EventQueue:
+    """
+    Class for a queue of events ordered by the time they happen, kept as a binary heap
+
+    Events happening at the same time come out in the order they were pushed, so a simulation is deterministic
+
+    Attributes
+        events: list used as a heap of (time, order, kind, index) tuples
+    """
+
+    def __init__(self):
+        """
+        Initializer for an EventQueue object
+        """
+        self.events = []
+        self.__order = itertools.count()
+
+    def __len__(self) -> int:
+        """
+        Finds the number of events still to happen
+
+        :return: int as described
+        """
+        return len(self.events)
+
+    def push(self, time: float, kind: int, index: int = None) -> None:
+        """
+        Schedules an event
+
+        :param time: float for the time the event happens at
+        :param kind: int for the kind of the event
+        :param index: int for the index of the Direction the event is for, if any
+        :return: None
+        """
+        heapq.heappush(self.events, (time, next(self.__order), kind, index))
+
+    def pop(self) -> tuple:
+        """
+        Removes the next event to happen
+
+        :return: tuple of the time, kind and index of the event
+        """
+        time, _, kind, index = heapq.heappop(self.events)
+        return time, kind, index
+
+    def peek_time(self) -> float:
+        """
+        Finds the time of the next event to happen
+
+        :return: float as described, infinity if there are no events
+        """
+        return self.events[0][0] if self.events else float("inf")
+
+
+class EventSimulation:
+    """
+    Class to run the Intersection of a Controller as a discrete-event simulation
+
+    Rather than stepping a whole cycle at a time, each vehicle arrival, the start of each phase, each vehicle leaving the
+    intersection and each switch between directions is an event, and the clock jumps straight from one event to the
+    next. A phase is the green light of a single direction, picked by the policy of the Controller when the phase starts,
+    which serves the volume the policy finds for it then, one vehicle every pass_durr. Once it ends, the next phase
+    starts after SWITCH_DURR. So a phase takes as long as a cycle of the Controller does, but every vehicle leaves at the
+    exact time it gets through. A PhasePlan, which serves several directions at once, cannot be simulated
+
+    Arrivals are drawn every arrival_period from the ArrivalProcess of each Direction, the count for one cycle each
+    period, with the vehicles of a period arriving at uniformly random times within it
+
+    If rest_when_empty is set, then once the whole intersection is empty the lights rest on the next direction, with
+    no events happening until the next vehicle arrives. This lets sparse traffic be simulated far faster than the
+    Controller, which keeps switching between empty directions. As no phase is completed while the lights rest, running
+    for a number of cycles stops early if they rest with no vehicle able to arrive to wake them
+
+    The Intersection, next_direction and num_cycles of the Controller are updated as the simulation runs, so the
+    Controller can carry on cycling from where the simulation stops
+
+    Attributes
+        controller: Controller object whose Intersection is simulated
+        arrival_period: float for the length of time that the arrivals of a cycle of each Direction are spread over
+        rest_when_empty: bool for if the lights should rest while the intersection is empty
+        events: EventQueue object holding the events still to happen
+        next_index: int for the index of the direction following the one last served, which the next phase serves under
+        a RoundRobin policy
+        num_events: int for the number of events that have happened
+        num_served: int for the number of vehicles that have left the intersection
+        served_waiting_time: float for the total waiting time of the vehicles that have left the intersection
+    """
+    SWITCH_DURR: float = 2
+    ARRIVAL_PERIOD, ARRIVAL, PHASE_START, DEPARTURE, PHASE_END = range(5)
+
+    def __init__(self, controller: Controller, arrival_period: float, rest_when_empty: bool = False):
+        """
+        Initializer for an EventSimulation object
+
+        :param controller: Controller object to be simulated, whose policy picks the direction of each phase, starting
+        from its next direction under a RoundRobin policy
+        :param arrival_period: float for the length of time that the arrivals of a cycle of each Direction are spread
+        over, must be positive
+        :param rest_when_empty: bool for if the lights should rest while the intersection is empty
+        """
+        assert arrival_period > 0, "Arrival period must be positive!"
+        assert not isinstance(controller.policy, PhasePlan), \
+            "An event simulation serves a single direction at a time, so cannot simulate a PhasePlan!"
+        self.controller = controller
+        self.arrival_period = arrival_period
+        self.rest_when_empty = rest_when_empty
+        self.events = EventQueue()
+        self.next_index = controller.next_direction.index
+        self.num_events = 0
+        self.num_served = 0
+        self.served_waiting_time = 0.0
+        self.__pending = [np.empty(0) for i in range(self.intersection.num_directions)]
+        self.__pending_pos = [0] * self.intersection.num_directions
+        self.__remaining = 0
+        self.__resting = False
+        self.events.push(self.clock, EventSimulation.ARRIVAL_PERIOD)
+        self.events.push(self.clock, EventSimulation.PHASE_START, self.next_index)
+
+    @property
+    def intersection(self):
+        """
+        Finds the Intersection being simulated
+
+        :return: Intersection object as described
+        """
+        return self.controller.intersection
+
+    @property
+    def clock(self) -> float:
+        """
+        Finds the current time of the simulation
+
+        :return: float as described
+        """
+        return self.intersection.clock
+
+    @property
+    def avg_served_waiting_time(self) -> float:
+        """
+        Finds the average time that the vehicles that have left the intersection waited for
+
+        :return: float as described, zero if no vehicles have left yet
+        """
+        return self.served_waiting_time / self.num_served if self.num_served else 0.0
+
+    def run(self, n_cycles: int = None, until_time: float = None) -> int:
+        """
+        Runs the simulation for either a number of cycles, each the phase of one direction, or until a time is reached
+
+        When running until a time, every event up to and including that time happens, and the clock is left at it
+
+        :param n_cycles: int for the number of phases to be completed, must be given if until_time is not. Fewer are
+        completed if the lights rest with no vehicle able to arrive, as found by stalled
+        :param until_time: float for the time to run until, must be given if n_cycles is not
+        :return: int for the number of events that happened
+        """
+        assert (n_cycles is None) != (until_time is None), "Exactly one of n_cycles and until_time must be given!"
+        assert n_cycles is None or (isinstance(n_cycles, int) and n_cycles >= 0), \
+            "Number of cycles must be an integer greater than or equal to zero!"
+        num_events = self.num_events
+        if n_cycles is not None:
+            end_cycles = self.controller.num_cycles + n_cycles
+            while self.controller.num_cycles < end_cycles and not self.stalled:
+                self.step()
+        else:
+            while self.events.peek_time() <= until_time:
+                self.step()
+            if until_time > self.clock:
+                self.intersection.add_waiting_time(until_time - self.clock)
+        return self.num_events - num_events
+
+    @property
+    def stalled(self) -> bool:
+        """
+        Finds if the lights are resting with no vehicle able to arrive to wake them, so no phase will ever start again
+
+        :return: bool as described
+        """
+        if not self.__resting:
+            return False
+        if any(pos < pending.size for pos, pending in zip(self.__pending_pos, self.__pending)):
+            return False
+        return not any(direction.can_arrive for direction in self.intersection.directions)
+
+    def step(self) -> None:
+        """
+        Moves the clock on to the next event, and handles it
+
+        :return: None
+        """
+        time, kind, index = self.events.pop()
+        if time > self.clock:
+            self.intersection.add_waiting_time(time - self.clock)
+        self.num_events += 1
+        if kind == EventSimulation.ARRIVAL_PERIOD:
+            self.__start_arrival_period()
+        elif kind == EventSimulation.ARRIVAL:
+            self.__arrive(index)
+        elif kind == EventSimulation.PHASE_START:
+            self.__start_phase(index)
+        elif kind == EventSimulation.DEPARTURE:
+            self.__depart(index)
+        else:
+            self.__end_phase(index)
+
+    def __start_arrival_period(self) -> None:
+        """
+        Draws the arrivals of every direction for the next arrival period, and schedules the first of each
+
+        :return: None
+        """
+        for direction in self.intersection.directions:
+            count = int(direction.take_arrivals(1)[0])
+            times = np.sort(direction.rng.uniform(self.clock, self.clock + self.arrival_period, count))
+            self.__pending[direction.index] = times
+            self.__pending_pos[direction.index] = 0
+            if count > 0:
+                self.events.push(times[0], EventSimulation.ARRIVAL, direction.index)
+        self.events.push(self.clock + self.arrival_period, EventSimulation.ARRIVAL_PERIOD)
+
+    def __arrive(self, index: int) -> None:
+        """
+        Adds a vehicle to the back of a direction, and schedules the next arrival of that direction in this period
+
+        :param index: int for the index of the direction
+        :return: None
+        """
+        self.intersection.state.enqueue(index, (0.0,))
+        pos = self.__pending_pos[index] = self.__pending_pos[index] + 1
+        if pos < self.__pending[index].size:
+            self.events.push(self.__pending[index][pos], EventSimulation.ARRIVAL, index)
+        if self.__resting:
+            self.__resting = False
+            self.events.push(self.clock, EventSimulation.PHASE_START, self.next_index)
+
+    def __start_phase(self, index: int) -> None:
+        """
+        Starts the green light of the direction picked by the policy of the Controller, scheduling the first vehicle to
+        leave, or the end of the phase if none are to be served
+
+        :param index: int for the index of the direction following the one last served
+        :return: None
+        """
+        if self.rest_when_empty and self.intersection.state.num_vehicles == 0:
+            self.__resting = True
+            return
+        direction, self.__remaining = self.controller.policy.choose(self.controller)
+        index = direction.index
+        if self.__remaining > 0:
+            self.events.push(self.clock + self.controller.pass_durr, EventSimulation.DEPARTURE, index)
+        else:
+            self.events.push(self.clock, EventSimulation.PHASE_END, index)
+
+    def __depart(self, index: int) -> None:
+        """
+        Lets the vehicle at the front of a direction leave, and schedules the next to leave or the end of the phase
+
+        :param index: int for the index of the direction
+        :return: None
+        """
+        served = self.intersection.state.dequeue(index, 1)
+        self.intersection.directions[index].delays.add(served)
+        self.served_waiting_time += float(served[0])
+        self.num_served += 1
+        self.__remaining -= 1
+        if self.__remaining > 0:
+            self.events.push(self.clock + self.controller.pass_durr, EventSimulation.DEPARTURE, index)
+        else:
+            self.events.push(self.clock, EventSimulation.PHASE_END, index)
+
+    def __end_phase(self, index: int) -> None:
+        """
+        Ends the green light of a direction, moving the Controller on and scheduling the next phase after the switch
+
+        :param index: int for the index of the direction
+        :return: None
+        """
+        direction = self.intersection.directions[index]
+        self.controller.next_direction = direction.next
+        self.controller.num_cycles += 1
+        self.next_index = direction.next.index
+        self.events.push(self.clock + EventSimulation.SWITCH_DURR, EventSimulation.PHASE_START, self.next_index)
@@ -0,0 +1,248 @@
+import cProfile
+import pstats
+import tracemalloc
+from time import perf_counter_ns
+
+HISTOGRAM_BUCKETS = 64
+
+
+class PhaseStats:
+    """
+    Class to accumulate how long each run of a phase of a cycle took, and optionally how much memory it allocated
+
+    Durations are kept in a histogram of powers of two nanoseconds, so recording one is a couple of integer operations
+    and quantiles are found to within a factor of two
+
+    Attributes
+        count: int for the number of times the phase was run
+        total_ns: int for the total number of nanoseconds spent in the phase
+        max_ns: int for the longest run of the phase, in nanoseconds
+        histogram: list of int for the number of runs taking less than 2 ** i nanoseconds, but at least 2 ** (i - 1),
+        for each i
+        alloc_bytes: int for the total, over every run, of the most memory allocated during a run, in bytes. Only kept
+        when allocations are tracked
+        max_alloc_bytes: int for the most memory allocated during any one run, in bytes
+    """
+
+    def __init__(self):
+        """
+        Initializer for a PhaseStats object, of a phase that has not yet been run
+        """
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.alloc_bytes = 0
+        self.max_alloc_bytes = 0
+
+    def record(self, duration_ns: int) -> None:
+        """
+        Records a run of the phase
+
+        :param duration_ns: int for how long the run took, in nanoseconds
+        :return: None
+        """
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.histogram[min(duration_ns.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def record_alloc(self, num_bytes: int) -> None:
+        """
+        Records how much memory a run of the phase allocated
+
+        :param num_bytes: int for the most memory allocated during the run, in bytes
+        :return: None
+        """
+        self.alloc_bytes += num_bytes
+        if num_bytes > self.max_alloc_bytes:
+            self.max_alloc_bytes = num_bytes
+
+    def quantile(self, q: float) -> int:
+        """
+        Finds an upper bound of a quantile of the durations of the runs of the phase, from the histogram
+
+        :param q: float for the quantile to find, between 0 and 1
+        :return: int for the quantile in nanoseconds, at most twice the true one, or 0 if the phase was never run
+        """
+        assert 0 <= q <= 1, "Quantile must be between 0 and 1!"
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(2 ** bucket, self.max_ns)
+        return self.max_ns
+
+
+class Instruments:
+    """
+    Class to time each phase of the cycles of a Controller, as given to it by its instruments attribute
+
+    A phase is timed from the last call of start or lap to the next call of lap, with perf_counter_ns, so timing the
+    phases of a cycle one after another costs a single clock read for each. A Controller without instruments never
+    reads the clock at all. When allocations are tracked, tracemalloc is started and the most memory allocated during
+    each run of a phase is recorded too, which slows every allocation down considerably
+
+    Attributes
+        phases: dict mapping the name of each phase, in the order they were first run, to its PhaseStats
+        track_allocations: bool for if the memory allocated in each phase is recorded
+    """
+
+    def __init__(self, track_allocations: bool = False):
+        """
+        Initializer for an Instruments object, with no phases recorded
+
+        :param track_allocations: bool for if the memory allocated in each phase should be recorded, starting
+        tracemalloc if it is not already tracing
+        """
+        self.phases = {}
+        self.track_allocations = track_allocations
+        self.__started_tracing = track_allocations and not tracemalloc.is_tracing()
+        if self.__started_tracing:
+            tracemalloc.start()
+        self.__mark = perf_counter_ns()
+        self.__mark_memory = 0
+
+    def start(self) -> None:
+        """
+        Marks the start of the first phase of a run of phases
+
+        :return: None
+        """
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            self.__mark_memory = tracemalloc.get_traced_memory()[0]
+        self.__mark = perf_counter_ns()
+
+    def lap(self, phase: str) -> None:
+        """
+        Records a run of a phase, as lasting since the last call of start or lap, and marks the start of the next one
+
+        :param phase: str for the name of the phase that just ended
+        :return: None
+        """
+        end = perf_counter_ns()
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.record(end - self.__mark)
+        if self.track_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            stats.record_alloc(max(0, peak - self.__mark_memory))
+            tracemalloc.reset_peak()
+            self.__mark_memory = current
+        # The bookkeeping above is left out of the next phase
+        self.__mark = perf_counter_ns()
+
+    def close(self) -> None:
+        """
+        Stops tracemalloc if it was started by these instruments
+
+        :return: None
+        """
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    def summary(self) -> dict:
+        """
+        Finds the breakdown of the time spent in each phase
+
+        :return: dict mapping the name of each phase to a dict of its count, total_ms, share of the total time of every
+        phase, mean_us, p50_us, p99_us and max_us, along with mean_alloc_kib and max_alloc_kib if allocations are tracked
+        """
+        total_ns = sum(stats.total_ns for stats in self.phases.values())
+        summary = {}
+        for phase, stats in self.phases.items():
+            summary[phase] = {"count": stats.count, "total_ms": stats.total_ns / 1e6,
+                              "share": stats.total_ns / total_ns if total_ns > 0 else 0.0,
+                              "mean_us": stats.total_ns / stats.count / 1e3, "p50_us": stats.quantile(0.5) / 1e3,
+                              "p99_us": stats.quantile(0.99) / 1e3, "max_us": stats.max_ns / 1e3}
+            if self.track_allocations:
+                summary[phase]["mean_alloc_kib"] = stats.alloc_bytes / stats.count / 1024
+                summary[phase]["max_alloc_kib"] = stats.max_alloc_bytes / 1024
+        return summary
+
+    def report(self) -> str:
+        """
+        Formats the breakdown of the time spent in each phase as a table, slowest phase first
+
+        :return: str of the table, a line for each phase
+        """
+        summary = self.summary()
+        header = "{:<18} {:>10} {:>11} {:>7} {:>10} {:>10} {:>10}".format("phase", "count", "total (ms)", "share",
+                                                                           "mean (us)", "p99 (us)", "max (us)")
+        if self.track_allocations:
+            header += " {:>12}".format("max (KiB)")
+        lines = [header]
+        for phase, stats in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+            line = "{:<18} {:>10} {:>11.2f} {:>7.1%} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+                phase, stats["count"], stats["total_ms"], stats["share"], stats["mean_us"], stats["p99_us"],
+                stats["max_us"])
+            if self.track_allocations:
+                line += " {:>12.1f}".format(stats["max_alloc_kib"])
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def write_profile(profile: cProfile.Profile, path: str, max_paths: int = 32) -> None:
+    """
+    Writes the stats of a finished cProfile run to a file, as read by pstats, and as collapsed stacks to the same path
+    with .folded added, as read by flamegraph.pl or speedscope
+
+    cProfile only keeps the time spent in each function for each of its callers, not whole stacks, so the stacks
+    reaching each function are rebuilt from those of its callers, sharing its time between them in proportion to the
+    time spent in it from each. The stacks of each function are found once and reused by every function it calls, and
+    only the heaviest max_paths are kept, the rest being merged under a single [other callers] frame. So the time taken
+    grows with the size of the call graph rather than with the number of paths through it, which grows exponentially
+
+    :param profile: cProfile.Profile object that has been run
+    :param path: str for the path of the file to write the stats to
+    :param max_paths: int for the most stacks kept for each function
+    :return: None
+    """
+    stats = pstats.Stats(profile)
+    stats.dump_stats(path)
+    names = {function: pstats.func_std_string(function).replace(";", ":") for function in stats.stats}
+    stacks = {}
+
+    def stacks_to(function: tuple) -> list:
+        """ Finds the stacks reaching a function, as (stack, share of the time of the function) tuples """
+        if function in stacks:
+            return stacks[function]
+        # A caller reached again through recursion sees no stacks, so the edges of the cycle are left out
+        stacks[function] = []
+        callers = {caller: edge[3] for caller, edge in stats.stats[function][4].items() if caller in stats.stats}
+        found = []
+        reached = 0
+        for caller, edge_time in callers.items():
+            caller_stacks = stacks_to(caller)
+            reached += bool(caller_stacks)
+            found.extend((stack, share, edge_time) for stack, share in caller_stacks)
+        total = sum(edge_time * share for stack, share, edge_time in found)
+        if total > 0:
+            found = [(stack + (names[function],), share * edge_time / total) for stack, share, edge_time in found]
+        elif found:
+            found = [(stack + (names[function],), share / reached) for stack, share, edge_time in found]
+        else:
+            found = [((names[function],), 1.0)]
+        found.sort(key=lambda item: -item[1])
+        if len(found) > max_paths:
+            other = sum(share for stack, share in found[max_paths - 1:])
+            found = found[:max_paths - 1] + [(("[other callers]", names[function]), other)]
+        stacks[function] = found
+        return found
+
+    lines = {}
+    for function, (_, _, self_time, _, _) in stats.stats.items():
+        for stack, share in stacks_to(function):
+            folded = ";".join(stack)
+            lines[folded] = lines.get(folded, 0.0) + self_time * share
+    with open(path + ".folded", "w") as file:
+        for stack, seconds in lines.items():
+            if seconds * 1e6 >= 1:
+                file.write("{} {}\n".format(stack, int(seconds * 1e6)))
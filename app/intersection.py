@@ -1,4 +1,10 @@
+import io
+
+import numpy as np
+
 from app.direction import Direction
+from app.intersection_state import IntersectionState
+from app.metrics import DelayStats
 
 
 class Intersection:
@@ -7,19 +13,123 @@ class Intersection:
 
     Contains methods to manage the directions of this intersection, (CRUD actions)
 
+    The queues of all Directions are held together in an IntersectionState, so that operations over the whole
+    intersection are vectorized rather than walking the linked list
+
+    Given a Generator, each Direction draws its arrivals from its own independent stream spawned from it, so that a run
+    can be reproduced exactly from a single seed. Arrivals for every Direction are drawn ahead of time, a block of
+    cycles at a time
+
+    The whole state of a run, the queues, clock, random streams and delay statistics, can be taken as a snapshot, a
+    single binary blob in the npz format, and restored later into this or any Intersection with as many Directions
+
+    Intersections and their Directions keep their attributes in slots, and a large intersection is best built all at
+    once with from_arrays, which lays out every queue with a handful of vectorized calls and links the list without
+    walking it
+
+    Alongside the next attribute of each Direction, the ring is kept as lists of the index of the Direction before and
+    after each one, with a dict from the name of each Direction to its index. So finding a Direction by name, checking
+    if one belongs to this intersection, and adding or removing one all take constant time, rather than walking the
+    list. A Direction removed has its place taken by the one with the last index, so while directions starts out in
+    linked list order, iterating over the intersection is what always follows the linked list from head_direction
+
     Attributes
         head_direction head to the linked list made of Direction objects
         num_directions length of the Direction linked list
+        state IntersectionState object holding the queues of every Direction, by index
+        directions list of the Direction objects of this intersection, by index, the row of state of each
+        rng Generator that the streams of the Directions are spawned from, None if each Direction keeps its own
     """
+    __slots__ = ("_head_direction", "__num_directions", "state", "directions", "rng", "__next", "__prev", "__indices")
     __num_directions: int
+    ARRIVAL_BLOCK_SIZE: int = 1 << 16
 
-    def __init__(self, head):
+    def __init__(self, head, rng: np.random.Generator = None):
         """
         Initializer for an Intersection object
 
         :param head: Direction object for the head of the linked list for this intersection
+        :param rng: Generator to spawn an independent stream for each Direction from, if None then each Direction keeps
+        the Generator it already has
         """
         self.head_direction = head
+        self.rng = rng
+        if rng is not None:
+            for direction, child in zip(self.directions, rng.spawn(self.__num_directions)):
+                direction.rng = child
+
+    @staticmethod
+    def from_directions(directions: list, state: IntersectionState = None, rng: np.random.Generator = None,
+                        order: list = None):
+        """
+        Builds an Intersection from a list of Directions in the order they are to be emptied, linking them into a
+        circular list as it goes
+
+        As the list is circular by construction, it is not walked to check it, so building many intersections at once
+        stays cheap
+
+        :param directions: list of at least 2 Direction objects, none already belonging to an intersection. Each has
+        its position in the list as its index
+        :param state: IntersectionState object already holding the queues of directions, in order, with each Direction
+        a view over its row, as when built by IntersectionState.build_many. If None then one is built
+        :param rng: Generator to spawn an independent stream for each Direction from, if None then each Direction keeps
+        the Generator it already has
+        :param order: list of the index of every Direction, in the order they are to be emptied, the first being the
+        head. If None then they are emptied in the order of the list
+        :return: Intersection object as described
+        """
+        assert len(directions) >= 2, "An intersection must have at least 2 directions!"
+        order = list(range(len(directions))) if order is None else [int(index) for index in order]
+        assert sorted(order) == list(range(len(directions))), "Order must have the index of every direction once!"
+        intersection = Intersection.__new__(Intersection)
+        intersection.directions = list(directions)
+        intersection.__link(order)
+        intersection._head_direction = directions[order[0]]
+        intersection.__num_directions = len(directions)
+        if state is None:
+            intersection.__build_state(rebuild=False)
+        else:
+            assert state.num_directions == len(directions), "State must hold the queue of every direction!"
+            intersection.state = state
+        intersection.rng = rng
+        if rng is not None:
+            for direction, child in zip(intersection.directions, rng.spawn(len(directions))):
+                direction.rng = child
+        return intersection
+
+    @staticmethod
+    def from_arrays(names: list, queues: list, flows, cycle_sizes=None, rng: np.random.Generator = None):
+        """
+        Builds an Intersection, and a Direction for each of its approaches, from the names, queues and flows of the
+        approaches, in the order they are to be emptied
+
+        Every queue is laid out at once with IntersectionState.build_many, and each Direction is made as a view over
+        its row, so nothing is copied twice and the list is linked without being walked. This is the way to build an
+        intersection of very many approaches
+
+        :param names: list of str for the name of each approach, at least 2
+        :param queues: list of array-likes for the waiting times queued at each approach, from the front of the queue
+        to the back
+        :param flows: array-like of floats for the average flow per cycle of each approach, arrivals following a normal
+        distribution around it
+        :param cycle_sizes: array-like of floats for the cycle size of each approach, if None then each is 0.5
+        :param rng: Generator to spawn an independent stream for each Direction from, if None then each Direction gets a
+        freshly seeded one
+        :return: Intersection object as described
+        """
+        num_directions = len(names)
+        flows = np.asarray(flows, dtype=float)
+        cycle_sizes = np.full(num_directions, 0.5) if cycle_sizes is None else np.asarray(cycle_sizes, dtype=float)
+        assert len(queues) == flows.size == cycle_sizes.size == num_directions, \
+            "Each approach must have a name, queue, flow and cycle size!"
+        queues = [np.asarray(queue, dtype=float) for queue in queues]
+        lengths = np.fromiter((queue.size for queue in queues), dtype=np.int64, count=num_directions)
+        waiting_times = np.concatenate(queues) if num_directions > 0 else np.zeros(0)
+        state = IntersectionState.build_many([num_directions], lengths, waiting_times, flows, cycle_sizes)[0]
+        directions = [Direction(name, (), flow, cycle_size, _state=state, _index=index)
+                      for index, (name, flow, cycle_size) in enumerate(zip(names, flows.tolist(),
+                                                                           cycle_sizes.tolist()))]
+        return Intersection.from_directions(directions, state, rng)
 
     @property
     def avg_waiting_time(self) -> float:
@@ -28,12 +138,81 @@ class Intersection:
 
         :return: float as described
         """
-        curr = self.head_direction.next
-        total_waiting_time = self.head_direction.cum_waiting_time
-        while curr is not self.head_direction:
-            total_waiting_time += curr.num_vehicles
-            curr = curr.next
-        return total_waiting_time / self.num_vehicles
+        num_vehicles = self.num_vehicles
+        if num_vehicles == 0:
+            return 0.0
+        return self.state.cum_waiting_time() / num_vehicles
+
+    def delay_stats(self) -> DelayStats:
+        """
+        Finds the statistics of the delays of every vehicle served from this intersection, merged across its Directions
+
+        :return: DelayStats object as described
+        """
+        stats = DelayStats()
+        for direction in self.directions:
+            stats.merge(direction.delays)
+        return stats
+
+    def snapshot(self, next_direction: Direction = None, num_cycles: int = 0) -> bytes:
+        """
+        Takes a snapshot of the state of this intersection, so a run can be paused, resumed or forked
+
+        The position of a Controller in its run can be kept with it, so that it is restored along with the intersection
+
+        :param next_direction: Direction object of this intersection that is to be emptied next, if any, or the Phase
+        of a PhasePlan, whose position in the plan is kept too
+        :param num_cycles: int for the number of cycles completed so far
+        :return: bytes of the snapshot, in the npz format
+        """
+        arrays = {"state_" + name: value for name, value in self.state.snapshot().items()}
+        for index, direction in enumerate(self.directions):
+            for name, value in direction.snapshot().items():
+                arrays["direction%d_%s" % (index, name)] = value
+        arrays["next_index"] = np.array(-1 if next_direction is None else next_direction.index)
+        arrays["next_phase"] = np.array(getattr(next_direction, "position", -1))
+        arrays["num_cycles"] = np.array(num_cycles)
+        blob = io.BytesIO()
+        np.savez(blob, **arrays)
+        return blob.getvalue()
+
+    @staticmethod
+    def load_snapshot(blob: bytes) -> dict:
+        """
+        Decodes a snapshot into its arrays, so it can be restored many times over without decoding it each time
+
+        :param blob: bytes of a snapshot, as taken by snapshot
+        :return: dict mapping the name of each field to an ndarray
+        """
+        with np.load(io.BytesIO(blob), allow_pickle=False) as arrays:
+            return dict(arrays)
+
+    def restore(self, blob) -> tuple:
+        """
+        Restores the state of this intersection from a snapshot, taken from an intersection with as many Directions
+
+        Nothing is shared with the snapshot, so it can be restored into any number of intersections
+
+        :param blob: bytes of a snapshot, as taken by snapshot, or the dict of arrays found from it by load_snapshot
+        :return: tuple of the Direction object kept as the next to be emptied, None if none was, and the number of
+        cycles kept
+        """
+        arrays = blob if isinstance(blob, dict) else Intersection.load_snapshot(blob)
+        self.state.restore({name[len("state_"):]: value for name, value in arrays.items() if name.startswith("state_")})
+        for index, direction in enumerate(self.directions):
+            prefix = "direction%d_" % index
+            direction.restore({name[len(prefix):]: value for name, value in arrays.items() if name.startswith(prefix)})
+        next_index = int(arrays["next_index"])
+        return (self.directions[next_index] if next_index >= 0 else None), int(arrays["num_cycles"])
+
+    @property
+    def clock(self) -> float:
+        """
+        Finds the current time of this intersection, the total duration of all cycles so far
+
+        :return: float as described
+        """
+        return self.state.clock
 
     @property
     def num_vehicles(self) -> int:
@@ -42,12 +221,7 @@ class Intersection:
 
         :return: int as described
         """
-        curr = self.head_direction.next
-        total_vehicles = self.head_direction.num_vehicles
-        while curr is not self.head_direction:
-            total_vehicles += curr.num_vehicles
-            curr = curr.next
-        return total_vehicles
+        return self.state.num_vehicles
 
     @property
     def head_direction(self) -> Direction:
@@ -71,6 +245,7 @@ class Intersection:
         assert Intersection.list_is_circular(head_direction)
         self._head_direction = head_direction
         self.__set_num_directions()
+        self.__build_state()
 
     @property
     def num_directions(self) -> int:
@@ -83,6 +258,54 @@ class Intersection:
         """
         return self.__num_directions
 
+    def __iter__(self):
+        """
+        Iterates over the Directions of this intersection, following the linked list from head_direction
+
+        :return: iterator of Direction objects as described
+        """
+        directions, following = self.directions, self.__next
+        index = self.head_direction.index
+        for i in range(self.__num_directions):
+            yield directions[index]
+            index = following[index]
+
+    @property
+    def following(self) -> np.ndarray:
+        """
+        Finds the index of the Direction after each one in the linked list
+
+        :return: ndarray of ints as described, by index
+        """
+        return np.array(self.__next, dtype=np.int64)
+
+    def get_direction(self, name: str) -> Direction:
+        """
+        Finds the Direction of this intersection with a name, in constant time
+
+        :param name: str for the name of the Direction. If several Directions share it, the one added last is found
+        :return: Direction object as described, None if no Direction of this intersection has the name
+        """
+        index = self.__indices.get(name)
+        return self.directions[index] if index is not None else None
+
+    def __link(self, order: list) -> None:
+        """
+        Links the Directions of this intersection into a circular list, both by their next attributes and by index
+
+        :param order: list of the index of every Direction, in the order they are to be emptied
+        :return: None
+        """
+        num_directions = len(order)
+        self.__next = [0] * num_directions
+        self.__prev = [0] * num_directions
+        for position, index in enumerate(order):
+            following = order[(position + 1) % num_directions]
+            self.__next[index] = following
+            self.__prev[following] = index
+            self.directions[index].next = self.directions[following]
+        self.__indices = {direction.name: index for index, direction in enumerate(self.directions)}
+
     def __set_num_directions(self) -> None:
         """
         Sets the number of directions for this Intersection object.
@@ -95,6 +318,50 @@ class Intersection:
         assert num >= 2
         self.__num_directions = num
 
+    def __build_state(self, rebuild: bool = True) -> None:
+        """
+        Builds the IntersectionState for this Intersection from its linked list of Directions, and makes each Direction
+        a view over its row of it
+
+        :param rebuild: bool for if the Directions should be found again by walking the linked list from
+        head_direction, each getting its position along it as its index. Otherwise they keep the index they have
+        :return: None
+        """
+        if rebuild:
+            self.directions = []
+            curr = self.head_direction
+            for i in range(self.__num_directions):
+                self.directions.append(curr)
+                curr = curr.next
+            self.__link(list(range(self.__num_directions)))
+        directions = self.directions
+        lanes = {index: (direction.lanes, direction.state.lane_queues(direction.index))
+                 for index, direction in enumerate(directions) if direction.lanes is not None}
+        queues = [() if index in lanes else direction.waiting_times for index, direction in enumerate(directions)]
+        avg_flows = [direction.avg_flow for direction in directions]
+        cycle_sizes = [direction.cycle_size for direction in directions]
+        self.state = IntersectionState(queues, avg_flows, cycle_sizes)
+        for index, direction in enumerate(directions):
+            direction.bind(self.state, index)
+        for index, (direction_lanes, lane_queues) in lanes.items():
+            self.state.set_lanes(index, direction_lanes, lane_queues)
+
+    @staticmethod
+    def __detach(direction: Direction) -> None:
+        """
+        Moves the queue of a Direction out of the IntersectionState of this Intersection, into one of its own
+
+        :param direction: Direction object to be detached
+        :return: None
+        """
+        lanes = direction.lanes
+        lane_queues = None if lanes is None else direction.state.lane_queues(direction.index)
+        state = IntersectionState([() if lanes is not None else direction.waiting_times], [direction.avg_flow],
+                                  [direction.cycle_size])
+        direction.bind(state, 0)
+        if lanes is not None:
+            state.set_lanes(0, lanes, lane_queues)
+
     @staticmethod
     def list_is_circular(head: Direction) -> bool:
         """
@@ -161,90 +428,124 @@ class Intersection:
         :param prev_cycle_durr: integer for the duration of the previous cycle. Must be >= 0, otherwise an error is thrown
         :return: None
         """
-        curr_direction = self.head_direction
-        i = 1
         assert prev_cycle_durr >= 0
-        while i <= self.__num_directions:
-            curr_direction.add_waiting_time(prev_cycle_durr)
-            curr_direction = curr_direction.next
-            i += 1
+        self.state.add_waiting_time(prev_cycle_durr)
 
     def __contains__(self, item) -> bool:
         """
-        Checks if an Intersection contains an object.
+        Checks if an Intersection contains an object, in constant time
 
-        Really just checks if inputted item is in the Direction linked list belonging to this Intersection
+        Really just checks if inputted item is in the Direction linked list belonging to this Intersection, or is the
+        name of a Direction in it
 
         :param item: object to be checked if it is contained in this Intersection
         :return: bool if item is contained in this Intersection or not
         """
         if isinstance(item, Direction):
-            curr = self.head_direction
-            i = 1
-            while i <= self.num_directions:
-                if curr is item:
-                    return True
-                curr = curr.next
-                i += 1
+            return item.state is self.state and item.index < len(self.directions) \
+                and self.directions[item.index] is item
+        if isinstance(item, str):
+            return item in self.__indices
         return False
 
     def remove_direction(self, direction) -> bool:
         """
-        Removes a direction from this intersection
+        Removes a direction from this intersection, in constant time
+
+        If the head is removed, the Direction before it becomes the head. The Direction with the last index takes the
+        index of the one removed
 
         :param direction: Direction object to be removed from this Intersection
         :return: Boolean if the inputted Direction object was removed or not
         """
-        i = 1
         assert self.__num_directions > 2, "Cannot remove a direction from intersection with only 2 directions!"
-        if self.head_direction == direction:
-            curr_direction = self.head_direction
-            while i < self.__num_directions:
-                i += 1
-                curr_direction = curr_direction.next
-            curr_direction.next = self.head_direction.next
-            self.head_direction = curr_direction
-            return True
-        else:
-            prev_direction = self.head_direction
-            curr_direction = self.head_direction.next
-            while i <= self.__num_directions:
-                if curr_direction == direction:
-                    prev_direction.next = curr_direction.next
-                    self.__num_directions -= 1
-                    return True
-                else:
-                    curr_direction = curr_direction.next
-                    prev_direction = prev_direction.next
-                i += 1
+        if direction not in self:
             return False
+        index = direction.index
+        before, after = self.__prev[index], self.__next[index]
+        self.directions[before].next = self.directions[after]
+        self.__next[before] = after
+        self.__prev[after] = before
+        if self.head_direction is direction:
+            self._head_direction = self.directions[before]
+        if self.__indices.get(direction.name) == index:
+            del self.__indices[direction.name]
+        Intersection.__detach(direction)
+        self.state.remove_row(index)
+        last = self.__num_directions - 1
+        if index != last:
+            # The Direction with the last index takes the place of the one removed, in the ring as in the state
+            moved = self.directions[last]
+            before, after = self.__prev[last], self.__next[last]
+            self.__next[before] = index
+            self.__prev[after] = index
+            self.__next[index], self.__prev[index] = after, before
+            self.directions[index] = moved
+            moved.bind(self.state, index)
+            if self.__indices.get(moved.name) == last:
+                self.__indices[moved.name] = index
+        self.directions.pop()
+        self.__next.pop()
+        self.__prev.pop()
+        self.__num_directions -= 1
+        return True
 
     def add_direction(self, new_direction: Direction) -> None:
         """
-        Adds a new direction to this intersection.
+        Adds a new direction to this intersection, in constant time
 
         Adds this to the end of the cyclic linked list, so that the new directions next direction is the head
 
         :param new_direction: new Direction object to be added
         :return: True, by convention
         """
-        i = 1
-        curr_direction = self.head_direction
-        while i < self.__num_directions:
-            curr_direction = curr_direction.next
-            i += 1
-        curr_direction.next = new_direction
+        assert new_direction not in self, "Direction already belongs to this intersection!"
+        lanes = new_direction.lanes
+        lane_queues = None if lanes is None else new_direction.state.lane_queues(new_direction.index)
+        index = self.state.add_row(() if lanes is not None else new_direction.waiting_times, new_direction.avg_flow,
+                                   new_direction.cycle_size)
+        if lanes is not None:
+            self.state.set_lanes(index, lanes, lane_queues)
+        head = self.head_direction.index
+        tail = self.__prev[head]
+        self.directions[tail].next = new_direction
         new_direction.next = self.head_direction
+        self.directions.append(new_direction)
+        self.__next.append(head)
+        self.__prev.append(tail)
+        self.__next[tail] = index
+        self.__prev[head] = index
+        self.__indices[new_direction.name] = index
         self.__num_directions += 1
+        if self.rng is not None:
+            # A new stream draws the arrivals of the new Direction, before it joins the block of this intersection
+            new_direction.rng = self.rng.spawn(1)[0]
+        new_direction.bind(self.state, index)
+        remaining = self.state.arrival_block.shape[0] - self.state.arrival_pos
+        self.state.arrival_block[self.state.arrival_pos:, index] = new_direction.take_arrivals(remaining)
 
     def add_vehicles(self) -> None:
         """
         Adds vehicles to each of the directions for this intersection
+
+        The number of vehicles arriving for each direction follows its ArrivalProcess. The arrivals for a block of cycles
+        are taken from every Direction at once, about ARRIVAL_BLOCK_SIZE in all, and then used up a cycle at a time
+        :return: None
+        """
+        state = self.state
+        if state.arrival_pos == state.arrival_block.shape[0]:
+            self.draw_arrivals()
+        state.enqueue_counts(state.arrival_block[state.arrival_pos])
+        state.arrival_pos += 1
+
+    def draw_arrivals(self) -> None:
+        """
+        Draws the arrivals of every Direction for the next block of cycles, about ARRIVAL_BLOCK_SIZE in all, replacing
+        the arrival block of the state
+
         :return: None
         """
-        curr_direction = self.head_direction
-        i = 0
-        while i <= self.num_directions:
-            curr_direction.add_vehicles()
-            curr_direction = curr_direction.next
-            i += 1
+        num_cycles = min(Direction.ARRIVAL_BLOCK, max(16, Intersection.ARRIVAL_BLOCK_SIZE // self.__num_directions))
+        self.state.arrival_block = np.column_stack([direction.take_arrivals(num_cycles)
+                                                    for direction in self.directions])
+        self.state.arrival_pos = 0
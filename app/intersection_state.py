@@ -0,0 +1,765 @@
+import numpy as np
+from numpy import ndarray
+
+from app import kernels
+from app.kernels import ranges
+
+
+class IntersectionState:
+    """
+    Class holding the vehicle queues of every Direction of an Intersection in a columnar layout.
+
+    Rather than each Direction owning its own array, all queues live in one contiguous buffer. Each Direction owns a
+    segment of this buffer, described by its offset and capacity, which is used as a ring. The queue starts at the head
+    of the segment and runs for length slots, wrapping around to the start of the segment. So serving vehicles only moves
+    the head, and the buffer is only reallocated when a segment has to grow, which doubles its capacity. This allows
+    operations that touch every Direction, such as adding arrivals or finding aggregate statistics, to be done with a
+    single vectorized call instead of walking the linked list of Directions
+
+    Vehicles are stored by the time that they arrived rather than by how long they have waited, against one clock for
+    the whole intersection. The waiting time of a vehicle is found when needed as clock - arrival time, so adding waiting
+    time to every vehicle is done by just advancing the clock. The sum of the arrival times of the vehicles queued for
+    each Direction is kept as vehicles come and go, so total waiting times are found without touching the buffer
+
+    Alongside each arrival time, the running sum of the arrival times of every vehicle queued for the Direction so far,
+    up to and including that vehicle, is kept in prefix. Less the arrival times of the vehicles already served, held in
+    prefix_bases, this gives the total waiting time of the first k vehicles of a queue in constant time, for any k. As
+    waiting time is measured against the clock, these sums stay correct as time advances
+
+    A Direction can have several lanes, held as a Lanes object with a state of its own, a row for each lane. Its row of
+    this state then holds no vehicles in the buffer, only the number of vehicles and sum of arrival times across all its
+    lanes, and every operation on the row is passed on to its lanes. Directions without lanes, the usual case, are not
+    slowed down by this beyond checking a dict
+
+    The work on the buffer of finding cycle volumes, adding waiting time to a single Direction, serving vehicles and
+    adding arrivals is done by the kernels of app.kernels, compiled with Numba when it is installed
+
+    Attributes
+        buffer: ndarray holding the arrival time of every vehicle, segment by segment
+        clock: float for the current time of the intersection, that waiting times are measured against
+        arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+        prefix: ndarray holding the running sum of arrival times of each vehicle, laid out the same as buffer
+        prefix_bases: ndarray for the sum of the arrival times of the vehicles already served from each Direction,
+        since its queue was last empty
+        offsets: ndarray for the index into buffer where the segment of each Direction starts
+        capacities: ndarray for the number of slots of buffer reserved for each Direction
+        heads: ndarray for the position within its segment of the front of the queue of each Direction
+        lengths: ndarray for the number of vehicles queued for each Direction
+        avg_flows: ndarray for the average flow of vehicles per cycle for each Direction
+        cycle_sizes: ndarray for the proportion of waiting time to be emptied per cycle for each Direction
+        arrival_block: ndarray of the number of vehicles arriving for each Direction, drawn ahead of time for a block
+        of cycles, a row for each cycle
+        arrival_pos: int for the row of arrival_block for the next cycle
+        total_vehicles: int for the number of vehicles queued across all Directions, kept as vehicles come and go
+        total_arrival_sum: float for the sum of the arrival times of every vehicle queued across all Directions, kept as
+        vehicles come and go
+        lanes: dict from the index of each Direction with lanes to its Lanes object
+        debug: bool for if every change to this state should be checked against a full recompute of its counters from
+        the buffer. Slow, meant for tracking down bugs, and can be set on the class to check every state
+    """
+    MIN_CAPACITY: int = 8
+    SEARCH_WIDTH: int = 64
+    debug: bool = False
+
+    def __init__(self, queues: list = (), avg_flows: list = (), cycle_sizes: list = (), clock: float = 0.0):
+        """
+        Initializer for an IntersectionState object
+
+        :param queues: list of array-likes, the waiting times of the vehicles queued for each Direction
+        :param avg_flows: list for the average flow per cycle of each Direction
+        :param cycle_sizes: list for the cycle size of each Direction
+        :param clock: float for the time to start the clock at
+        """
+        queues = [np.asarray(queue, dtype=float).ravel() for queue in queues]
+        assert len(queues) == len(avg_flows) == len(cycle_sizes), "Each Direction must have a queue, flow and cycle size!"
+        self.lengths = np.array([queue.size for queue in queues], dtype=np.int64)
+        self.capacities = np.array([IntersectionState.capacity_for(queue.size) for queue in queues], dtype=np.int64)
+        self.offsets = IntersectionState.__offsets_for(self.capacities)
+        self.heads = np.zeros_like(self.lengths)
+        self.buffer = np.zeros(int(self.capacities.sum()))
+        self.prefix = np.zeros(self.buffer.size)
+        self.clock = float(clock)
+        for offset, queue in zip(self.offsets, queues):
+            self.buffer[offset:offset + queue.size] = self.clock - queue
+            np.cumsum(self.buffer[offset:offset + queue.size], out=self.prefix[offset:offset + queue.size])
+        self.prefix_bases = np.zeros(self.lengths.size)
+        self.arrival_sums = np.array([self.clock * queue.size - queue.sum() for queue in queues], dtype=float)
+        self.total_vehicles = int(self.lengths.sum())
+        self.total_arrival_sum = float(self.arrival_sums.sum())
+        self.avg_flows = np.array(avg_flows, dtype=float)
+        self.cycle_sizes = np.array(cycle_sizes, dtype=float)
+        self.arrival_block = np.zeros((0, len(queues)), dtype=np.int64)
+        self.arrival_pos = 0
+        self.lanes = {}
+
+    @staticmethod
+    def build_many(num_directions: ndarray, lengths: ndarray, waiting_times: ndarray, avg_flows: ndarray,
+                   cycle_sizes: ndarray) -> list:
+        """
+        Builds the states of many intersections at once, laid out one after another
+
+        The layout of every state is found with a handful of vectorized calls over all of their Directions together,
+        and each state is then made from views into these arrays, so building takes about the same time per
+        intersection however many there are. Each state only ever changes its own rows, or replaces its arrays when a
+        segment grows, so sharing the underlying arrays is safe
+
+        :param num_directions: ndarray of ints for the number of Directions of each intersection
+        :param lengths: ndarray of ints for the number of vehicles queued for each Direction, intersection by
+        intersection
+        :param waiting_times: ndarray of the waiting times of every vehicle queued, Direction by Direction
+        :param avg_flows: ndarray for the average flow per cycle of each Direction
+        :param cycle_sizes: ndarray for the cycle size of each Direction
+        :return: list of IntersectionState objects, one for each intersection
+        """
+        num_directions = np.asarray(num_directions, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        waiting_times = np.asarray(waiting_times, dtype=float)
+        assert lengths.size == num_directions.sum() and waiting_times.size == lengths.sum(), \
+            "Each Direction must have a queue, flow and cycle size!"
+        capacities = np.full(lengths.size, IntersectionState.MIN_CAPACITY, dtype=np.int64)
+        large = lengths > IntersectionState.MIN_CAPACITY
+        capacities[large] = np.left_shift(1, np.ceil(np.log2(lengths[large])).astype(np.int64))
+        starts = np.cumsum(capacities) - capacities
+        junctions = np.repeat(np.arange(num_directions.size), num_directions)
+        direction_ptr = np.concatenate(([0], np.cumsum(num_directions)))
+        buffer_ptr = np.concatenate(([0], np.cumsum(np.bincount(junctions, weights=capacities,
+                                                                minlength=num_directions.size)))).astype(np.int64)
+        offsets = starts - np.repeat(buffer_ptr[:-1], num_directions)
+        owners = np.repeat(np.arange(lengths.size), lengths)
+        buffer = np.zeros(int(capacities.sum()))
+        buffer[ranges(starts, lengths)] = -waiting_times
+        prefix = np.zeros(buffer.size)
+        running = np.cumsum(-waiting_times)
+        ends = np.cumsum(lengths)
+        prefix[ranges(starts, lengths)] = running - np.repeat(np.concatenate(([0.0], running))[ends - lengths], lengths)
+        arrival_sums = np.bincount(owners, weights=-waiting_times, minlength=lengths.size).astype(float)
+        total_vehicles = np.bincount(junctions, weights=lengths, minlength=num_directions.size).astype(np.int64)
+        total_arrival_sums = np.bincount(junctions, weights=arrival_sums, minlength=num_directions.size)
+        heads = np.zeros(lengths.size, dtype=np.int64)
+        prefix_bases = np.zeros(lengths.size)
+        avg_flows = np.array(avg_flows, dtype=float)
+        cycle_sizes = np.array(cycle_sizes, dtype=float)
+        states = []
+        for junction in range(num_directions.size):
+            lo, hi = direction_ptr[junction], direction_ptr[junction + 1]
+            buffer_lo, buffer_hi = buffer_ptr[junction], buffer_ptr[junction + 1]
+            state = IntersectionState.__new__(IntersectionState)
+            state.lengths, state.capacities, state.offsets = lengths[lo:hi], capacities[lo:hi], offsets[lo:hi]
+            state.heads, state.prefix_bases, state.arrival_sums = heads[lo:hi], prefix_bases[lo:hi], arrival_sums[lo:hi]
+            state.avg_flows, state.cycle_sizes = avg_flows[lo:hi], cycle_sizes[lo:hi]
+            state.buffer, state.prefix = buffer[buffer_lo:buffer_hi], prefix[buffer_lo:buffer_hi]
+            state.clock = 0.0
+            state.total_vehicles = int(total_vehicles[junction])
+            state.total_arrival_sum = float(total_arrival_sums[junction])
+            state.arrival_block = np.zeros((0, hi - lo), dtype=np.int64)
+            state.arrival_pos = 0
+            state.lanes = {}
+            states.append(state)
+        return states
+
+    @staticmethod
+    def capacity_for(num_vehicles: int) -> int:
+        """
+        Finds the capacity of a segment able to hold a number of vehicles, the smallest power of 2 that is at least
+        MIN_CAPACITY
+
+        :param num_vehicles: int for the number of vehicles to be held
+        :return: int as described
+        """
+        capacity = IntersectionState.MIN_CAPACITY
+        while capacity < num_vehicles:
+            capacity *= 2
+        return capacity
+
+    @staticmethod
+    def __offsets_for(capacities: ndarray) -> ndarray:
+        """
+        Finds the offsets of segments laid out back to back with the given capacities
+
+        :param capacities: ndarray for the capacity of each segment
+        :return: ndarray for the offset of each segment
+        """
+        offsets = np.zeros(capacities.size, dtype=np.int64)
+        np.cumsum(capacities[:-1], out=offsets[1:])
+        return offsets
+
+    @property
+    def num_directions(self) -> int:
+        """
+        Finds the number of Directions held by this state
+
+        :return: int as described
+        """
+        return self.lengths.size
+
+    @property
+    def num_vehicles(self) -> int:
+        """
+        Finds the total number of vehicles queued across all Directions, in constant time
+
+        :return: int as described
+        """
+        return self.total_vehicles
+
+    def cum_waiting_time(self, index: int = None) -> float:
+        """
+        Finds the total waiting time of the vehicles queued, either across all Directions or for a single one, in
+        constant time
+
+        :param index: int for the index of the Direction, if None then the total across all Directions is found
+        :return: float as described
+        """
+        if index is None:
+            return float(self.total_vehicles * self.clock - self.total_arrival_sum)
+        return float(self.lengths[index] * self.clock - self.arrival_sums[index])
+
+    def cum_waiting_times(self) -> ndarray:
+        """
+        Finds the total waiting time of the vehicles queued for each Direction
+
+        :return: ndarray with the total waiting time for each Direction
+        """
+        return self.lengths * self.clock - self.arrival_sums
+
+    def served_waiting_time(self, index: int, count: int) -> float:
+        """
+        Finds the total waiting time of the vehicles at the front of the queue of a Direction, in constant time
+
+        :param index: int for the index of the Direction
+        :param count: int for the number of vehicles at the front of the queue to be included
+        :return: float as described
+        """
+        if count <= 0:
+            return 0.0
+        if index in self.lanes:
+            lanes = self.lanes_of(index)
+            return float(lanes.state.served_waiting_times(lanes.allot(count)).sum())
+        slot = self.offsets[index] + (self.heads[index] + count - 1) % self.capacities[index]
+        return float(count * self.clock - (self.prefix[slot] - self.prefix_bases[index]))
+
+    def cycle_volume(self, index: int) -> int:
+        """
+        Finds the volume of vehicles to be emptied from a Direction for a cycle
+
+        This is the fewest vehicles from the front of the queue whose waiting times make up enough of the total that the
+        vehicles left behind have at most the cycle size of the total waiting time. As the waiting time of the front k
+        vehicles only grows with k, it is found by a binary search over the prefix sums, in O(log n) time, by
+        kernels.cycle_volume
+
+        :param index: int for the index of the Direction
+        :return: int for the cycle volume as described
+        """
+        if index in self.lanes:
+            return int(self.lanes_of(index).allot().sum())
+        return int(kernels.cycle_volume(self.prefix, self.offsets, self.heads, self.capacities, self.prefix_bases,
+                                        self.lengths, self.arrival_sums, self.cycle_sizes, self.clock, index))
+
+    def served_waiting_times(self, counts: ndarray) -> ndarray:
+        """
+        Finds the total waiting time of the vehicles at the front of the queue of every Direction at once
+
+        Directions with lanes are not handled, their rows hold no vehicles in the buffer
+
+        :param counts: ndarray of ints for the number of vehicles at the front of the queue of each Direction to be
+        included
+        :return: ndarray of floats as described
+        """
+        last = self.offsets + (self.heads + counts - 1) % self.capacities
+        return np.where(counts > 0, counts * self.clock - (self.prefix[last] - self.prefix_bases), 0.0)
+
+    def cycle_volumes(self) -> ndarray:
+        """
+        Finds the cycle volume of every Direction at once, as cycle_volume does
+
+        Rather than halving the range of each binary search a step at a time, SEARCH_WIDTH points are tried across the
+        range of every Direction together, cutting it down by that factor each step. So only a few vectorized steps are
+        needed for any queue, which matters more than the work done in each for the handful of lanes of a Direction.
+        Directions with lanes are not handled
+
+        :return: ndarray of ints for the cycle volume of each Direction
+        """
+        curr_totals = self.cum_waiting_times()
+        req_removed = (curr_totals - np.floor(curr_totals * self.cycle_sizes))[:, None]
+        lo = np.minimum(1, self.lengths)
+        hi = self.lengths.copy()
+        rows = np.arange(self.lengths.size)
+        fractions = np.arange(1, IntersectionState.SEARCH_WIDTH + 1)
+        offsets, heads, capacities = self.offsets[:, None], self.heads[:, None], self.capacities[:, None]
+        bases = self.prefix_bases[:, None]
+        while (lo < hi).any():
+            # The last point tried is hi, so at least one point of every range with vehicles to remove is enough
+            mids = lo[:, None] + (hi - lo)[:, None] * fractions // IntersectionState.SEARCH_WIDTH
+            served = mids * self.clock - (self.prefix[offsets + (heads + mids - 1) % capacities] - bases)
+            short = (served < req_removed).sum(axis=1)
+            lo = np.where(short > 0, mids[rows, np.maximum(short - 1, 0)] + 1, lo)
+            hi = mids[rows, np.minimum(short, IntersectionState.SEARCH_WIDTH - 1)]
+            lo = np.minimum(lo, hi)
+        return np.where(req_removed[:, 0] > 0, lo, 0)
+
+    def queue(self, index: int) -> ndarray:
+        """
+        Returns the waiting times of the vehicles queued for a Direction, from the front of the queue to the back
+
+        A new array is returned, so later changes to this state are not reflected in it
+
+        :param index: int for the index of the Direction
+        :return: ndarray as described
+        """
+        if index in self.lanes:
+            # The lanes are merged back into a single queue in the order the vehicles arrived
+            waiting_times = np.concatenate(self.lane_queues(index))
+            return waiting_times[np.argsort(-waiting_times, kind="stable")]
+        return self.clock - np.concatenate([self.buffer[lo:hi] for lo, hi in self.spans(index, 0, self.lengths[index])])
+
+    def set_queue(self, index: int, waiting_times) -> None:
+        """
+        Replaces the queue of a Direction with new waiting times
+
+        :param index: int for the index of the Direction
+        :param waiting_times: array-like for the new waiting times, from the front of the queue to the back
+        :return: None
+        """
+        if index in self.lanes:
+            self.set_lanes(index, self.lanes[index], self.lanes[index].divide(waiting_times))
+            return
+        self.dequeue(index, int(self.lengths[index]))
+        self.enqueue(index, waiting_times)
+
+    def spans(self, index: int, start: int, count: int) -> list:
+        """
+        Finds the slices of buffer covering part of the queue of a Direction
+
+        As the segment of a Direction is used as a ring, part of a queue covers at most 2 slices of buffer, the second
+        one starting back at the start of the segment
+
+        :param index: int for the index of the Direction
+        :param start: int for the position in the queue of the first vehicle to be covered, 0 being the front
+        :param count: int for the number of vehicles to be covered
+        :return: list of (lo, hi) tuples, the bounds of each slice
+        """
+        offset = int(self.offsets[index])
+        capacity = int(self.capacities[index])
+        lo = (int(self.heads[index]) + int(start)) % capacity
+        first = min(int(count), capacity - lo)
+        spans = [(offset + lo, offset + lo + first)]
+        if first < count:
+            spans.append((offset, offset + int(count) - first))
+        return spans
+
+    def slots(self, starts: ndarray, counts: ndarray) -> ndarray:
+        """
+        Finds the indices into buffer covering part of the queue of every Direction at once
+
+        :param starts: ndarray of ints for the position in the queue of the first vehicle to be covered for each
+        Direction, 0 being the front
+        :param counts: ndarray of non-negative ints for the number of vehicles to be covered for each Direction
+        :return: ndarray of the indices into buffer, Direction by Direction
+        """
+        positions = ranges(self.heads + starts, counts)
+        return np.repeat(self.offsets, counts) + positions % np.repeat(self.capacities, counts)
+
+    def add_waiting_time(self, waiting_time: float, index: int = None) -> None:
+        """
+        Adds waiting time to each vehicle queued, either for every Direction or a single one
+
+        Adding waiting time to every Direction only advances the clock, so takes constant time no matter how many
+        vehicles are queued. For a single Direction, the arrival times of its vehicles are moved back instead
+
+        :param waiting_time: float for the waiting time to be added
+        :param index: int for the index of the Direction to add waiting time to, if None then it is added to all
+        :return: None
+        """
+        if index is None:
+            self.clock += waiting_time
+        elif index in self.lanes:
+            lanes = self.lanes_of(index)
+            for lane in range(lanes.num_lanes):
+                lanes.state.add_waiting_time(waiting_time, lane)
+            self.__sync_lanes(index)
+        else:
+            kernels.add_waiting_time(self.buffer, self.prefix, self.offsets, self.heads, self.capacities, self.lengths,
+                                     self.arrival_sums, index, float(waiting_time))
+            self.total_arrival_sum -= float(self.lengths[index] * waiting_time)
+            if self.debug:
+                self.verify()
+
+    def enqueue(self, index: int, waiting_times) -> None:
+        """
+        Adds vehicles to the back of the queue of a Direction
+
+        :param index: int for the index of the Direction
+        :param waiting_times: array-like for the waiting times of the vehicles to be added
+        :return: None
+        """
+        waiting_times = np.asarray(waiting_times, dtype=float).ravel()
+        if index in self.lanes:
+            lanes = self.lanes_of(index)
+            for lane, lane_waiting_times in enumerate(lanes.divide(waiting_times)):
+                lanes.state.enqueue(lane, lane_waiting_times)
+            self.__sync_lanes(index)
+            return
+        length = self.lengths[index]
+        if length + waiting_times.size > self.capacities[index]:
+            self.__grow(index, length + waiting_times.size)
+        arrivals = self.clock - waiting_times
+        prefix = self.prefix_bases[index] + self.arrival_sums[index] + np.cumsum(arrivals)
+        done = 0
+        for lo, hi in self.spans(index, length, waiting_times.size):
+            self.buffer[lo:hi] = arrivals[done:done + hi - lo]
+            self.prefix[lo:hi] = prefix[done:done + hi - lo]
+            done += hi - lo
+        self.lengths[index] += waiting_times.size
+        self.arrival_sums[index] += self.clock * waiting_times.size - waiting_times.sum()
+        self.total_vehicles += waiting_times.size
+        self.total_arrival_sum += float(self.clock * waiting_times.size - waiting_times.sum())
+        if self.debug:
+            self.verify()
+
+    def enqueue_counts(self, counts: ndarray) -> None:
+        """
+        Adds newly arrived vehicles, with no waiting time, to the back of the queue of every Direction at once
+
+        :param counts: ndarray of non-negative ints for the number of vehicles arriving for each Direction
+        :return: None
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        lane_counts = None
+        if self.lanes:
+            lane_counts = {index: int(counts[index]) for index in self.lanes}
+            counts = counts.copy()
+            counts[list(self.lanes)] = 0
+        self.reserve(counts)
+        kernels.insert_arrivals(self.buffer, self.prefix, self.offsets, self.heads, self.capacities, self.lengths,
+                                self.prefix_bases, self.arrival_sums, counts, self.clock)
+        total = int(counts.sum())
+        self.total_vehicles += total
+        self.total_arrival_sum += self.clock * total
+        if lane_counts:
+            for index, count in lane_counts.items():
+                lanes = self.lanes_of(index)
+                lanes.state.enqueue_counts(lanes.split(count))
+                self.__sync_lanes(index)
+        if self.debug:
+            self.verify()
+
+    def dequeue(self, index: int, count: int) -> ndarray:
+        """
+        Removes vehicles from the front of the queue of a Direction
+
+        Only the head of the ring is moved, so no vehicles are shifted. Once a queue is emptied its prefix sums start
+        again from zero, so they do not grow without bound over a long run
+
+        :param index: int for the index of the Direction
+        :param count: int for the number of vehicles to be removed, at most the number queued
+        :return: ndarray for the waiting times of the removed vehicles
+        """
+        assert 0 <= count <= self.lengths[index], "Cannot remove more vehicles than are queued!"
+        if index in self.lanes:
+            return self.discharge(index, self.lanes_of(index).allot(count))
+        served, removed = kernels.discharge(self.buffer, self.offsets, self.heads, self.capacities, self.lengths,
+                                            self.prefix_bases, self.arrival_sums, self.clock, index, int(count))
+        self.total_vehicles -= count
+        self.total_arrival_sum -= float(removed)
+        if self.total_vehicles == 0:
+            self.total_arrival_sum = 0.0
+        if self.debug:
+            self.verify()
+        return served
+
+    def dequeue_many(self, counts: ndarray) -> ndarray:
+        """
+        Removes vehicles from the front of the queue of every Direction at once
+
+        Directions with lanes are not handled, their rows hold no vehicles in the buffer
+
+        :param counts: ndarray of non-negative ints for the number of vehicles to be removed from each Direction, at
+        most the number queued
+        :return: ndarray for the waiting times of the removed vehicles, Direction by Direction
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        assert np.all((0 <= counts) & (counts <= self.lengths)), "Cannot remove more vehicles than are queued!"
+        served = self.clock - self.buffer[self.slots(np.zeros_like(counts), counts)]
+        served_sums = counts * self.clock - self.served_waiting_times(counts)
+        self.heads = (self.heads + counts) % self.capacities
+        self.lengths -= counts
+        emptied = self.lengths == 0
+        self.total_vehicles = int(self.lengths.sum())
+        self.arrival_sums = np.where(emptied, 0.0, self.arrival_sums - served_sums)
+        self.prefix_bases = np.where(emptied, 0.0, self.prefix_bases + served_sums)
+        self.total_arrival_sum = float(self.arrival_sums.sum())
+        if self.debug:
+            self.verify()
+        return served
+
+    def reserve(self, counts: ndarray) -> None:
+        """
+        Grows the segments of any Directions that do not have room for a number of vehicles more than are queued
+
+        As moving the buffer costs as much however few segments grow, every segment that would be at least half full is
+        given room for twice its vehicles at the same time. So the buffer is moved only a logarithmic number of times,
+        rather than once for each of the many rows of a state stacking many intersections
+
+        :param counts: ndarray of non-negative ints for the number of vehicles each Direction must have room for, on
+        top of those queued
+        :return: None
+        """
+        needed = self.__ring_lengths() + counts
+        if np.any(needed > self.capacities):
+            growing = np.flatnonzero(2 * needed > self.capacities)
+            self.__grow(growing, needed[growing])
+
+    def set_lanes(self, index: int, lanes, queues: list = None) -> None:
+        """
+        Gives a Direction lanes, or replaces the ones it has
+
+        :param index: int for the index of the Direction
+        :param lanes: Lanes object for the lanes of the Direction
+        :param queues: list of array-likes for the waiting times of the vehicles queued in each lane, from the front to
+        the back. If None then the vehicles already queued for the Direction are divided between the lanes
+        :return: None
+        """
+        if queues is None:
+            queues = lanes.divide(self.queue(index))
+        if index not in self.lanes:
+            self.dequeue(index, int(self.lengths[index]))
+        self.lanes[index] = lanes
+        lanes.reset(queues, self.clock, float(self.cycle_sizes[index]))
+        self.__sync_lanes(index)
+        if self.debug:
+            self.verify()
+
+    def lane_queues(self, index: int) -> list:
+        """
+        Returns the waiting times of the vehicles queued in each lane of a Direction with lanes
+
+        :param index: int for the index of the Direction
+        :return: list of ndarrays, one for each lane, from the front of its queue to the back
+        """
+        lanes = self.lanes_of(index)
+        return [lanes.state.queue(lane) for lane in range(lanes.num_lanes)]
+
+    def discharge(self, index: int, volumes: ndarray) -> ndarray:
+        """
+        Serves vehicles from the front of every lane of a Direction with lanes at once
+
+        :param index: int for the index of the Direction
+        :param volumes: ndarray of non-negative ints for the number of vehicles to be served from each lane
+        :return: ndarray for the waiting times of the served vehicles, lane by lane
+        """
+        served = self.lanes_of(index).state.dequeue_many(volumes)
+        self.__sync_lanes(index)
+        if self.debug:
+            self.verify()
+        return served
+
+    def lanes_of(self, index: int):
+        """
+        Finds the Lanes of a Direction, with the clock and cycle size of their state brought in line with this one
+
+        :param index: int for the index of the Direction
+        :return: Lanes object as described, None if the Direction has no lanes
+        """
+        lanes = self.lanes.get(index)
+        if lanes is None:
+            return None
+        lanes.state.clock = self.clock
+        lanes.state.cycle_sizes[:] = self.cycle_sizes[index]
+        return lanes
+
+    def __sync_lanes(self, index: int) -> None:
+        """
+        Brings the counters of the row of a Direction with lanes, and the totals of this state, in line with its lanes
+
+        :param index: int for the index of the Direction
+        :return: None
+        """
+        lanes_state = self.lanes[index].state
+        self.total_vehicles += lanes_state.total_vehicles - int(self.lengths[index])
+        self.total_arrival_sum += lanes_state.total_arrival_sum - float(self.arrival_sums[index])
+        self.lengths[index] = lanes_state.total_vehicles
+        self.arrival_sums[index] = lanes_state.total_arrival_sum
+        if self.total_vehicles == 0:
+            self.total_arrival_sum = 0.0
+
+    def __ring_lengths(self) -> ndarray:
+        """
+        Finds the number of vehicles held in the buffer for each Direction, which is none for those with lanes
+
+        :return: ndarray of ints as described
+        """
+        if not self.lanes:
+            return self.lengths
+        lengths = self.lengths.copy()
+        lengths[list(self.lanes)] = 0
+        return lengths
+
+    def add_row(self, waiting_times, avg_flow: float, cycle_size: float) -> int:
+        """
+        Adds a Direction to this state, as the last row, with its segment at the end of the buffer
+
+        Every other segment is left where it is, so adding a row costs a single copy of each column rather than laying
+        out every queue again. The new row arrives with nothing in the arrival block for it
+
+        :param waiting_times: array-like for the waiting times of the vehicles queued for the new Direction
+        :param avg_flow: float for the average flow per cycle of the new Direction
+        :param cycle_size: float for the cycle size of the new Direction
+        :return: int for the index of the new Direction
+        """
+        waiting_times = np.asarray(waiting_times, dtype=float).ravel()
+        capacity = IntersectionState.capacity_for(waiting_times.size)
+        index = self.num_directions
+        self.offsets = np.append(self.offsets, self.buffer.size)
+        self.buffer = np.concatenate((self.buffer, np.zeros(capacity)))
+        self.prefix = np.concatenate((self.prefix, np.zeros(capacity)))
+        self.capacities = np.append(self.capacities, capacity)
+        self.lengths = np.append(self.lengths, 0)
+        self.heads = np.append(self.heads, 0)
+        self.prefix_bases = np.append(self.prefix_bases, 0.0)
+        self.arrival_sums = np.append(self.arrival_sums, 0.0)
+        self.avg_flows = np.append(self.avg_flows, float(avg_flow))
+        self.cycle_sizes = np.append(self.cycle_sizes, float(cycle_size))
+        self.arrival_block = np.column_stack((self.arrival_block, np.zeros(self.arrival_block.shape[0],
+                                                                           dtype=np.int64)))
+        self.enqueue(index, waiting_times)
+        return index
+
+    def remove_row(self, index: int) -> None:
+        """
+        Removes a Direction from this state, moving the last row into its place
+
+        Only the fields of the last row are copied, and every column is then cut short by one, so removing a row takes
+        constant time. The segment of the removed Direction is left unused until the buffer is next laid out again, when
+        a segment grows
+
+        :param index: int for the index of the Direction to be removed. The Direction that had the last index has this
+        one afterwards
+        :return: None
+        """
+        last = self.num_directions - 1
+        assert 0 <= index <= last, "No Direction has this index!"
+        self.lanes.pop(index, None)
+        if last in self.lanes:
+            self.lanes[index] = self.lanes.pop(last)
+        self.total_vehicles -= int(self.lengths[index])
+        self.total_arrival_sum -= float(self.arrival_sums[index])
+        if self.total_vehicles == 0:
+            self.total_arrival_sum = 0.0
+        for column in (self.lengths, self.capacities, self.offsets, self.heads, self.prefix_bases, self.arrival_sums,
+                       self.avg_flows, self.cycle_sizes):
+            column[index] = column[last]
+        self.arrival_block[:, index] = self.arrival_block[:, last]
+        self.lengths, self.capacities, self.offsets = self.lengths[:last], self.capacities[:last], self.offsets[:last]
+        self.heads, self.prefix_bases, self.arrival_sums = self.heads[:last], self.prefix_bases[:last], \
+            self.arrival_sums[:last]
+        self.avg_flows, self.cycle_sizes = self.avg_flows[:last], self.cycle_sizes[:last]
+        self.arrival_block = self.arrival_block[:, :last]
+        if self.debug:
+            self.verify()
+
+    def verify(self) -> None:
+        """
+        Checks the counters kept by this state against a full recompute from the arrival times in the buffer
+
+        :return: None
+        """
+        ring_lengths = self.__ring_lengths()
+        arrivals = self.buffer[self.slots(np.zeros_like(ring_lengths), ring_lengths)]
+        arrival_sums = np.bincount(np.repeat(np.arange(self.num_directions), ring_lengths), weights=arrivals,
+                                   minlength=self.num_directions)
+        for index, lanes in self.lanes.items():
+            lanes.state.verify()
+            assert self.lengths[index] == lanes.state.total_vehicles, "Number of vehicles in lanes is out of step!"
+            arrival_sums[index] = lanes.state.total_arrival_sum
+        assert self.total_vehicles == self.lengths.sum(), "Total number of vehicles is out of step!"
+        assert np.allclose(arrival_sums, self.arrival_sums), "Sums of arrival times are out of step!"
+        assert np.isclose(self.total_arrival_sum, arrival_sums.sum()), "Total of arrival times is out of step!"
+
+    def snapshot(self) -> dict:
+        """
+        Copies everything needed to restore this state later into a dict of arrays
+
+        Only the vehicles still queued are copied, each ring unrolled from its head, so a snapshot is no larger than
+        the queues themselves however much room the segments have to grow. Prefix sums are kept as they are, so a
+        restored state carries on exactly as this one would
+
+        :return: dict mapping the name of each field to an ndarray
+        """
+        ring_lengths = self.__ring_lengths()
+        live = self.slots(np.zeros_like(ring_lengths), ring_lengths)
+        snapshot = {"arrivals": self.buffer[live], "prefix": self.prefix[live], "prefix_bases": self.prefix_bases.copy(),
+                "lengths": self.lengths.copy(), "arrival_sums": self.arrival_sums.copy(),
+                "avg_flows": self.avg_flows.copy(), "cycle_sizes": self.cycle_sizes.copy(),
+                "arrival_block": self.arrival_block[self.arrival_pos:].copy(), "clock": np.array(self.clock),
+                "total_vehicles": np.array(self.total_vehicles), "total_arrival_sum": np.array(self.total_arrival_sum)}
+        for index in self.lanes:
+            lanes = self.lanes_of(index)
+            for name, value in lanes.state.snapshot().items():
+                snapshot["lanes%d_%s" % (index, name)] = value
+        return snapshot
+
+    def restore(self, snapshot: dict) -> None:
+        """
+        Replaces everything held by this state with a snapshot, taken from a state with the same number of Directions,
+        and lanes for the same ones
+
+        :param snapshot: dict of arrays as made by snapshot
+        :return: None
+        """
+        assert snapshot["lengths"].size == self.num_directions, "Snapshot must have the same number of Directions!"
+        assert all(("lanes%d_lengths" % index) in snapshot for index in self.lanes), \
+            "Snapshot must have lanes for the same Directions!"
+        self.lengths = np.array(snapshot["lengths"], dtype=np.int64)
+        ring_lengths = self.__ring_lengths()
+        self.capacities = np.array([IntersectionState.capacity_for(length) for length in ring_lengths], dtype=np.int64)
+        self.offsets = IntersectionState.__offsets_for(self.capacities)
+        self.heads = np.zeros_like(self.lengths)
+        live = ranges(self.offsets, ring_lengths)
+        self.buffer = np.zeros(int(self.capacities.sum()))
+        self.buffer[live] = snapshot["arrivals"]
+        self.prefix = np.zeros(self.buffer.size)
+        self.prefix[live] = snapshot["prefix"]
+        self.prefix_bases = np.array(snapshot["prefix_bases"], dtype=float)
+        self.arrival_sums = np.array(snapshot["arrival_sums"], dtype=float)
+        self.avg_flows = np.array(snapshot["avg_flows"], dtype=float)
+        self.cycle_sizes = np.array(snapshot["cycle_sizes"], dtype=float)
+        self.arrival_block = np.array(snapshot["arrival_block"], dtype=np.int64)
+        self.arrival_pos = 0
+        self.clock = float(snapshot["clock"])
+        self.total_vehicles = int(snapshot["total_vehicles"])
+        self.total_arrival_sum = float(snapshot["total_arrival_sum"])
+        for index, lanes in self.lanes.items():
+            prefix = "lanes%d_" % index
+            lanes.state.restore({name[len(prefix):]: value for name, value in snapshot.items()
+                                 if name.startswith(prefix)})
+        if self.debug:
+            self.verify()
+
+    def __grow(self, indices, num_vehicles) -> None:
+        """
+        Grows the segments of one or more Directions so each can hold a number of vehicles, moving every segment into a
+        new buffer
+
+        The capacity of each segment is at least doubled, so growing happens only a logarithmic number of times, and
+        every segment that has to grow does so in the same move of the buffer. Each ring is unrolled as it is moved, so
+        every head starts back at zero, and its prefix sums are rebased to start from zero
+
+        :param indices: int or ndarray of ints for the index of each Direction
+        :param num_vehicles: int or ndarray of ints for the number of vehicles each segment must be able to hold
+        :return: None
+        """
+        indices = np.atleast_1d(indices)
+        capacities = self.capacities.copy()
+        capacities[indices] = np.maximum(2 * capacities[indices], [IntersectionState.capacity_for(int(n))
+                                                                    for n in np.atleast_1d(num_vehicles)])
+        offsets = IntersectionState.__offsets_for(capacities)
+        ring_lengths = self.__ring_lengths()
+        old = self.slots(np.zeros_like(ring_lengths), ring_lengths)
+        new = ranges(offsets, ring_lengths)
+        buffer = np.zeros(int(capacities.sum()))
+        buffer[new] = self.buffer[old]
+        prefix = np.zeros(buffer.size)
+        prefix[new] = self.prefix[old] - np.repeat(self.prefix_bases, ring_lengths)
+        self.buffer, self.prefix, self.offsets, self.capacities = buffer, prefix, offsets, capacities
+        self.heads = np.zeros_like(self.lengths)
+        self.prefix_bases = np.zeros(self.lengths.size)
+
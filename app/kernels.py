@@ -0,0 +1,478 @@
+"""
+Kernels for the hot paths of a run over the arrays of an IntersectionState: finding a cycle volume, adding waiting time
+to a single Direction, discharging vehicles and inserting arrivals, along with a loop running many cycles of an
+Intersection at once. The _many kernels, and cycle_volumes, do the same for the rows of a state stacking many
+intersections, each row against a clock of its own, as for the replicas of an Ensemble or the junctions of a
+RoadNetwork
+
+Each kernel has a NumPy version, and a version written as plain loops that is compiled with Numba when it is installed.
+For the small queues of a single cycle, the time taken by NumPy is mostly spent dispatching each call rather than doing
+the work, which compiled loops do not pay. The compiled kernels are used whenever Numba can be imported, otherwise the
+NumPy ones are, so nothing changes for code calling them, and use_backend switches between them, as for benchmarks
+"""
+import numpy as np
+from numpy import ndarray
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ("numpy", "numba")
+
+
+def ranges(starts: ndarray, counts: ndarray) -> ndarray:
+    """
+    Finds the flat indices covered by a number of ranges, each given by a start and a count
+
+    :param starts: ndarray of ints for the start of each range
+    :param counts: ndarray of non-negative ints for the length of each range
+    :return: ndarray of the indices, range by range
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - (ends - counts), counts) + np.arange(ends[-1] if ends.size else 0)
+
+
+def cycle_volume_loop(prefix, offsets, heads, capacities, prefix_bases, lengths, arrival_sums, cycle_sizes, clock,
+                      index):
+    """
+    Finds the cycle volume of a Direction by a binary search over the prefix sums of its queue, as
+    IntersectionState.cycle_volume describes
+
+    This is already a loop over scalars, so the same function is used by both backends, compiled for Numba
+
+    :param prefix: ndarray of the prefix sums of the arrival times, as held by IntersectionState
+    :param offsets: ndarray of ints for the offset of the segment of each Direction
+    :param heads: ndarray of ints for the position of the front of the queue of each Direction in its segment
+    :param capacities: ndarray of ints for the capacity of the segment of each Direction
+    :param prefix_bases: ndarray for the sum of the arrival times of the vehicles already served from each Direction
+    :param lengths: ndarray of ints for the number of vehicles queued for each Direction
+    :param arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+    :param cycle_sizes: ndarray for the cycle size of each Direction
+    :param clock: float for the current time
+    :param index: int for the index of the Direction
+    :return: int for the cycle volume
+    """
+    length = lengths[index]
+    curr_total = length * clock - arrival_sums[index]
+    req_removed = curr_total - int(curr_total * cycle_sizes[index])
+    if req_removed <= 0:
+        return 0
+    offset, head, capacity, base = offsets[index], heads[index], capacities[index], prefix_bases[index]
+    lo, hi = 1, length
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if mid * clock - (prefix[offset + (head + mid - 1) % capacity] - base) >= req_removed:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def cycle_volumes_loop(prefix, offsets, heads, capacities, prefix_bases, lengths, arrival_sums, cycle_sizes, clocks,
+                       rows):
+    """
+    Finds the cycle volumes of a number of Directions, each against a clock of its own, as cycle_volume_loop does, one
+    Direction at a time
+
+    This is for the rows of a state that stacks many intersections, such as the replicas of an Ensemble or the junctions
+    of a RoadNetwork, whose clocks differ
+
+    :param clocks: ndarray for the current time of each Direction in rows
+    :param rows: ndarray of ints for the index of each Direction
+    :return: ndarray of ints for the cycle volume of each Direction
+    """
+    volumes = np.empty(rows.size, dtype=np.int64)
+    for k in range(rows.size):
+        volumes[k] = cycle_volume(prefix, offsets, heads, capacities, prefix_bases, lengths, arrival_sums, cycle_sizes,
+                                  clocks[k], rows[k])
+    return volumes
+
+
+def cycle_volumes_numpy(prefix, offsets, heads, capacities, prefix_bases, lengths, arrival_sums, cycle_sizes, clocks,
+                        rows):
+    """
+    Finds the cycle volumes of a number of Directions, each against a clock of its own, as cycle_volumes_loop does,
+    with the binary searches of every Direction done together, one step at a time
+
+    :return: ndarray of ints as for cycle_volumes_loop
+    """
+    lengths = lengths[rows]
+    curr_totals = lengths * clocks - arrival_sums[rows]
+    req_removed = curr_totals - np.floor(curr_totals * cycle_sizes[rows])
+    offsets, heads, capacities, bases = offsets[rows], heads[rows], capacities[rows], prefix_bases[rows]
+    lo = np.minimum(1, lengths)
+    hi = lengths.copy()
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        enough = mid * clocks - (prefix[offsets + (heads + mid - 1) % capacities] - bases) >= req_removed
+        hi = np.where(enough, mid, hi)
+        lo = np.where(enough, lo, mid + 1)
+    return np.where(req_removed > 0, lo, 0)
+
+
+def add_waiting_time_loop(buffer, prefix, offsets, heads, capacities, lengths, arrival_sums, index, waiting_time):
+    """
+    Adds waiting time to every vehicle queued for a single Direction by moving their arrival times back, one vehicle
+    at a time
+
+    :param buffer: ndarray of the arrival times of every vehicle, as held by IntersectionState
+    :param prefix: ndarray of the prefix sums of the arrival times
+    :param offsets: ndarray of ints for the offset of the segment of each Direction
+    :param heads: ndarray of ints for the position of the front of the queue of each Direction in its segment
+    :param capacities: ndarray of ints for the capacity of the segment of each Direction
+    :param lengths: ndarray of ints for the number of vehicles queued for each Direction
+    :param arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+    :param index: int for the index of the Direction
+    :param waiting_time: float for the waiting time to be added
+    :return: None
+    """
+    offset, head, capacity, length = offsets[index], heads[index], capacities[index], lengths[index]
+    for k in range(length):
+        slot = offset + (head + k) % capacity
+        buffer[slot] -= waiting_time
+        prefix[slot] -= (k + 1) * waiting_time
+    arrival_sums[index] -= length * waiting_time
+
+
+def add_waiting_time_numpy(buffer, prefix, offsets, heads, capacities, lengths, arrival_sums, index, waiting_time):
+    """
+    Adds waiting time to every vehicle queued for a single Direction, a slice of its segment at a time, as
+    add_waiting_time_loop does
+
+    :return: None
+    """
+    done = 0
+    for lo, hi in _spans(offsets[index], heads[index], capacities[index], lengths[index]):
+        buffer[lo:hi] -= waiting_time
+        prefix[lo:hi] -= np.arange(done + 1, done + 1 + hi - lo) * waiting_time
+        done += hi - lo
+    arrival_sums[index] -= lengths[index] * waiting_time
+
+
+def discharge_loop(buffer, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, clock, index, count):
+    """
+    Removes vehicles from the front of the queue of a Direction, one vehicle at a time
+
+    :param buffer: ndarray of the arrival times of every vehicle, as held by IntersectionState
+    :param offsets: ndarray of ints for the offset of the segment of each Direction
+    :param heads: ndarray of ints for the position of the front of the queue of each Direction in its segment
+    :param capacities: ndarray of ints for the capacity of the segment of each Direction
+    :param lengths: ndarray of ints for the number of vehicles queued for each Direction
+    :param prefix_bases: ndarray for the sum of the arrival times of the vehicles already served from each Direction
+    :param arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+    :param clock: float for the current time
+    :param index: int for the index of the Direction
+    :param count: int for the number of vehicles to be removed, at most the number queued
+    :return: tuple of an ndarray for the waiting times of the removed vehicles, and the float to be taken off the total
+    of the arrival times of the state
+    """
+    offset, head, capacity = offsets[index], heads[index], capacities[index]
+    served = np.empty(count)
+    total = 0.0
+    for k in range(count):
+        arrival = buffer[offset + (head + k) % capacity]
+        served[k] = clock - arrival
+        total += arrival
+    heads[index] = (head + count) % capacity
+    lengths[index] -= count
+    if lengths[index] == 0:
+        total = arrival_sums[index]
+        arrival_sums[index] = 0.0
+        prefix_bases[index] = 0.0
+    else:
+        arrival_sums[index] -= total
+        prefix_bases[index] += total
+    return served, total
+
+
+def discharge_numpy(buffer, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, clock, index, count):
+    """
+    Removes vehicles from the front of the queue of a Direction, a slice of its segment at a time, as discharge_loop
+    does
+
+    :return: tuple as for discharge_loop
+    """
+    served = np.concatenate([buffer[lo:hi] for lo, hi in _spans(offsets[index], heads[index], capacities[index],
+                                                                count)])
+    heads[index] = (heads[index] + count) % capacities[index]
+    lengths[index] -= count
+    if lengths[index] == 0:
+        total = float(arrival_sums[index])
+        arrival_sums[index] = 0.0
+        prefix_bases[index] = 0.0
+    else:
+        total = float(served.sum())
+        arrival_sums[index] -= total
+        prefix_bases[index] += total
+    return clock - served, total
+
+
+def discharge_many_loop(prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, rows, counts):
+    """
+    Removes vehicles from the front of the queues of a number of Directions, one Direction at a time. Only the sum of
+    the arrival times of the vehicles removed from each is found, from the prefix sums, rather than their waiting times
+
+    :param prefix: ndarray of the prefix sums of the arrival times, as held by IntersectionState
+    :param offsets: ndarray of ints for the offset of the segment of each Direction
+    :param heads: ndarray of ints for the position of the front of the queue of each Direction in its segment
+    :param capacities: ndarray of ints for the capacity of the segment of each Direction
+    :param lengths: ndarray of ints for the number of vehicles queued for each Direction
+    :param prefix_bases: ndarray for the sum of the arrival times of the vehicles already served from each Direction
+    :param arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+    :param rows: ndarray of ints for the index of each Direction, without repeats
+    :param counts: ndarray of ints for the number of vehicles to be removed from each Direction in rows, at most the
+    number queued
+    :return: ndarray for the sum of the arrival times of the vehicles removed from each Direction in rows
+    """
+    removed = np.zeros(rows.size)
+    for k in range(rows.size):
+        index, count = rows[k], counts[k]
+        if count == 0:
+            continue
+        capacity = capacities[index]
+        removed[k] = prefix[offsets[index] + (heads[index] + count - 1) % capacity] - prefix_bases[index]
+        heads[index] = (heads[index] + count) % capacity
+        lengths[index] -= count
+        if lengths[index] == 0:
+            removed[k] = arrival_sums[index]
+            arrival_sums[index] = 0.0
+            prefix_bases[index] = 0.0
+        else:
+            arrival_sums[index] -= removed[k]
+            prefix_bases[index] += removed[k]
+    return removed
+
+
+def discharge_many_numpy(prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, rows, counts):
+    """
+    Removes vehicles from the front of the queues of a number of Directions at once, as discharge_many_loop does
+
+    :return: ndarray as for discharge_many_loop
+    """
+    last = offsets[rows] + (heads[rows] + counts - 1) % capacities[rows]
+    removed = np.where(counts > 0, prefix[last] - prefix_bases[rows], 0.0)
+    heads[rows] = (heads[rows] + counts) % capacities[rows]
+    lengths[rows] -= counts
+    emptied = lengths[rows] == 0
+    removed = np.where(emptied, arrival_sums[rows], removed)
+    arrival_sums[rows] = np.where(emptied, 0.0, arrival_sums[rows] - removed)
+    prefix_bases[rows] = np.where(emptied, 0.0, prefix_bases[rows] + removed)
+    return removed
+
+
+def insert_arrivals_loop(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, counts,
+                         clock):
+    """
+    Adds newly arrived vehicles to the back of the queue of every Direction, one vehicle at a time. Every segment must
+    already have room for them
+
+    :param buffer: ndarray of the arrival times of every vehicle, as held by IntersectionState
+    :param prefix: ndarray of the prefix sums of the arrival times
+    :param offsets: ndarray of ints for the offset of the segment of each Direction
+    :param heads: ndarray of ints for the position of the front of the queue of each Direction in its segment
+    :param capacities: ndarray of ints for the capacity of the segment of each Direction
+    :param lengths: ndarray of ints for the number of vehicles queued for each Direction
+    :param prefix_bases: ndarray for the sum of the arrival times of the vehicles already served from each Direction
+    :param arrival_sums: ndarray for the sum of the arrival times of the vehicles queued for each Direction
+    :param counts: ndarray of non-negative ints for the number of vehicles arriving for each Direction
+    :param clock: float for the current time, the arrival time of every vehicle added
+    :return: None
+    """
+    for index in range(lengths.size):
+        count = counts[index]
+        if count == 0:
+            continue
+        offset, start, capacity = offsets[index], heads[index] + lengths[index], capacities[index]
+        base = prefix_bases[index] + arrival_sums[index]
+        for k in range(count):
+            slot = offset + (start + k) % capacity
+            buffer[slot] = clock
+            prefix[slot] = base + (k + 1) * clock
+        lengths[index] += count
+        arrival_sums[index] += clock * count
+
+
+def insert_arrivals_numpy(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, counts,
+                          clock):
+    """
+    Adds newly arrived vehicles to the back of the queue of every Direction with a handful of vectorized calls, as
+    insert_arrivals_loop does
+
+    :return: None
+    """
+    slots = np.repeat(offsets, counts) + ranges(heads + lengths, counts) % np.repeat(capacities, counts)
+    buffer[slots] = clock
+    prefix[slots] = np.repeat(prefix_bases + arrival_sums, counts) + ranges(np.ones_like(counts), counts) * clock
+    lengths += counts
+    arrival_sums += clock * counts
+
+
+def insert_arrivals_many_loop(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, counts,
+                              clocks):
+    """
+    Adds newly arrived vehicles to the back of the queue of every Direction, each against a clock of its own, as
+    insert_arrivals_loop does. Every segment must already have room for them
+
+    :param counts: ndarray of non-negative ints for the number of vehicles arriving for each Direction
+    :param clocks: ndarray for the current time of each Direction, the arrival time of every vehicle added to it
+    :return: None
+    """
+    for index in range(lengths.size):
+        count = counts[index]
+        if count == 0:
+            continue
+        offset, start, capacity, clock = offsets[index], heads[index] + lengths[index], capacities[index], clocks[index]
+        base = prefix_bases[index] + arrival_sums[index]
+        for k in range(count):
+            slot = offset + (start + k) % capacity
+            buffer[slot] = clock
+            prefix[slot] = base + (k + 1) * clock
+        lengths[index] += count
+        arrival_sums[index] += clock * count
+
+
+def insert_arrivals_many_numpy(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, counts,
+                               clocks):
+    """
+    Adds newly arrived vehicles to the back of the queue of every Direction, each against a clock of its own, with a
+    handful of vectorized calls, as insert_arrivals_many_loop does
+
+    :return: None
+    """
+    slots = np.repeat(offsets, counts) + ranges(heads + lengths, counts) % np.repeat(capacities, counts)
+    arrivals = np.repeat(clocks, counts)
+    buffer[slots] = arrivals
+    prefix[slots] = np.repeat(prefix_bases + arrival_sums, counts) + ranges(np.ones_like(counts), counts) * arrivals
+    lengths += counts
+    arrival_sums += clocks * counts
+
+
+def _spans(offset: int, head: int, capacity: int, count: int) -> list:
+    """
+    Finds the slices of buffer covering the front of the queue of a Direction, as IntersectionState.spans does
+
+    :param offset: int for the offset of the segment of the Direction
+    :param head: int for the position of the front of its queue in its segment
+    :param capacity: int for the capacity of its segment
+    :param count: int for the number of vehicles to be covered
+    :return: list of (lo, hi) tuples, the bounds of each slice
+    """
+    offset, head, capacity, count = int(offset), int(head), int(capacity), int(count)
+    first = min(count, capacity - head)
+    spans = [(offset + head, offset + head + first)]
+    if first < count:
+        spans.append((offset, offset + count - first))
+    return spans
+
+
+def run_cycles_loop(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, cycle_sizes,
+                    arrival_block, arrival_pos, following, start, n, pass_durr, clock, total_vehicles, total_arrival_sum):
+    """
+    Runs many cycles over the arrays of a state, as run_cycles describes, with the kernels of the backend in use. When
+    compiled, the kernels of the Numba backend are compiled into it, so the whole loop runs without Python
+
+    :return: tuple of the index of the Direction to be served next, the index of the Direction served and the number of
+    vehicles served in each cycle, the waiting times of every vehicle served, and the clock, total number of vehicles
+    and total of the arrival times of the state afterwards
+    """
+    served_rows = np.empty(n, dtype=np.int64)
+    volumes = np.zeros(n, dtype=np.int64)
+    waits = np.empty(total_vehicles + arrival_block[arrival_pos:arrival_pos + n].sum())
+    num_served = 0
+    index = start
+    for cycle in range(n):
+        served_rows[cycle] = index
+        cycle_durr = 0.0
+        if lengths[index] > 0:
+            volume = cycle_volume(prefix, offsets, heads, capacities, prefix_bases, lengths, arrival_sums, cycle_sizes,
+                                  clock, index)
+            served, removed = discharge(buffer, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, clock,
+                                        index, volume)
+            waits[num_served:num_served + volume] = served
+            num_served += volume
+            volumes[cycle] = volume
+            total_vehicles -= volume
+            total_arrival_sum -= removed
+            if total_vehicles == 0:
+                total_arrival_sum = 0.0
+            cycle_durr = volume * pass_durr
+        clock += cycle_durr + 2
+        counts = arrival_block[arrival_pos + cycle]
+        insert_arrivals(buffer, prefix, offsets, heads, capacities, lengths, prefix_bases, arrival_sums, counts, clock)
+        total = counts.sum()
+        total_vehicles += total
+        total_arrival_sum += clock * total
+        index = following[index]
+    return index, served_rows, volumes, waits[:num_served], clock, total_vehicles, total_arrival_sum
+
+
+def use_backend(name: str) -> None:
+    """
+    Switches the kernels used by every IntersectionState to those of a backend
+
+    The Numba kernels are compiled the first time each is called, and cached on disk for later runs
+
+    :param name: str for the backend, "numpy", or "numba" if it is installed
+    :return: None
+    """
+    global backend, cycle_volume, add_waiting_time, discharge, insert_arrivals, cycle_volumes, discharge_many, \
+        insert_arrivals_many, run_loop
+    assert name in BACKENDS, "Backend must be one of " + ", ".join(BACKENDS) + "!"
+    assert name != "numba" or numba is not None, "Numba must be installed to use its kernels!"
+    if name == "numba":
+        cycle_volume, add_waiting_time, discharge, insert_arrivals, cycle_volumes, discharge_many, \
+            insert_arrivals_many, run_loop = COMPILED
+    else:
+        cycle_volume, add_waiting_time, discharge, insert_arrivals, cycle_volumes, discharge_many, \
+            insert_arrivals_many, run_loop = cycle_volume_loop, add_waiting_time_numpy, discharge_numpy, \
+            insert_arrivals_numpy, cycle_volumes_numpy, discharge_many_numpy, insert_arrivals_many_numpy, \
+            run_cycles_loop
+    backend = name
+
+
+def run_cycles(state, n: int, following: ndarray, start: int, pass_durr: float = 1) -> tuple:
+    """
+    Runs many cycles of an Intersection at once, serving every Direction in turn for its cycle volume as a Controller
+    with a RoundRobin policy does, without returning to Python between cycles when Numba is used
+
+    Arrivals are taken from the arrival block of the state, which must have a row left for every cycle. Every segment
+    is grown first so it has room for all of them, so nothing is reallocated along the way. Directions with lanes are
+    not handled
+
+    :param state: IntersectionState object to be run
+    :param n: int for the number of cycles to be run
+    :param following: ndarray of ints for the index of the Direction after each one
+    :param start: int for the index of the Direction to be served first
+    :param pass_durr: float for the time it takes a single vehicle to exit the intersection
+    :return: tuple of the int index of the Direction to be served next, an ndarray of the index of the Direction served
+    in each cycle, an ndarray of the number of vehicles served in each cycle, and an ndarray of the waiting times of
+    every vehicle served, cycle by cycle
+    """
+    assert not state.lanes, "Directions with lanes cannot be run by the kernels!"
+    assert state.arrival_pos + n <= state.arrival_block.shape[0], "Arrivals must have been drawn for every cycle!"
+    state.reserve(state.arrival_block[state.arrival_pos:state.arrival_pos + n].sum(axis=0))
+    index, served_rows, volumes, waits, state.clock, total_vehicles, total_arrival_sum = run_loop(
+        state.buffer, state.prefix, state.offsets, state.heads, state.capacities, state.lengths, state.prefix_bases,
+        state.arrival_sums, state.cycle_sizes, state.arrival_block, state.arrival_pos,
+        np.asarray(following, dtype=np.int64), int(start), int(n), float(pass_durr), float(state.clock),
+        int(state.total_vehicles), float(state.total_arrival_sum))
+    state.total_vehicles, state.total_arrival_sum = int(total_vehicles), float(total_arrival_sum)
+    state.arrival_pos += n
+    if state.debug:
+        state.verify()
+    return int(index), served_rows, volumes, waits
+
+
+if numba is not None:
+    _jit = numba.njit(cache=True, nogil=True)
+    COMPILED = tuple(_jit(kernel) for kernel in (cycle_volume_loop, add_waiting_time_loop, discharge_loop,
+                                                  insert_arrivals_loop))
+    # The loops find the kernels they call as globals when they are compiled, which must then be the compiled ones
+    cycle_volume, add_waiting_time, discharge, insert_arrivals = COMPILED
+    COMPILED += tuple(_jit(kernel) for kernel in (cycle_volumes_loop, discharge_many_loop, insert_arrivals_many_loop,
+                                                  run_cycles_loop))
+else:
+    COMPILED = None
+use_backend("numba" if numba is not None else "numpy")
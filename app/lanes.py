@@ -0,0 +1,163 @@
+import numpy as np
+from numpy import ndarray
+
+from app.intersection_state import IntersectionState
+
+
+class Lanes:
+    """
+    Class holding the lanes of a Direction with more than one, such as a lane for each of turning left, going straight
+    and turning right, that discharge in parallel
+
+    The queues of the lanes form a 2-D queue, lanes by vehicles, held as the rows of an IntersectionState of their own,
+    with arrival times measured against the clock of the IntersectionState of the Direction. So finding the cycle
+    volume of every lane, and serving them all, are each a single vectorized pass over the lanes, just as for the
+    Directions of an Intersection. The row of the Direction itself keeps the number of vehicles and the sum of arrival
+    times across all its lanes, so everything that only reads those, such as policies, sees a Direction with lanes the
+    same as any other
+
+    Arriving vehicles are split between the lanes by a share for each, deterministically, so the random stream of the
+    Direction is the same however many lanes it has. Each lane discharges at its own saturation flow, relative to a
+    Direction of a single lane, so a cycle lasts as long as the slowest of the lanes served takes to discharge
+
+    Attributes
+        movements: list of str for the movement of each lane, by which phases pick the lanes they serve
+        saturations: ndarray of floats for the number of vehicles each lane discharges in the time it takes a single
+        lane to discharge one
+        shares: ndarray of floats for the proportion of arriving vehicles joining each lane, summing to 1
+        state: IntersectionState object holding the queue of each lane as a row, set up once the lanes are given to a
+        Direction
+    """
+
+    def __init__(self, movements: list, saturations: list = None, shares: list = None):
+        """
+        Initializer for a Lanes object
+
+        :param movements: list of at least 2 str, the movement of each lane, each different
+        :param saturations: list of positive floats for the saturation flow of each lane, if None then each
+        discharges as a single lane does
+        :param shares: list of non-negative floats for the proportion of arrivals joining each lane, normalised to sum
+        to 1, if None then arrivals are split evenly
+        """
+        self.movements = [str(movement) for movement in movements]
+        num_lanes = len(self.movements)
+        assert num_lanes >= 2, "Lanes must be at least 2, a Direction of one lane does not need them!"
+        assert len(set(self.movements)) == num_lanes, "Each lane must have a different movement!"
+        self.saturations = np.ones(num_lanes) if saturations is None else np.asarray(saturations, dtype=float)
+        shares = np.ones(num_lanes) if shares is None else np.asarray(shares, dtype=float)
+        assert self.saturations.size == shares.size == num_lanes, "Each lane must have a saturation and a share!"
+        assert np.all(self.saturations > 0), "Saturation flows must be positive!"
+        assert np.all(shares >= 0) and shares.sum() > 0, "Shares must be non-negative, and not all zero!"
+        self.shares = shares / shares.sum()
+        self.state = IntersectionState([()] * num_lanes, np.zeros(num_lanes), np.full(num_lanes, 0.5))
+
+    @property
+    def num_lanes(self) -> int:
+        """
+        Finds the number of lanes
+
+        :return: int as described
+        """
+        return len(self.movements)
+
+    def reset(self, queues: list, clock: float, cycle_size: float) -> None:
+        """
+        Replaces the queue of every lane
+
+        :param queues: list of array-likes for the waiting times of the vehicles queued in each lane, from the front to
+        the back
+        :param clock: float for the clock the arrival times are measured against
+        :param cycle_size: float for the cycle size of the Direction
+        :return: None
+        """
+        assert len(queues) == self.num_lanes, "Each lane must have a queue!"
+        self.state = IntersectionState(queues, np.zeros(self.num_lanes), np.full(self.num_lanes, cycle_size), clock)
+
+    def split(self, num_vehicles: int) -> ndarray:
+        """
+        Splits a number of arriving vehicles between the lanes by their shares, by largest remainder
+
+        :param num_vehicles: int for the number of vehicles arriving
+        :return: ndarray of ints for the number joining each lane, summing to num_vehicles
+        """
+        return Lanes.apportion(num_vehicles, self.shares)
+
+    def assign(self, num_vehicles: int) -> ndarray:
+        """
+        Assigns each of a line of vehicles to a lane, so each lane gets its share and they are interleaved along the
+        line, rather than the first lane getting the front of it
+
+        :param num_vehicles: int for the number of vehicles
+        :return: ndarray of ints for the lane of each vehicle, in order
+        """
+        counts = self.split(num_vehicles)
+        lanes = np.repeat(np.arange(self.num_lanes), counts)
+        positions = (np.arange(num_vehicles) - np.repeat(np.cumsum(counts) - counts, counts) + 0.5) \
+            / np.repeat(np.maximum(counts, 1), counts)
+        return lanes[np.argsort(positions, kind="stable")]
+
+    def divide(self, waiting_times) -> list:
+        """
+        Divides a line of vehicles between the lanes, as assign does, keeping their order within each lane
+
+        :param waiting_times: array-like for the waiting times of the vehicles, from the front of the line to the back
+        :return: list of ndarrays for the waiting times of the vehicles joining each lane
+        """
+        waiting_times = np.asarray(waiting_times, dtype=float).ravel()
+        lane_of = self.assign(waiting_times.size)
+        return [waiting_times[lane_of == lane] for lane in range(self.num_lanes)]
+
+    def allot(self, volume: int = None, movements: list = None) -> ndarray:
+        """
+        Finds the number of vehicles to be served from each lane for a cycle
+
+        Each lane served is given its own cycle volume, found for every lane at once. A volume for the whole Direction
+        is shared between the lanes served in proportion to their cycle volumes, or their lengths if none has one, so
+        it is served in parallel, no lane being given more than it holds
+
+        :param volume: int for the total number of vehicles to be served, if None then the total of the cycle volumes
+        of the lanes served
+        :param movements: list of str for the movements of the lanes to be served, if None then every lane is served
+        :return: ndarray of ints for the number of vehicles to be served from each lane
+        """
+        served = np.ones(self.num_lanes, dtype=bool) if movements is None else np.isin(self.movements, movements)
+        lengths = np.where(served, self.state.lengths, 0)
+        volumes = np.where(served, self.state.cycle_volumes(), 0)
+        if volume is None or volume == volumes.sum():
+            return volumes
+        volume = min(int(volume), int(lengths.sum()))
+        weights = volumes if volumes.sum() > 0 else lengths
+        volumes = np.minimum(Lanes.apportion(volume, weights), lengths) if volume > 0 else np.zeros_like(lengths)
+        short = volume - volumes.sum()
+        while short > 0:
+            room = lengths - volumes
+            extra = np.minimum(Lanes.apportion(short, room), room)
+            volumes += extra
+            short -= extra.sum()
+        return volumes
+
+    def green_time(self, volumes: ndarray) -> float:
+        """
+        Finds how long it takes to serve a number of vehicles from each lane in parallel, in units of the time it takes
+        a single lane to discharge one vehicle
+
+        :param volumes: ndarray of ints for the number of vehicles served from each lane
+        :return: float as described
+        """
+        return float(np.max(volumes / self.saturations))
+
+    @staticmethod
+    def apportion(total: int, weights: ndarray) -> ndarray:
+        """
+        Splits a whole number in proportion to weights, by largest remainder, ties going to the first
+
+        :param total: int for the number to be split
+        :param weights: ndarray of non-negative weights, not all zero
+        :return: ndarray of ints summing to total
+        """
+        exact = total * np.asarray(weights, dtype=float) / np.sum(weights)
+        counts = np.floor(exact).astype(np.int64)
+        remainder = total - int(counts.sum())
+        if remainder > 0:
+            counts[np.argsort(counts - exact, kind="stable")[:remainder]] += 1
+        return counts
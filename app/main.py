@@ -1,34 +1,149 @@
-import numpy as np
+import argparse
+import cProfile
+import os
 
 from app.command_line import CommandLine
-from direction import Direction
-from intersection import Intersection
-from controller import Controller
+from app.intersection_state import IntersectionState
+from app.controller import Controller
+from app.instrument import Instruments, write_profile
+from app.road_network import RoadNetwork
+from app.scenario import Scenario, load_scenario
+from app.trace import TraceRecorder
 
-# Pass Duration, time for a vehicle to pass through an intersection once given green
-pass_durr = 1
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scenarios",
+                                "four_way.toml")
 
-n_waiting_list = [8, 6, 5, 2, 1]
-north = Direction("North", n_waiting_list, 3)
 
-e_waiting_list = [3, 2, 2, 1, 0]
-east = Direction("East", e_waiting_list, 2)
+def build_scenario(path: str = None, seed: int = None) -> Scenario:
+    """
+    Builds the scenario that this application runs, reporting how long building it took
 
-s_waiting_list = [11, 10, 9, 9, 6, 5, 4, 4, 2, 1]
-south = Direction("South", s_waiting_list, 4)
+    :param path: str for the path of the scenario file, if None then the four way intersection of DEFAULT_SCENARIO
+    :param seed: int for the seed of the arrivals, overriding any given by the scenario, if None then that of the
+    scenario is used, or a fresh one each time if it has none
+    :return: Scenario object as described
+    """
+    spec = load_scenario(path if path is not None else DEFAULT_SCENARIO)
+    if seed is not None:
+        spec["seed"] = seed
+    scenario = Scenario(spec)
+    print("Built {} intersection(s) in {:.1f} ms".format(len(scenario.controllers), scenario.build_time * 1000))
+    return scenario
 
-w_waiting_list = [6, 6, 3, 2, 2]
-west = Direction("West", w_waiting_list, 5)
 
-north.next = east
-east.next = south
-south.next = west
-west.next = north
+def build_controller(seed: int = None) -> Controller:
+    """
+    Builds the Controller for the intersection that this application runs by default
 
-intersection = Intersection(north)
+    :param seed: int for the seed of the arrivals of the intersection, if None then a fresh one is used each time
+    :return: Controller object as described
+    """
+    return build_scenario(seed=seed).controller
 
-controller = Controller(intersection, pass_durr)
 
-cmd_line = CommandLine(controller)
+def run_network(network: RoadNetwork, n_steps: int) -> None:
+    """
+    Runs every intersection of a scenario together as a RoadNetwork, and displays a summary at the end
 
-cmd_line.start()
\ No newline at end of file
+    :param network: RoadNetwork object of the intersections to run, as built by Scenario.network
+    :param n_steps: int for the number of steps to run, each a cycle of every intersection
+    :return: None
+    """
+    assert n_steps is not None, "A network can only be run for a number of cycles!"
+    network.run(n_steps)
+    print("Ran {} intersections for {} cycles".format(network.num_junctions, n_steps))
+    print("Vehicles queued: {}, in transit: {}, left the network: {}".format(int(network.num_vehicles.sum()),
+                                                                             network.num_in_transit,
+                                                                             network.num_exited))
+    print("Average waiting time: {:.2f}".format(float(network.cum_waiting_times.sum())
+                                                / max(1, int(network.num_vehicles.sum()))))
+
+
+def run_controller(controller: Controller, args: argparse.Namespace) -> None:
+    """
+    Runs a single intersection without any interaction, as asked for by the arguments of the run subcommand
+
+    :param controller: Controller object of the intersection
+    :param args: Namespace of the parsed arguments of the run subcommand
+    :return: None
+    """
+    if args.trace is not None:
+        names = [direction.name for direction in controller.intersection.directions]
+        controller.trace = TraceRecorder(args.trace, names)
+    if args.instrument:
+        controller.instruments = Instruments(args.track_allocations)
+    CommandLine(controller).run_headless(args.cycles, args.until, args.report_every)
+    if controller.trace is not None:
+        controller.trace.close()
+    if controller.instruments is not None:
+        controller.instruments.close()
+        print(controller.instruments.report())
+
+
+def main(argv: list = None) -> None:
+    """
+    Entry point into this application
+
+    With no arguments the interactive command line is started. The run subcommand instead runs the intersection
+    without any interaction, only displaying periodic summaries. A scenario of many intersections is run as a network
+
+    :param argv: list of str for the command line arguments, if None then those given to this process are used
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog="TrafficController", description="Simulates a traffic controller")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="run without any interaction, as fast as possible")
+    length = run_parser.add_mutually_exclusive_group(required=True)
+    length.add_argument("--cycles", type=int, help="number of cycles to run")
+    length.add_argument("--until", type=float, help="time of the intersection to run until")
+    run_parser.add_argument("--report-every", type=int, default=None, help="number of cycles between each summary")
+    run_parser.add_argument("--seed", type=int, default=None, help="seed for the arrivals, to reproduce a run")
+    run_parser.add_argument("--scenario", default=None, metavar="FILE",
+                            help="json, toml or yaml file of the intersections to run, instead of the default one")
+    run_parser.add_argument("--debug", action="store_true",
+                            help="check the running totals of the intersection against a full recompute, slowly")
+    run_parser.add_argument("--trace", default=None, metavar="DIRECTORY",
+                            help="directory to record the time series of the run to")
+    run_parser.add_argument("--instrument", action="store_true",
+                            help="time each phase of every cycle, and display the breakdown at the end")
+    run_parser.add_argument("--track-allocations", action="store_true",
+                            help="with --instrument, also record the memory allocated in each phase, slowly")
+    run_parser.add_argument("--profile", default=None, metavar="FILE",
+                            help="profile the run with cProfile, writing the stats to FILE and collapsed stacks for a "
+                                 "flame graph to FILE.folded")
+    args = parser.parse_args(argv)
+
+    IntersectionState.debug = getattr(args, "debug", False)
+
+    scenario = build_scenario(getattr(args, "scenario", None), getattr(args, "seed", None))
+    if args.command != "run":
+        CommandLine(scenario.controller).start()
+        return
+    if len(scenario.controllers) > 1:
+        unsupported = [flag for flag, given in (("--until", args.until is not None),
+                                                ("--report-every", args.report_every is not None),
+                                                ("--trace", args.trace is not None), ("--instrument", args.instrument),
+                                                ("--track-allocations", args.track_allocations),
+                                                ("--profile", args.profile is not None)) if given]
+        if unsupported:
+            parser.error("{} cannot be used with a scenario of many intersections, which is run as a road network for "
+                         "a number of --cycles".format(", ".join(unsupported)))
+        try:
+            network = scenario.network()
+        except AssertionError as error:
+            parser.error(str(error))
+    profile = cProfile.Profile() if args.profile is not None else None
+    if profile is not None:
+        profile.enable()
+    if len(scenario.controllers) > 1:
+        run_network(network, args.cycles)
+    else:
+        run_controller(scenario.controller, args)
+    if profile is not None:
+        profile.disable()
+        write_profile(profile, args.profile)
+        print("Wrote profile to {0} and {0}.folded".format(args.profile))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import math
+
+import numpy as np
+from numpy import ndarray
+
+
+class QuantileSketch:
+    """
+    Class for a mergeable sketch of a stream of non-negative values, that finds any quantile of them to within a relative
+    accuracy, in the style of DDSketch
+
+    Values are counted in buckets whose bounds grow geometrically by gamma, so a bucket covers all values within the
+    relative accuracy of its midpoint. Values too small to be told apart from zero are counted on their own. Once there
+    are more than max_buckets buckets, the lowest are folded together, so memory stays bounded however long the stream,
+    at the cost of accuracy for the smallest values only. Two sketches with the same accuracy merge exactly, by adding
+    their counts bucket by bucket
+
+    Attributes
+        relative_accuracy: float for the most that a quantile found may be off by, relative to its true value
+        max_buckets: int for the most buckets that are kept
+        gamma: float for the ratio between the bounds of consecutive buckets
+        counts: ndarray of the number of values in each bucket, the first having the key min_key
+        min_key: int for the key of the first bucket, the bucket with key k holding values in (gamma^(k-1), gamma^k]
+        zero_count: int for the number of values no more than MIN_VALUE
+        count: int for the number of values added
+    """
+    MIN_VALUE: float = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        """
+        Initializer for a QuantileSketch object
+
+        :param relative_accuracy: float for the relative accuracy of quantiles, between 0 and 1
+        :param max_buckets: int for the most buckets to be kept, must be positive
+        """
+        assert 0 < relative_accuracy < 1, "Relative accuracy must be between 0 and 1!"
+        assert isinstance(max_buckets, int) and max_buckets > 0, "Max buckets must be a positive integer!"
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.__log_gamma = math.log(self.gamma)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.min_key = 0
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, values) -> None:
+        """
+        Adds a batch of values to this sketch
+
+        :param values: array-like of non-negative floats to be added
+        :return: None
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        positive = values[values > QuantileSketch.MIN_VALUE]
+        self.zero_count += values.size - positive.size
+        self.count += values.size
+        if positive.size:
+            keys = np.ceil(np.log(positive) / self.__log_gamma).astype(np.int64)
+            lo, hi = int(keys.min()), int(keys.max())
+            self.__extend(lo, hi)
+            self.counts += np.bincount(keys - self.min_key, minlength=self.counts.size)
+            self.__collapse()
+
+    def merge(self, other) -> None:
+        """
+        Adds every value of another sketch to this sketch
+
+        :param other: QuantileSketch object with the same relative accuracy
+        :return: None
+        """
+        assert math.isclose(self.gamma, other.gamma), "Sketches must have the same relative accuracy to be merged!"
+        if other.counts.size:
+            self.__extend(other.min_key, other.min_key + other.counts.size - 1)
+            start = other.min_key - self.min_key
+            self.counts[start:start + other.counts.size] += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.__collapse()
+
+    def quantile(self, q: float) -> float:
+        """
+        Finds a quantile of the values added
+
+        :param q: float for the quantile, between 0 and 1
+        :return: float as described, nan if no values have been added
+        """
+        assert 0 <= q <= 1, "Quantile must be between 0 and 1!"
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side="right"))
+        index = min(index, self.counts.size - 1)
+        return 2 * self.gamma ** (self.min_key + index) / (self.gamma + 1)
+
+    def __extend(self, lo: int, hi: int) -> None:
+        """
+        Makes room for the buckets of keys from lo to hi
+
+        :param lo: int for the lowest key to be held
+        :param hi: int for the highest key to be held
+        :return: None
+        """
+        if self.counts.size == 0:
+            self.counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            self.min_key = lo
+            return
+        lo = min(lo, self.min_key)
+        hi = max(hi, self.min_key + self.counts.size - 1)
+        if lo < self.min_key or hi >= self.min_key + self.counts.size:
+            counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            counts[self.min_key - lo:self.min_key - lo + self.counts.size] = self.counts
+            self.counts, self.min_key = counts, lo
+
+    def __collapse(self) -> None:
+        """
+        Folds the lowest buckets together until no more than max_buckets are left
+
+        :return: None
+        """
+        excess = self.counts.size - self.max_buckets
+        if excess > 0:
+            self.counts[excess] += self.counts[:excess].sum()
+            self.counts = self.counts[excess:].copy()
+            self.min_key += excess
+
+
+class DelayStats:
+    """
+    Class for streaming statistics of the delays of vehicles served from a Direction, in bounded memory
+
+    Keeps the count, mean and variance with Welford's method, updated a batch at a time, the largest delay, and a
+    QuantileSketch for percentiles. Statistics from parallel replicas or partitions can be merged, giving the same
+    result as if every delay had been added to one
+
+    As a cycle serves only a handful of vehicles, delays are first copied into a fixed block of BATCH_SIZE, and only
+    folded into the statistics once it is full, or when the statistics are read. Neither the block nor the sketch is
+    made until it is first needed, so a Direction that never serves a vehicle costs next to nothing
+
+    Attributes
+        sketch: QuantileSketch object of the delays
+    """
+    __slots__ = ("__count", "__mean", "__m2", "__max", "__pending", "__num_pending", "__sketch", "__sketch_args")
+    BATCH_SIZE: int = 256
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        """
+        Initializer for a DelayStats object
+
+        :param relative_accuracy: float for the relative accuracy of percentiles, between 0 and 1
+        :param max_buckets: int for the most buckets kept by the sketch of percentiles
+        """
+        self.__count = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.__max = float("nan")
+        self.__pending = None
+        self.__num_pending = 0
+        assert 0 < relative_accuracy < 1, "Relative accuracy must be between 0 and 1!"
+        self.__sketch = None
+        self.__sketch_args = (relative_accuracy, max_buckets)
+
+    @property
+    def sketch(self) -> QuantileSketch:
+        """
+        Finds the QuantileSketch of the delays, making it if this is the first time it is needed
+
+        :return: QuantileSketch object as described
+        """
+        if self.__sketch is None:
+            self.__sketch = QuantileSketch(*self.__sketch_args)
+        return self.__sketch
+
+    @property
+    def count(self) -> int:
+        """
+        Finds the number of delays added
+
+        :return: int as described
+        """
+        return self.__count + self.__num_pending
+
+    @property
+    def mean(self) -> float:
+        """
+        Finds the mean delay
+
+        :return: float as described, zero if no delays have been added
+        """
+        self.flush()
+        return self.__mean
+
+    @property
+    def m2(self) -> float:
+        """
+        Finds the sum of squared differences of the delays from their mean
+
+        :return: float as described
+        """
+        self.flush()
+        return self.__m2
+
+    @property
+    def max(self) -> float:
+        """
+        Finds the largest delay
+
+        :return: float as described, nan if no delays have been added
+        """
+        self.flush()
+        return self.__max
+
+    @property
+    def variance(self) -> float:
+        """
+        Finds the sample variance of the delays
+
+        :return: float as described, zero if fewer than two delays have been added
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        """
+        Finds the sample standard deviation of the delays
+
+        :return: float as described
+        """
+        return math.sqrt(self.variance)
+
+    def add(self, delays: ndarray) -> None:
+        """
+        Adds a batch of delays
+
+        :param delays: ndarray of non-negative floats for the delays
+        :return: None
+        """
+        size = len(delays)
+        if self.__num_pending + size > DelayStats.BATCH_SIZE:
+            self.flush()
+        if size >= DelayStats.BATCH_SIZE:
+            self.__fold(np.asarray(delays, dtype=float).ravel())
+        else:
+            if self.__pending is None:
+                self.__pending = np.empty(DelayStats.BATCH_SIZE)
+            self.__pending[self.__num_pending:self.__num_pending + size] = delays
+            self.__num_pending += size
+
+    def flush(self) -> None:
+        """
+        Folds the delays waiting in the block into the statistics
+
+        :return: None
+        """
+        if self.__num_pending:
+            self.__fold(self.__pending[:self.__num_pending])
+            self.__num_pending = 0
+
+    def merge(self, other) -> None:
+        """
+        Adds every delay of another DelayStats to this one
+
+        :param other: DelayStats object with the same relative accuracy
+        :return: None
+        """
+        self.flush()
+        other.flush()
+        if other.count:
+            self.__combine(other.count, other.mean, other.m2, other.max)
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q: float) -> float:
+        """
+        Finds a quantile of the delays, to within the relative accuracy of the sketch
+
+        :param q: float for the quantile, between 0 and 1
+        :return: float as described, nan if no delays have been added
+        """
+        self.flush()
+        return self.sketch.quantile(q)
+
+    def summary(self) -> dict:
+        """
+        Summarises the delays
+
+        :return: dict of the count, mean, std, max, and the p50, p95 and p99 percentiles
+        """
+        return {"count": self.count, "mean": self.mean, "std": self.std, "max": self.max,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+    def snapshot(self) -> dict:
+        """
+        Copies everything needed to restore these statistics later into a dict of arrays
+
+        :return: dict mapping the name of each field to an ndarray
+        """
+        self.flush()
+        return {"moments": np.array([self.__count, self.__mean, self.__m2, self.__max]),
+                "sketch_counts": self.sketch.counts.copy(),
+                "sketch_keys": np.array([self.sketch.min_key, self.sketch.zero_count, self.sketch.count])}
+
+    def restore(self, snapshot: dict) -> None:
+        """
+        Replaces these statistics with a snapshot, taken from statistics with the same relative accuracy
+
+        :param snapshot: dict of arrays as made by snapshot
+        :return: None
+        """
+        count, self.__mean, self.__m2, self.__max = (float(value) for value in snapshot["moments"])
+        self.__count = int(count)
+        self.__num_pending = 0
+        self.sketch.counts = np.array(snapshot["sketch_counts"], dtype=np.int64)
+        self.sketch.min_key, self.sketch.zero_count, self.sketch.count = (int(key) for key in snapshot["sketch_keys"])
+
+    def __fold(self, delays: ndarray) -> None:
+        """
+        Folds a batch of delays into the statistics
+
+        :param delays: ndarray of non-negative floats for the delays
+        :return: None
+        """
+        if delays.size == 0:
+            return
+        mean = float(delays.mean())
+        self.__combine(delays.size, mean, float(np.square(delays - mean).sum()), float(delays.max()))
+        self.sketch.add(delays)
+
+    def __combine(self, count: int, mean: float, m2: float, max_delay: float) -> None:
+        """
+        Combines the statistics of a batch of delays into these, with the parallel form of Welford's method
+
+        :param count: int for the number of delays of the batch
+        :param mean: float for the mean of the batch
+        :param m2: float for the sum of squared differences from the mean of the batch
+        :param max_delay: float for the largest delay of the batch
+        :return: None
+        """
+        total = self.__count + count
+        delta = mean - self.__mean
+        self.__mean += delta * count / total
+        self.__m2 += m2 + delta * delta * self.__count * count / total
+        self.__count = total
+        self.__max = max_delay if math.isnan(self.__max) else max(self.__max, max_delay)
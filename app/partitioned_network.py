@@ -0,0 +1,254 @@
+import collections
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+from numpy import ndarray
+
+from app.road_network import RoadNetwork
+
+RESULT_FIELDS = ["clocks", "num_vehicles", "cum_waiting_times"]
+
+
+def partition_junctions(num_junctions: int, links: list, num_partitions: int) -> ndarray:
+    """
+    Splits the junctions of a network into partitions of about the same size, keeping junctions that are near each
+    other together
+
+    Junctions are ordered by a breadth first search along the links, treated as two way, so neighbouring junctions sit
+    close together in the order, which is then cut into num_partitions runs. This keeps most links within a partition,
+    so few vehicles have to cross between them
+
+    :param num_junctions: int for the number of junctions of the network
+    :param links: list of tuples of (junction, name, downstream junction, downstream name, delay), as for RoadNetwork
+    :param num_partitions: int for the number of partitions, must be positive
+    :return: ndarray for the partition of each junction
+    """
+    assert isinstance(num_partitions, int) and num_partitions > 0, "Number of partitions must be a positive integer!"
+    neighbours = [[] for j in range(num_junctions)]
+    for junction, name, to_junction, to_name, delay in links:
+        neighbours[junction].append(to_junction)
+        neighbours[to_junction].append(junction)
+    order = []
+    seen = np.zeros(num_junctions, dtype=bool)
+    for root in range(num_junctions):
+        if seen[root]:
+            continue
+        seen[root] = True
+        frontier = collections.deque([root])
+        while frontier:
+            junction = frontier.popleft()
+            order.append(junction)
+            for neighbour in neighbours[junction]:
+                if not seen[neighbour]:
+                    seen[neighbour] = True
+                    frontier.append(neighbour)
+    partitions = np.zeros(num_junctions, dtype=np.int64)
+    for partition, junctions in enumerate(np.array_split(np.array(order, dtype=np.int64), num_partitions)):
+        partitions[junctions] = partition
+    return partitions
+
+
+def approach_index(network: RoadNetwork, junction: int, name: str) -> int:
+    """
+    Finds the index within a RoadNetwork of the approach of a junction from the Direction of a name
+
+    :param network: RoadNetwork object to be searched
+    :param junction: int for the index of the junction within network
+    :param name: str for the name of the Direction
+    :return: int as described
+    """
+    start, end = network.junction_ptr[junction], network.junction_ptr[junction + 1]
+    return start + network.names[start:end].index(name)
+
+
+def run_partition(partition: int, controllers: list, links: list, sends: list, receives: list, n_steps: int,
+                  exchange_name: str, num_crossings: int, barrier, results) -> None:
+    """
+    Runs a partition of a network in a worker process, exchanging the vehicles that cross to and from other partitions
+    through shared memory at every step
+
+    Each step is split around the exchange. Once every junction of the partition has been served, the number of
+    vehicles leaving over each crossing is written to its column of the exchange. After every partition has done so,
+    the vehicles arriving over each crossing are read back and sent on their way before arrivals are added, just as the
+    vehicles of a link within the partition are. The exchange holds two rows, used on alternate steps, so a partition
+    can only write a row again once every partition has read it
+
+    :param partition: int for the index of the partition
+    :param controllers: list of Controller objects for the junctions of the partition
+    :param links: list of tuples for the links within the partition, between indices into controllers
+    :param sends: list of tuples of (crossing, junction, name) for the crossings leaving the partition
+    :param receives: list of tuples of (crossing, junction, name, delay) for the crossings entering the partition
+    :param n_steps: int for the number of steps to be run
+    :param exchange_name: str for the name of the shared memory block of the exchange
+    :param num_crossings: int for the number of crossings between all partitions
+    :param barrier: Barrier shared by the workers of every partition
+    :param results: Queue to put the index and dict of results of the partition on once it has finished
+    :return: None
+    """
+    exchange_memory = shared_memory.SharedMemory(name=exchange_name)
+    exchange = np.ndarray((2, num_crossings), dtype=np.int64, buffer=exchange_memory.buf)
+    try:
+        network = RoadNetwork(controllers, links, [(junction, name) for crossing, junction, name in sends])
+        send_crossings = np.array([crossing for crossing, junction, name in sends], dtype=np.int64)
+        send_approaches = np.array([approach_index(network, junction, name) for crossing, junction, name in sends],
+                                   dtype=np.int64)
+        receive_crossings = np.array([receive[0] for receive in receives], dtype=np.int64)
+        receive_approaches = np.array([approach_index(network, junction, name)
+                                       for crossing, junction, name, delay in receives], dtype=np.int64)
+        receive_delays = np.array([receive[3] for receive in receives], dtype=np.int64)
+        for step in range(n_steps):
+            network.serve()
+            exchange[step % 2, send_crossings] = network.served[send_approaches]
+            barrier.wait()
+            network.schedule(receive_approaches, exchange[step % 2, receive_crossings], receive_delays)
+            network.arrive()
+        results.put((partition, {"clocks": network.clocks, "num_vehicles": network.num_vehicles,
+                     "cum_waiting_times": network.cum_waiting_times, "num_exited": network.num_exited,
+                     "num_in_transit": network.num_in_transit}))
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        del exchange
+        exchange_memory.close()
+
+
+class PartitionedNetwork:
+    """
+    Class to run a network of intersections across many processes, each running one partition of the junctions as a
+    RoadNetwork of its own
+
+    Only the number of vehicles crossing each link between partitions is exchanged, once a step, through a block of
+    shared memory, with the workers kept in step by a barrier. As the arrivals of every approach are drawn from the
+    random stream of its own Direction, and vehicles crossing a partition are sent on their way at the same point of a
+    step as any other, the results are identical to running the whole network as one RoadNetwork, however the network is
+    partitioned
+
+    Every run starts from the Controllers as they were given, which are left unchanged
+
+    Attributes
+        controllers: list of Controller objects, one for each junction
+        links: list of tuples of (junction, name, downstream junction, downstream name, delay), as for RoadNetwork
+        partitions: ndarray for the partition of each junction
+        clocks: ndarray for the time of each junction at the end of the last run
+        num_vehicles: ndarray for the number of vehicles queued at each junction at the end of the last run
+        cum_waiting_times: ndarray for the total waiting time at each junction at the end of the last run
+        num_exited: int for the number of vehicles that left the network during the last run
+        num_in_transit: int for the number of vehicles travelling between junctions at the end of the last run
+    """
+
+    def __init__(self, controllers: list, links: list = (), num_partitions: int = None, partitions: list = None):
+        """
+        Initializer for a PartitionedNetwork object
+
+        :param controllers: list of Controller objects, one for each junction
+        :param links: list of tuples of (junction, name, downstream junction, downstream name, delay), as for
+        RoadNetwork
+        :param num_partitions: int for the number of partitions to split the junctions into with partition_junctions,
+        if None then one for each CPU. Ignored if partitions is given
+        :param partitions: list for the partition of each junction, numbered from zero, if None then they are found
+        with partition_junctions
+        """
+        self.controllers = list(controllers)
+        self.links = list(links)
+        if partitions is None:
+            num_partitions = num_partitions if num_partitions is not None else multiprocessing.cpu_count()
+            partitions = partition_junctions(len(self.controllers), self.links,
+                                             min(num_partitions, max(1, len(self.controllers))))
+        self.partitions = np.asarray(partitions, dtype=np.int64)
+        assert self.partitions.size == len(self.controllers), "Each junction must have a partition!"
+        self.clocks = np.array([controller.intersection.clock for controller in self.controllers], dtype=float)
+        self.num_vehicles = np.array([controller.intersection.num_vehicles for controller in self.controllers])
+        self.cum_waiting_times = np.array([controller.intersection.state.cum_waiting_time()
+                                           for controller in self.controllers])
+        self.num_exited = 0
+        self.num_in_transit = 0
+
+    @property
+    def num_partitions(self) -> int:
+        """
+        Finds the number of partitions the junctions are split into
+
+        :return: int as described
+        """
+        return int(self.partitions.max(initial=-1)) + 1
+
+    @property
+    def avg_waiting_times(self) -> ndarray:
+        """
+        Finds the average waiting time per vehicle at each junction at the end of the last run
+
+        :return: ndarray of floats as described, zero for a junction with no vehicles
+        """
+        return np.divide(self.cum_waiting_times, self.num_vehicles, out=np.zeros(self.clocks.size),
+                         where=self.num_vehicles > 0)
+
+    def __split(self) -> list:
+        """
+        Splits the junctions and links among the partitions, numbering each link that crosses between partitions
+
+        :return: tuple of a list of the junctions of each partition, a list of tuples of the (partition, controllers,
+        links, sends, receives) of each partition, as for run_partition, and the number of crossings
+        """
+        members = [np.flatnonzero(self.partitions == partition) for partition in range(self.num_partitions)]
+        local = np.zeros(self.partitions.size, dtype=np.int64)
+        for junctions in members:
+            local[junctions] = np.arange(junctions.size)
+        splits = [(partition, [self.controllers[j] for j in junctions], [], [], [])
+                  for partition, junctions in enumerate(members)]
+        num_crossings = 0
+        for junction, name, to_junction, to_name, delay in self.links:
+            partition, to_partition = self.partitions[junction], self.partitions[to_junction]
+            if partition == to_partition:
+                splits[partition][2].append((local[junction], name, local[to_junction], to_name, delay))
+            else:
+                splits[partition][3].append((num_crossings, local[junction], name))
+                splits[to_partition][4].append((num_crossings, local[to_junction], to_name, delay))
+                num_crossings += 1
+        return members, splits, num_crossings
+
+    def run(self, n_steps: int) -> None:
+        """
+        Runs every partition for a number of steps in a worker process of its own, starting from the Controllers as
+        they were given, and gathers the results
+
+        :param n_steps: int for the number of steps to be run, must be non-negative
+        :return: None
+        """
+        assert isinstance(n_steps, int) and n_steps >= 0, \
+            "Number of steps must be an integer greater than or equal to zero!"
+        members, splits, num_crossings = self.__split()
+        exchange_memory = shared_memory.SharedMemory(create=True, size=max(1, 2 * num_crossings) * 8)
+        workers = []
+        try:
+            barrier = multiprocessing.Barrier(len(splits))
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=run_partition,
+                                               args=split + (n_steps, exchange_memory.name, num_crossings, barrier,
+                                                             results))
+                       for split in splits]
+            for worker in workers:
+                worker.start()
+            gathered = {}
+            while len(gathered) < len(workers):
+                assert all(worker.exitcode in (None, 0) for worker in workers), "A partition failed to run!"
+                try:
+                    partition, result = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                gathered[partition] = result
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            exchange_memory.close()
+            exchange_memory.unlink()
+        for partition, junctions in enumerate(members):
+            for field in RESULT_FIELDS:
+                getattr(self, field)[junctions] = gathered[partition][field]
+        self.num_exited = sum(result["num_exited"] for result in gathered.values())
+        self.num_in_transit = sum(result["num_in_transit"] for result in gathered.values())
@@ -0,0 +1,302 @@
+import numpy as np
+from numpy import ndarray
+
+from app import kernels
+from app.intersection_state import IntersectionState
+
+
+class RoadNetwork:
+    """
+    Class for a network of intersections, in which the vehicles served from an approach of one intersection travel on to
+    an approach of another
+
+    Every intersection is cycled as by its Controller, serving its directions in turn, but all intersections are stepped
+    together, one cycle each per step, with a handful of array operations covering the whole network rather than a loop
+    over Python objects. Each intersection keeps its own clock, as its cycles take their own time
+
+    The network is held in compressed sparse row form. The approaches, or directions, of junction j are the rows
+    junction_ptr[j] to junction_ptr[j + 1] of every per-approach array, by their index in the Intersection, and are
+    served in the order of following. The vehicles served from approach a are queued onto approach downstream[a] after
+    delays[a] steps, or leave the network if it is -1. Travel delays are measured in steps, like time-of-day arrivals
+    are measured in cycles, as the length of a step differs from junction to junction
+
+    The queues of every approach are held in a single IntersectionState, built by IntersectionState.build_many, with a
+    row for each approach. Each junction keeps its own clock, so the state is worked on with the kernels of app.kernels
+    that take a clock for each row, which are compiled with Numba when it is installed, and each segment grows on its own
+    as for an Intersection, so one long queue does not grow every other
+
+    Attributes
+        junction_ptr: ndarray of the first approach of each junction, and one past the last approach of the last
+        junction_of: ndarray for the junction of each approach
+        names: list of str for the name of the Direction each approach came from
+        downstream: ndarray for the approach that the vehicles served from each approach go on to, -1 if none
+        delays: ndarray of ints for the number of steps it takes vehicles to reach the downstream approach
+        pass_durrs: ndarray for the amount of time that it takes for a vehicle to exit each junction
+        phases: ndarray for the position within its junction of the approach each junction serves next
+        following: ndarray for the position within its junction of the approach served after each one, as
+        Intersection.following gives, so approaches are served in the order of the linked list whatever order their
+        positions are in
+        clocks: ndarray for the current time of each junction
+        state: IntersectionState object holding the queues of every approach, by index, with the cycle size of each.
+        Its own clock is left at zero, each approach being measured against the clock of its junction
+        exports: ndarray of bools for if the vehicles served from each approach go on to another network
+        in_transit: ndarray of the number of vehicles on their way to each approach, a row for each of the next steps
+        served: ndarray for the number of vehicles served from each approach in the last step
+        num_steps: int for the number of steps that have been completed
+        num_exited: int for the number of vehicles that have left the network
+    """
+    SWITCH_DURR: float = 2
+    ARRIVAL_BLOCK_SIZE: int = 1 << 18
+
+    def __init__(self, controllers: list, links: list = (), exports: list = ()):
+        """
+        Initializer for a RoadNetwork object
+
+        The network starts from the state of the Intersection, pass duration and next direction of each Controller, and
+        draws external arrivals from each of their Directions. The Controllers should not be cycled themselves after
+
+        :param controllers: list of Controller objects, one for each junction
+        :param links: list of tuples of (junction, name, downstream junction, downstream name, delay), each linking the
+        Direction of a name at a junction, by its index in controllers, to a Direction of a downstream junction. The
+        delay is a non-negative int for the number of steps the vehicles take to travel between them
+        :param exports: list of tuples of (junction, name) for the Directions whose vehicles are served on to a junction
+        outside of this network, such as one run by another process, and so are not counted as exiting
+        """
+        intersections = [controller.intersection for controller in controllers]
+        sizes = np.array([intersection.num_directions for intersection in intersections], dtype=np.int64)
+        self.junction_ptr = np.zeros(sizes.size + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.junction_ptr[1:])
+        self.junction_of = np.repeat(np.arange(sizes.size), sizes)
+        self.__directions = [direction for intersection in intersections for direction in intersection.directions]
+        self.names = [direction.name for direction in self.__directions]
+        self.pass_durrs = np.array([controller.pass_durr for controller in controllers], dtype=float)
+        self.phases = np.array([controller.next_direction.index for controller in controllers], dtype=np.int64)
+        self.following = np.concatenate([intersection.following for intersection in intersections])
+        self.clocks = np.array([intersection.clock for intersection in intersections], dtype=float)
+
+        approach_of = {(self.junction_of[a], name): a for a, name in enumerate(self.names)}
+        self.downstream = np.full(self.num_approaches, -1, dtype=np.int64)
+        self.delays = np.zeros(self.num_approaches, dtype=np.int64)
+        for junction, name, to_junction, to_name, delay in links:
+            assert (junction, name) in approach_of and (to_junction, to_name) in approach_of, \
+                "Links must be between Directions of the network!"
+            assert isinstance(delay, int) and delay >= 0, "Delay must be a non-negative integer!"
+            self.downstream[approach_of[(junction, name)]] = approach_of[(to_junction, to_name)]
+            self.delays[approach_of[(junction, name)]] = delay
+        self.exports = np.zeros(self.num_approaches, dtype=bool)
+        for junction, name in exports:
+            assert (junction, name) in approach_of, "Exports must be from Directions of the network!"
+            self.exports[approach_of[(junction, name)]] = True
+        self.in_transit = np.zeros((int(self.delays.max(initial=0)) + 1, self.num_approaches), dtype=np.int64)
+        self.served = np.zeros(self.num_approaches, dtype=np.int64)
+
+        queues = [direction.waiting_times for direction in self.__directions]
+        lengths = np.array([queue.size for queue in queues], dtype=np.int64)
+        # Measured against a clock of zero, the waiting times are taken back from the clock of each junction, so each
+        # vehicle keeps the time it arrived at
+        waiting_times = np.concatenate(queues) - np.repeat(self.clocks[self.junction_of], lengths)
+        self.state = IntersectionState.build_many([self.num_approaches], lengths, waiting_times,
+                                                  [direction.avg_flow for direction in self.__directions],
+                                                  [direction.cycle_size for direction in self.__directions])[0]
+
+        self.num_steps = 0
+        self.num_exited = 0
+        self.__arrival_block = np.zeros((0, self.num_approaches), dtype=np.int64)
+        self.__arrival_pos = 0
+
+    @property
+    def num_junctions(self) -> int:
+        """
+        Finds the number of junctions of this network
+
+        :return: int as described
+        """
+        return self.clocks.size
+
+    @property
+    def num_approaches(self) -> int:
+        """
+        Finds the number of approaches of every junction of this network
+
+        :return: int as described
+        """
+        return self.junction_of.size
+
+    @property
+    def lengths(self) -> ndarray:
+        """
+        Finds the number of vehicles queued for each approach
+
+        :return: ndarray of ints as described, the lengths of state
+        """
+        return self.state.lengths
+
+    @property
+    def num_vehicles(self) -> ndarray:
+        """
+        Finds the number of vehicles queued at each junction
+
+        :return: ndarray of ints as described
+        """
+        return np.bincount(self.junction_of, weights=self.lengths, minlength=self.num_junctions).astype(np.int64)
+
+    @property
+    def num_in_transit(self) -> int:
+        """
+        Finds the number of vehicles travelling between junctions
+
+        :return: int as described
+        """
+        return int(self.in_transit.sum())
+
+    @property
+    def cum_waiting_times(self) -> ndarray:
+        """
+        Finds the total waiting time of the vehicles queued at each junction
+
+        :return: ndarray of floats as described
+        """
+        waiting = self.lengths * self.clocks[self.junction_of] - self.state.arrival_sums
+        return np.bincount(self.junction_of, weights=waiting, minlength=self.num_junctions)
+
+    @property
+    def avg_waiting_times(self) -> ndarray:
+        """
+        Finds the average waiting time per vehicle at each junction, zero for a junction with no vehicles
+
+        :return: ndarray of floats as described
+        """
+        num_vehicles = self.num_vehicles
+        return np.divide(self.cum_waiting_times, num_vehicles, out=np.zeros(self.num_junctions),
+                         where=num_vehicles > 0)
+
+    def queue(self, approach: int) -> ndarray:
+        """
+        Finds the waiting times of the vehicles queued for an approach, from the front of the queue to the back
+
+        :param approach: int for the index of the approach
+        :return: ndarray, a copy of the waiting times as described
+        """
+        # The state measures waiting times against its own clock, which is taken back off to find the arrival times
+        return self.clocks[self.junction_of[approach]] - (self.state.clock - self.state.queue(approach))
+
+    def step(self) -> ndarray:
+        """
+        Cycles every junction once, serving its next approach, sending the vehicles served on downstream, and adding
+        new vehicles, both those arriving from outside the network and those reaching the end of their travel
+
+        :return: ndarray for the duration of the cycle at each junction
+        """
+        cycle_durrs = self.serve()
+        self.arrive()
+        return cycle_durrs
+
+    def serve(self) -> ndarray:
+        """
+        Serves the next approach of every junction, the first half of a step, sending the vehicles served on downstream
+
+        :return: ndarray for the duration of the cycle at each junction
+        """
+        state = self.state
+        approaches = self.junction_ptr[:-1] + self.phases
+        volumes = kernels.cycle_volumes(state.prefix, state.offsets, state.heads, state.capacities, state.prefix_bases,
+                                        state.lengths, state.arrival_sums, state.cycle_sizes, self.clocks, approaches)
+        removed = kernels.discharge_many(state.prefix, state.offsets, state.heads, state.capacities, state.lengths,
+                                         state.prefix_bases, state.arrival_sums, approaches, volumes)
+        state.total_vehicles -= int(volumes.sum())
+        state.total_arrival_sum = float(state.total_arrival_sum - removed.sum()) if state.total_vehicles > 0 else 0.0
+        cycle_durrs = volumes * self.pass_durrs + RoadNetwork.SWITCH_DURR
+        self.clocks += cycle_durrs
+        self.served[:] = 0
+        self.served[approaches] = volumes
+
+        linked = self.downstream[approaches] >= 0
+        self.schedule(self.downstream[approaches[linked]], volumes[linked], self.delays[approaches[linked]])
+        self.num_exited += int(volumes[~linked & ~self.exports[approaches]].sum())
+        return cycle_durrs
+
+    def arrive(self) -> None:
+        """
+        Adds new vehicles to every approach, the second half of a step, both those arriving from outside the network
+        and those reaching the end of their travel, then moves every junction on to its next approach
+
+        :return: None
+        """
+        row = self.num_steps % self.in_transit.shape[0]
+        counts = self.__external_arrivals() + self.in_transit[row]
+        self.in_transit[row] = 0
+        self.__enqueue_counts(counts)
+        self.phases = self.following[self.junction_ptr[:-1] + self.phases]
+        self.num_steps += 1
+
+    def schedule(self, approaches: ndarray, counts: ndarray, delays: ndarray) -> None:
+        """
+        Sends vehicles on their way to a number of approaches, to arrive at the end of the step a delay of steps from
+        this one
+
+        :param approaches: ndarray of ints for the index of each approach, which may repeat
+        :param counts: ndarray of ints for the number of vehicles travelling to each approach
+        :param delays: ndarray of non-negative ints for the number of steps each takes to arrive
+        :return: None
+        """
+        if delays.size and delays.max() >= self.in_transit.shape[0]:
+            self.__grow_in_transit(int(delays.max()) + 1)
+        rows = (self.num_steps + delays) % self.in_transit.shape[0]
+        np.add.at(self.in_transit, (rows, approaches), counts)
+
+    def run(self, n_steps: int) -> None:
+        """
+        Steps the network a number of times
+
+        :param n_steps: int for the number of steps to be run, must be non-negative
+        :return: None
+        """
+        assert isinstance(n_steps, int) and n_steps >= 0, \
+            "Number of steps must be an integer greater than or equal to zero!"
+        for i in range(n_steps):
+            self.step()
+
+    def __grow_in_transit(self, num_rows: int) -> None:
+        """
+        Lengthens the ring of vehicles in transit, keeping each row at the step it arrives in
+
+        :param num_rows: int for the number of steps ahead that vehicles must be able to be sent
+        :return: None
+        """
+        steps = self.num_steps + np.arange(self.in_transit.shape[0])
+        in_transit = np.zeros((num_rows, self.num_approaches), dtype=np.int64)
+        in_transit[steps % num_rows] = self.in_transit[steps % self.in_transit.shape[0]]
+        self.in_transit = in_transit
+
+    def __external_arrivals(self) -> ndarray:
+        """
+        Finds the number of vehicles arriving at each approach from outside the network for this step
+
+        Arrivals are drawn ahead of time for a block of steps, from the ArrivalProcess and Generator of the Direction
+        of each approach, so each approach keeps its own random stream
+
+        :return: ndarray of ints as described
+        """
+        if self.__arrival_pos == self.__arrival_block.shape[0]:
+            num_steps = max(64, RoadNetwork.ARRIVAL_BLOCK_SIZE // self.num_approaches)
+            self.__arrival_block = np.column_stack([direction.take_arrivals(num_steps)
+                                                    for direction in self.__directions])
+            self.__arrival_pos = 0
+        counts = self.__arrival_block[self.__arrival_pos]
+        self.__arrival_pos += 1
+        return counts
+
+    def __enqueue_counts(self, counts: ndarray) -> None:
+        """
+        Adds newly arrived vehicles, with no waiting time, to the back of the queue of every approach at once
+
+        :param counts: ndarray of non-negative ints for the number of vehicles arriving for each approach
+        :return: None
+        """
+        state = self.state
+        clocks = self.clocks[self.junction_of]
+        state.reserve(counts)
+        kernels.insert_arrivals_many(state.buffer, state.prefix, state.offsets, state.heads, state.capacities,
+                                     state.lengths, state.prefix_bases, state.arrival_sums, counts, clocks)
+        state.total_vehicles += int(counts.sum())
+        state.total_arrival_sum += float(counts @ clocks)
@@ -0,0 +1,303 @@
+import gc
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from app.arrival import ArrivalProcess, NormalArrivals, PoissonArrivals, TimeOfDayArrivals, ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.intersection_state import IntersectionState
+from app.lanes import Lanes
+from app.road_network import RoadNetwork
+from app.signal_policy import SignalPolicy, RoundRobin, LongestQueueFirst, MaxWeight, MaxPressure, PhasePlan
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+ARRIVAL_KINDS = {"normal": NormalArrivals, "poisson": PoissonArrivals, "time_of_day": TimeOfDayArrivals,
+                 "replay": ReplayArrivals}
+POLICY_KINDS = {"round_robin": RoundRobin, "longest_queue_first": LongestQueueFirst, "max_weight": MaxWeight,
+                "max_pressure": MaxPressure, "phases": PhasePlan}
+
+
+def load_scenario(path: str) -> dict:
+    """
+    Reads a scenario from a file, in the format given by its extension, one of .json, .toml, .yaml or .yml
+
+    :param path: str for the path of the file
+    :return: dict describing the scenario, as for Scenario
+    """
+    extension = os.path.splitext(path)[1].lower()
+    assert extension in (".json", ".toml", ".yaml", ".yml"), "Scenario must be a json, toml or yaml file!"
+    if extension == ".json":
+        with open(path) as file:
+            return json.load(file)
+    if extension == ".toml":
+        assert tomllib is not None, "tomllib must be available to read a toml scenario!"
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    assert yaml is not None, "PyYAML must be installed to read a yaml scenario!"
+    with open(path) as file:
+        return yaml.safe_load(file)
+
+
+def build_arrivals(spec: dict = None, avg_flow: float = 0) -> ArrivalProcess:
+    """
+    Builds the ArrivalProcess described by a dict
+
+    :param spec: dict with the kind of process, one of ARRIVAL_KINDS, and the arguments to build it with. Normal and
+    Poisson arrivals take avg_flow if it is not given. If None then arrivals are normal around avg_flow
+    :param avg_flow: float for the average flow of normal and Poisson arrivals that do not give one
+    :return: ArrivalProcess object as described
+    """
+    if spec is None:
+        return NormalArrivals(avg_flow)
+    params = dict(spec)
+    kind = params.pop("kind", "normal")
+    assert kind in ARRIVAL_KINDS, "Arrivals must be one of " + ", ".join(ARRIVAL_KINDS) + "!"
+    if kind in ("normal", "poisson"):
+        params.setdefault("avg_flow", avg_flow)
+    return ARRIVAL_KINDS[kind](**params)
+
+
+def build_policy(spec=None, downstream=None) -> SignalPolicy:
+    """
+    Builds the SignalPolicy described by a str or dict
+
+    :param spec: str for the kind of policy, one of POLICY_KINDS, or a dict with the kind and the arguments to build it
+    with. If None then Directions are emptied in turn
+    :param downstream: function for the number of vehicles queued downstream of each Direction, given to a max_pressure
+    policy that does not have one
+    :return: SignalPolicy object as described
+    """
+    if spec is None:
+        return RoundRobin()
+    params = {"kind": spec} if isinstance(spec, str) else dict(spec)
+    kind = params.pop("kind")
+    assert kind in POLICY_KINDS, "Policy must be one of " + ", ".join(POLICY_KINDS) + "!"
+    if kind == "max_pressure":
+        params.setdefault("downstream", downstream)
+    return POLICY_KINDS[kind](**params)
+
+
+class Scenario:
+    """
+    Class to build the Controllers of a scenario described declaratively, as read from a file by load_scenario
+
+    A scenario is a dict with a list of intersections, each a dict with a list of directions in the order they are
+    emptied, and optionally a name, pass_durr and policy. Each direction is a dict with a name, and optionally
+    waiting_times, avg_flow, cycle_size, arrivals, a dict as for build_arrivals, and lanes, a list of at least 2 dicts
+    each with a movement, and optionally a saturation and share, as for Lanes. Anything an intersection or direction
+    leaves out is taken from the top level of the scenario if given there, which can also give a seed for the arrivals.
+    A scenario with directions at its top level rather than intersections is a single intersection
+
+    Links between intersections are given as a list of [junction, name, downstream junction, downstream name, delay],
+    where a junction is the index or name of an intersection, and exports as a list of [junction, name], as for
+    RoadNetwork. A max_pressure policy of a junction with links sees the queues of the approaches they lead to. A phases
+    policy takes a list of phases, each a dict from the name of a direction to the movements it serves, as for PhasePlan.
+    A RoadNetwork empties the approaches of each junction in turn over a single lane, so a scenario run as one can give
+    neither a policy other than round_robin nor lanes
+
+    The queues of every intersection are laid out at once with IntersectionState.build_many, and each Direction is made
+    as a view over its row, so no Direction or Intersection is built twice. The stream of arrivals of each Direction is
+    seeded from the seed of the scenario and its position, so it only depends on the scenario, but a Generator is only
+    made for it once its arrivals are first drawn
+
+    Attributes
+        spec: dict describing the scenario
+        names: list of str for the name of each intersection
+        controllers: list of Controller objects, one for each intersection
+        links: list of tuples of (junction, name, downstream junction, downstream name, delay), between indices into
+        controllers
+        exports: list of tuples of (junction, name), of indices into controllers
+        build_time: float for the number of seconds that building the scenario took
+    """
+
+    def __init__(self, spec: dict):
+        """
+        Initializer for a Scenario object, building its Controllers
+
+        :param spec: dict describing the scenario, as above
+        """
+        start = time.perf_counter()
+        self.spec = spec
+        intersections = spec["intersections"] if "intersections" in spec else [spec]
+        assert len(intersections) > 0, "A scenario must have at least one intersection!"
+        self.names = [str(inter.get("name", junction)) for junction, inter in enumerate(intersections)]
+        assert len(set(self.names)) == len(self.names), "Each intersection must have a different name!"
+        # Building makes many objects that all live on, so collecting garbage along the way would only waste time
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.controllers = self.__build(intersections)
+            junctions = {name: junction for junction, name in enumerate(self.names)}
+            self.links = [(self.__junction(junctions, junction), name, self.__junction(junctions, to_junction),
+                           to_name, int(delay)) for junction, name, to_junction, to_name, delay in spec.get("links", ())]
+            self.exports = [(self.__junction(junctions, junction), name) for junction, name in spec.get("exports", ())]
+            for inter, controller, downstream in zip(intersections, self.controllers, self.__downstreams()):
+                controller.policy = build_policy(inter.get("policy", spec.get("policy")), downstream)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.build_time = time.perf_counter() - start
+
+    @staticmethod
+    def from_file(path: str):
+        """
+        Builds the scenario described by a file
+
+        :param path: str for the path of the file, as for load_scenario
+        :return: Scenario object as described
+        """
+        return Scenario(load_scenario(path))
+
+    @property
+    def controller(self) -> Controller:
+        """
+        Finds the Controller of a scenario of a single intersection
+
+        :return: Controller object as described
+        """
+        assert len(self.controllers) == 1, "Scenario must have a single intersection!"
+        return self.controllers[0]
+
+    def network(self) -> RoadNetwork:
+        """
+        Builds a RoadNetwork of every intersection of this scenario, joined by its links
+
+        Every intersection must empty its Directions in turn over a single lane, as that is all a RoadNetwork does
+
+        :return: RoadNetwork object as described
+        """
+        for name, controller in zip(self.names, self.controllers):
+            assert type(controller.policy) is RoundRobin, \
+                "A road network empties each approach in turn, so intersection " + name + " must have no policy other " \
+                "than round_robin!"
+            assert all(direction.lanes is None for direction in controller.intersection.directions), \
+                "A road network has a single lane on each approach, so intersection " + name + " must have no lanes!"
+        return RoadNetwork(self.controllers, self.links, self.exports)
+
+    def __build(self, intersections: list) -> list:
+        """
+        Builds a Controller for each intersection, laying out the queues of all of them at once
+
+        :param intersections: list of dicts describing each intersection
+        :return: list of Controller objects as described
+        """
+        spec = self.spec
+        seed = spec.get("seed")
+        specs = [inter["directions"] for inter in intersections]
+        assert all(len(directions) >= 2 for directions in specs), "An intersection must have at least 2 directions!"
+        flat = list(itertools.chain.from_iterable(specs))
+        arrivals = [Scenario.__arrivals_for(direction, spec) for direction in flat]
+        cycle_sizes = [float(direction.get("cycle_size", spec.get("cycle_size", 0.5))) for direction in flat]
+        queues = [direction.get("waiting_times", ()) for direction in flat]
+        states = IntersectionState.build_many([len(directions) for directions in specs],
+                                              [len(queue) for queue in queues],
+                                              np.fromiter(itertools.chain.from_iterable(queues), dtype=float),
+                                              [process.avg_flow for process in arrivals], cycle_sizes)
+        controllers = []
+        position = 0
+        for junction, (inter, directions, state) in enumerate(zip(intersections, specs, states)):
+            names = [direction["name"] for direction in directions]
+            assert len(set(names)) == len(names), "Each direction of an intersection must have a different name!"
+            built = [Direction(name, (), 0, cycle_sizes[position + index],
+                               None if seed is None else [seed, junction, index], arrivals[position + index], state,
+                               index) for index, name in enumerate(names)]
+            for index, direction in enumerate(directions):
+                if "lanes" in direction:
+                    state.set_lanes(index, Scenario.__lanes_for(direction["lanes"]))
+            position += len(directions)
+            controllers.append(Controller(Intersection.from_directions(built, state),
+                                          inter.get("pass_durr", spec.get("pass_durr", 1))))
+        return controllers
+
+    @staticmethod
+    def __lanes_for(lanes: list) -> Lanes:
+        """
+        Builds the Lanes of a direction
+
+        :param lanes: list of dicts, one for each lane, with its movement, and optionally its saturation and share
+        :return: Lanes object as described
+        """
+        return Lanes([lane["movement"] for lane in lanes], [float(lane.get("saturation", 1)) for lane in lanes],
+                     [float(lane.get("share", 1)) for lane in lanes])
+
+    @staticmethod
+    def __arrivals_for(direction: dict, spec: dict) -> ArrivalProcess:
+        """
+        Builds the ArrivalProcess of a direction, with anything it leaves out taken from the top level of the scenario
+
+        An avg_flow given by the direction applies to normal or Poisson arrivals of the top level, but not over one its
+        own arrivals give
+
+        :param direction: dict describing the direction
+        :param spec: dict describing the scenario
+        :return: ArrivalProcess object as described
+        """
+        if "arrivals" in direction:
+            return build_arrivals(direction["arrivals"], direction.get("avg_flow", spec.get("avg_flow", 0)))
+        if "avg_flow" in direction and spec.get("arrivals") is not None \
+                and spec["arrivals"].get("kind", "normal") in ("normal", "poisson"):
+            return build_arrivals(dict(spec["arrivals"], avg_flow=direction["avg_flow"]))
+        return build_arrivals(spec.get("arrivals"), direction.get("avg_flow", spec.get("avg_flow", 0)))
+
+    def __junction(self, junctions: dict, junction) -> int:
+        """
+        Finds the index of an intersection given by its index or name
+
+        :param junctions: dict mapping the name of each intersection to its index
+        :param junction: int for the index of the intersection, or str for its name
+        :return: int as described
+        """
+        if isinstance(junction, str):
+            assert junction in junctions, "No intersection is named " + junction + "!"
+            return junctions[junction]
+        assert 0 <= junction < len(self.controllers), "No intersection has index " + str(junction) + "!"
+        return int(junction)
+
+    def __downstreams(self) -> list:
+        """
+        Finds, for each intersection, the function giving the number of vehicles queued where the vehicles of each of
+        its Directions are headed, along the links leaving it
+
+        :return: list of functions taking a Controller and returning an ndarray as described, None for an intersection
+        with no links leaving it
+        """
+        indices = [{direction.name: direction.index for direction in controller.intersection.directions}
+                   for controller in self.controllers]
+        targets = [[] for controller in self.controllers]
+        for junction, name, to_junction, to_name, delay in self.links:
+            targets[junction].append((indices[junction][name], self.controllers[to_junction].intersection,
+                                      indices[to_junction][to_name]))
+        return [Scenario.__downstream(links) if links else None for links in targets]
+
+    @staticmethod
+    def __downstream(links: list):
+        """
+        Makes the function giving the number of vehicles queued where the vehicles of each Direction of an intersection
+        are headed
+
+        :param links: list of tuples of (index, downstream Intersection, downstream index) for each link leaving it
+        :return: function taking a Controller and returning an ndarray as described
+        """
+
+        def downstream(controller: Controller) -> np.ndarray:
+            """ Finds the number of vehicles queued at the approach each Direction leads to """
+            queued = np.zeros(controller.intersection.num_directions, dtype=np.int64)
+            for index, intersection, to_index in links:
+                queued[index] = intersection.state.lengths[to_index]
+            return queued
+
+        return downstream
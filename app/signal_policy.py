@@ -0,0 +1,223 @@
+from time import sleep
+
+import numpy as np
+from numpy import ndarray
+
+from app.direction import Direction
+
+
+class SignalPolicy:
+    """
+    Class describing how a Controller picks the Direction to serve next, and how many vehicles to serve from it
+
+    Policies decide from the arrays of the IntersectionState of the Intersection, rather than by walking its linked list
+    of Directions, so a decision costs a vectorized pass over the directions however large the junction is
+
+    A policy picks the Direction with pick and finds how many vehicles to serve from it with volume, which choose puts
+    together, so a Controller can time the two apart. A policy can instead override choose in full
+    """
+
+    def choose(self, controller) -> tuple:
+        """
+        Picks the Direction to be served in the next cycle of a Controller
+
+        :param controller: Controller object to pick for
+        :return: tuple of the Direction to be served and the int number of vehicles to serve from it
+        """
+        direction = self.pick(controller)
+        return direction, self.volume(direction)
+
+    def pick(self, controller):
+        """
+        Picks the Direction to be served in the next cycle of a Controller, without finding how many vehicles to serve
+
+        :param controller: Controller object to pick for
+        :return: Direction object to be served
+        """
+        raise NotImplementedError
+
+    def volume(self, direction):
+        """
+        Finds the number of vehicles to serve from a Direction that was picked, its cycle volume
+
+        :param direction: Direction object that was picked
+        :return: int for the number of vehicles to serve
+        """
+        return direction.cycle_volume()
+
+    @staticmethod
+    def _pick(controller, weights: ndarray) -> Direction:
+        """
+        Picks the Direction with the largest weight, the first in the list of Directions for ties
+
+        :param controller: Controller object to pick for
+        :param weights: ndarray for the weight of each Direction, by index
+        :return: Direction object as for pick
+        """
+        return controller.intersection.directions[int(np.argmax(weights))]
+
+
+class RoundRobin(SignalPolicy):
+    """
+    Policy serving every Direction in turn by following the linked list, whether or not it is empty, for its cycle
+    volume
+    """
+
+    def pick(self, controller) -> Direction:
+        return controller.next_direction
+
+
+class LongestQueueFirst(SignalPolicy):
+    """
+    Policy serving the Direction with the most vehicles queued, for its cycle volume
+    """
+
+    def pick(self, controller) -> Direction:
+        return SignalPolicy._pick(controller, controller.intersection.state.lengths)
+
+
+class MaxWeight(SignalPolicy):
+    """
+    Policy serving the Direction whose vehicles have waited the longest in total, for its cycle volume
+    """
+
+    def pick(self, controller) -> Direction:
+        return SignalPolicy._pick(controller, controller.intersection.state.cum_waiting_times())
+
+
+class MaxPressure(SignalPolicy):
+    """
+    Policy serving the Direction with the greatest pressure, the number of vehicles queued less the number queued where
+    they are headed, for its cycle volume. This favours directions whose vehicles have room to move on to
+
+    Attributes
+        downstream: function taking a Controller and returning an ndarray for the number of vehicles queued downstream
+        of each of its Directions, by index. If None then nothing is queued downstream, and the policy serves the
+        longest queue
+    """
+
+    def __init__(self, downstream=None):
+        """
+        Initializer for a MaxPressure object
+
+        :param downstream: function as described for the downstream attribute
+        """
+        self.downstream = downstream
+
+    def pick(self, controller) -> Direction:
+        pressures = controller.intersection.state.lengths
+        if self.downstream is not None:
+            pressures = pressures - self.downstream(controller)
+        return SignalPolicy._pick(controller, pressures)
+
+
+class Phase:
+    """
+    Class representing a phase of a PhasePlan for an Intersection, a group of movements that do not conflict, and so
+    get a green light together
+
+    A phase is served in place of a single Direction, so it has the cycle, next and index that a Controller expects of
+    one. Every Direction of the phase is served at once, each for just the lanes of its movements in the phase, so the
+    cycle lasts as long as the slowest of them
+
+    Attributes
+        plan: PhasePlan object this phase belongs to
+        intersection: Intersection object this phase serves
+        directions: list of the Direction objects with movements in this phase
+        movements: list of the movements of each of directions in this phase, each a list of str, or None for all of
+        its lanes
+        next: Phase object to be served after this one
+        position: int for the position of this phase in the plan
+        index: int for the index of the first Direction of this phase, recorded as the one served
+    """
+
+    def __init__(self, plan, intersection, directions: list, movements: list, position: int = 0):
+        """
+        Initializer for a Phase object
+
+        :param plan: PhasePlan object the phase belongs to
+        :param intersection: Intersection object the phase serves
+        :param directions: list of at least one Direction object of intersection
+        :param movements: list of the movements served for each of directions, as described for the movements
+        attribute
+        :param position: int for the position of the phase in the plan
+        """
+        assert len(directions) > 0, "A phase must serve at least one direction!"
+        self.plan = plan
+        self.intersection = intersection
+        self.directions = directions
+        self.movements = movements
+        self.position = position
+        self.next: Phase = self
+
+    @property
+    def index(self) -> int:
+        """
+        Finds the index of the first Direction of this phase
+
+        :return: int as described
+        """
+        return self.directions[0].index
+
+    def cycle(self, p, should_sleep: bool = False, volume: int = None) -> float:
+        """
+        Serves every Direction of this phase at once, each lane for its own cycle volume
+
+        :param p: the required time for a single vehicle to exit the intersection given a green light
+        :param should_sleep: bool for if the application should sleep in real time for the length of the cycle
+        :param volume: ignored, as each lane served has its own volume
+        :return: float for the total length of this cycle, as for Direction.cycle
+        """
+        cycle_durr = max(direction.cycle(p, volume=None, movements=movements)
+                         for direction, movements in zip(self.directions, self.movements))
+        if should_sleep:
+            sleep(cycle_durr - 2)
+        return cycle_durr
+
+
+class PhasePlan(SignalPolicy):
+    """
+    Policy serving groups of movements that do not conflict in turn, such as the straight lanes of two opposing
+    approaches followed by their left turns, rather than one Direction at a time
+
+    Attributes
+        phases: list of dicts, one for each phase in the order they are served, each from the name of a Direction to
+        the list of movements of its lanes served in the phase, or None for all of them
+    """
+
+    def __init__(self, phases: list):
+        """
+        Initializer for a PhasePlan object
+
+        :param phases: list of dicts as described for the phases attribute, at least one
+        """
+        assert len(phases) > 0, "A plan must have at least one phase!"
+        self.phases = [{name: (None if movements is None else list(movements)) for name, movements in phase.items()}
+                       for phase in phases]
+
+    def resolve(self, intersection) -> list:
+        """
+        Builds the Phase objects of this plan for an Intersection, linked in a ring in the order they are served
+
+        :param intersection: Intersection object to build the phases for
+        :return: list of Phase objects as described
+        """
+        resolved = []
+        for position, phase in enumerate(self.phases):
+            directions = [intersection.get_direction(name) for name in phase]
+            assert all(direction is not None for direction in directions), \
+                "Every direction of a phase must belong to the intersection!"
+            resolved.append(Phase(self, intersection, directions, list(phase.values()), position))
+        for phase, next_phase in zip(resolved, resolved[1:] + resolved[:1]):
+            phase.next = next_phase
+        return resolved
+
+    def pick(self, controller):
+        phase = controller.next_direction
+        if not (isinstance(phase, Phase) and phase.plan is self and phase.intersection is controller.intersection):
+            phase = self.resolve(controller.intersection)[0]
+        return phase
+
+    def volume(self, direction) -> None:
+        # A Phase serves each of its lanes for its own cycle volume
+        return None
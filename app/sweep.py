@@ -0,0 +1,175 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.scenario import build_arrivals
+
+RESULT_FIELDS = ["avg_waiting_time", "mean_avg_waiting_time", "num_vehicles", "clock"]
+MEAN_SAMPLES = 1000
+
+
+def grid_points(grid: dict) -> list:
+    """
+    Finds every point of a parameter grid
+
+    :param grid: dict mapping each parameter to a list of the values it takes
+    :return: list of dicts, each mapping every parameter to one of its values
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def point_key(point: dict) -> str:
+    """
+    Finds the key identifying a point of a parameter grid, independent of the order of the grid
+
+    :param point: dict mapping each parameter to its value
+    :return: str as described
+    """
+    return json.dumps(point, sort_keys=True)
+
+
+def point_seed(point: dict, seed: int) -> np.random.SeedSequence:
+    """
+    Derives the seed that a point of a parameter grid is run with
+
+    The seed depends only on the point itself and the seed of the whole sweep, so a point is run with the same random
+    stream however the grid is laid out or split among workers, and whether or not the sweep has been restarted
+
+    :param point: dict mapping each parameter to its value
+    :param seed: int for the seed of the whole sweep
+    :return: SeedSequence object as described
+    """
+    digest = hashlib.sha256(point_key(point).encode()).digest()
+    return np.random.SeedSequence([seed, int.from_bytes(digest[:16], "little")])
+
+
+def build_controller(scenario: dict, point: dict, rng: np.random.Generator = None) -> Controller:
+    """
+    Builds a Controller for a scenario, with the parameters of a point of a grid applied to it
+
+    A scenario is a dict with a pass_durr and a list of directions, each a dict with a name, and optionally
+    waiting_times, avg_flow, cycle_size and arrivals, as for a Scenario of a single intersection. A parameter of a point
+    can be pass_durr, avg_flow or cycle_size, applying to every direction, or avg_flow.<name> or cycle_size.<name>,
+    applying to the direction of that name
+
+    :param scenario: dict as described
+    :param point: dict mapping each parameter to its value
+    :param rng: Generator for the Intersection to spawn the arrival streams of its Directions from
+    :return: Controller object as described
+    """
+    directions = []
+    for spec in scenario["directions"]:
+        direction = Direction(spec["name"], spec.get("waiting_times", []), 0, spec.get("cycle_size", 0.5),
+                              _arrivals=build_arrivals(spec.get("arrivals"), spec.get("avg_flow", 0)))
+        for attribute in ("avg_flow", "cycle_size"):
+            for name in (attribute, "{}.{}".format(attribute, spec["name"])):
+                if name in point:
+                    setattr(direction, attribute, point[name])
+        directions.append(direction)
+    for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+        direction.next = next_direction
+    return Controller(Intersection(directions[0], rng), point.get("pass_durr", scenario["pass_durr"]))
+
+
+def run_point(scenario: dict, point: dict, n_cycles: int, seed_seq: np.random.SeedSequence) -> dict:
+    """
+    Runs the scenario for a point of a grid
+
+    The mean of the average waiting time is taken over MEAN_SAMPLES samples evenly spread through the run, or every
+    cycle of a shorter run, so the cycles between samples are still run together by kernels.run_cycles
+
+    :param scenario: dict describing the scenario, as for build_controller
+    :param point: dict mapping each parameter to its value
+    :param n_cycles: int for the number of cycles to run
+    :param seed_seq: SeedSequence object for the random stream of this run
+    :return: dict mapping each of RESULT_FIELDS to its value at the end of the run, but for mean_avg_waiting_time
+    """
+    controller = build_controller(scenario, point, np.random.default_rng(seed_seq))
+    intersection = controller.intersection
+    total = [0.0, 0]
+
+    def accumulate(controller: Controller) -> None:
+        """ Adds the current average waiting time to the running total, and counts the sample """
+        total[0] += intersection.avg_waiting_time
+        total[1] += 1
+
+    controller.run(n_cycles, report_every=max(1, n_cycles // MEAN_SAMPLES), report=accumulate)
+    return {"avg_waiting_time": intersection.avg_waiting_time,
+            "mean_avg_waiting_time": total[0] / total[1] if total[1] else 0.0,
+            "num_vehicles": intersection.num_vehicles,
+            "clock": intersection.clock}
+
+
+def drop_partial_row(output_path: str) -> None:
+    """
+    Drops the last row of the output of a sweep if it was only partly written, as when the sweep was interrupted while
+    writing it, so its point is run again rather than being taken as done
+
+    :param output_path: str for the path of the output csv file
+    :return: None
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as file:
+        content = file.read()
+        if content and not content.endswith(b"\n"):
+            file.truncate(content.rfind(b"\n") + 1)
+
+
+def completed_keys(output_path: str) -> set:
+    """
+    Finds the keys of the points already written to the output of a sweep
+
+    :param output_path: str for the path of the output csv file
+    :return: set of str for the keys as described, empty if the output does not exist yet
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline="") as file:
+        return {row["key"] for row in csv.DictReader(file)}
+
+
+def sweep(scenario: dict, grid: dict, n_cycles: int, output_path: str, seed: int = 0, max_workers: int = None) -> int:
+    """
+    Runs a scenario for every point of a parameter grid, spread over a pool of processes
+
+    Each row is written to a csv file as soon as its point finishes, holding the parameters of the point, its key,
+    and its results. If the output already exists, points already written to it are skipped, so an interrupted sweep
+    can be resumed by running it again. A row left partly written by the interruption is dropped first
+
+    :param scenario: dict describing the scenario, as for build_controller
+    :param grid: dict mapping each parameter to a list of the values it takes
+    :param n_cycles: int for the number of cycles to run each point for
+    :param output_path: str for the path of the output csv file
+    :param seed: int for the seed of the whole sweep, that the seed of each point is derived from
+    :param max_workers: int for the number of processes to use, if None then one for each CPU
+    :return: int for the number of points that were run
+    """
+    assert isinstance(n_cycles, int) and n_cycles >= 0, \
+        "Number of cycles must be an integer greater than or equal to zero!"
+    drop_partial_row(output_path)
+    done = completed_keys(output_path)
+    points = [point for point in grid_points(grid) if point_key(point) not in done]
+    fields = sorted(grid) + ["key"] + RESULT_FIELDS
+    is_new = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    with open(output_path, "a", newline="") as file, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        if is_new:
+            writer.writeheader()
+            file.flush()
+        futures = {executor.submit(run_point, scenario, point, n_cycles, point_seed(point, seed)): point
+                   for point in points}
+        for future in as_completed(futures):
+            point = futures[future]
+            writer.writerow(dict(point, key=point_key(point), **future.result()))
+            file.flush()
+    return len(points)
@@ -0,0 +1,216 @@
+import json
+import os
+
+import numpy as np
+from numpy import ndarray
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+META_FILE = "meta.json"
+PARQUET_FILE = "trace.parquet"
+
+
+def column_specs(num_directions: int) -> dict:
+    """
+    Finds the dtype and the shape of a row of each column of a trace
+
+    :param num_directions: int for the number of directions of the intersection traced
+    :return: dict mapping the name of each column to a tuple of its dtype and the shape of a row
+    """
+    return {"cycle": (np.int64, ()), "time": (np.float64, ()), "served": (np.int64, ()),
+            "duration": (np.float64, ()), "queue_lengths": (np.int64, (num_directions,)),
+            "waits": (np.float64, (num_directions,))}
+
+
+class TraceRecorder:
+    """
+    Class to record the time series of a run, a row for each cycle, to files on disk
+
+    Each row holds the number of the cycle, the time it ended, the index of the direction served, its duration, and the
+    queue length and total waiting time of every direction once it ended. Rows are written into preallocated buffers, a
+    column each, which are appended to a raw binary file for each column once chunk_size rows have been recorded, named
+    after the column with a .bin extension, along with META_FILE describing the columns. So memory stays the same
+    however long the run, and a trace can be opened as a memmap of each column, as by Trace. Optionally, each chunk is
+    also written as a row group of a Parquet file, when pyarrow is installed
+
+    The columns of every direction are as wide as the directions given at the start, so the number of directions of the
+    intersection traced must not change during the trace
+
+    Attributes
+        directory: str for the path of the directory the trace is written to
+        names: list of str for the name of each direction
+        chunk_size: int for the number of rows that are buffered before being written
+        num_rows: int for the number of rows written to disk so far
+        columns: dict mapping the name of each column to its buffer
+    """
+
+    def __init__(self, directory: str, names: list, chunk_size: int = 4096, parquet: bool = False):
+        """
+        Initializer for a TraceRecorder object, starting a new trace
+
+        :param directory: str for the path of the directory to write the trace to, created if it does not exist. Any
+        trace already in it is replaced
+        :param names: list of str for the name of each direction, in order of index
+        :param chunk_size: int for the number of rows to be buffered before being written, must be positive
+        :param parquet: bool for if the trace should also be written as a Parquet file, which requires pyarrow
+        """
+        assert isinstance(chunk_size, int) and chunk_size > 0, "Chunk size must be a positive integer!"
+        assert not parquet or pyarrow is not None, "pyarrow must be installed to write a trace as Parquet!"
+        self.directory = directory
+        self.names = list(names)
+        self.chunk_size = chunk_size
+        self.num_rows = 0
+        self.columns = {name: np.zeros((chunk_size,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in column_specs(len(self.names)).items()}
+        self.__num_buffered = 0
+        self.__parquet_writer = None
+        os.makedirs(directory, exist_ok=True)
+        for name in self.columns:
+            open(os.path.join(directory, name + ".bin"), "wb").close()
+        if parquet:
+            fields = [("cycle", pyarrow.int64()), ("time", pyarrow.float64()), ("served", pyarrow.int64()),
+                      ("duration", pyarrow.float64())] \
+                + [("queue_" + name, pyarrow.int64()) for name in self.names] \
+                + [("wait_" + name, pyarrow.float64()) for name in self.names]
+            self.__parquet_writer = pyarrow.parquet.ParquetWriter(os.path.join(directory, PARQUET_FILE),
+                                                                  pyarrow.schema(fields))
+        self.__write_meta()
+
+    def record(self, cycle: int, time: float, served: int, duration: float, queue_lengths: ndarray,
+               waits: ndarray) -> None:
+        """
+        Records the row of a cycle, writing the buffered rows to disk if the buffers are full
+
+        :param cycle: int for the number of the cycle
+        :param time: float for the time the cycle ended
+        :param served: int for the index of the direction served
+        :param duration: float for the duration of the cycle
+        :param queue_lengths: ndarray of ints for the number of vehicles queued for each direction
+        :param waits: ndarray of floats for the total waiting time of each direction
+        :return: None
+        """
+        assert len(queue_lengths) == len(waits) == len(self.names), \
+            "The number of directions must not change during a trace!"
+        row = self.__num_buffered
+        columns = self.columns
+        columns["cycle"][row] = cycle
+        columns["time"][row] = time
+        columns["served"][row] = served
+        columns["duration"][row] = duration
+        columns["queue_lengths"][row] = queue_lengths
+        columns["waits"][row] = waits
+        self.__num_buffered += 1
+        if self.__num_buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to disk
+
+        :return: None
+        """
+        count = self.__num_buffered
+        if count == 0:
+            return
+        for name, buffer in self.columns.items():
+            with open(os.path.join(self.directory, name + ".bin"), "ab") as file:
+                buffer[:count].tofile(file)
+        if self.__parquet_writer is not None:
+            arrays = {name: self.columns[name][:count] for name in ("cycle", "time", "served", "duration")}
+            for index, name in enumerate(self.names):
+                arrays["queue_" + name] = self.columns["queue_lengths"][:count, index]
+                arrays["wait_" + name] = self.columns["waits"][:count, index]
+            self.__parquet_writer.write_table(pyarrow.table(arrays, schema=self.__parquet_writer.schema))
+        self.num_rows += count
+        self.__num_buffered = 0
+        self.__write_meta()
+
+    def close(self) -> None:
+        """
+        Writes any buffered rows to disk and finishes the trace
+
+        :return: None
+        """
+        self.flush()
+        if self.__parquet_writer is not None:
+            self.__parquet_writer.close()
+            self.__parquet_writer = None
+
+    def __write_meta(self) -> None:
+        """
+        Writes the json file describing the trace, so that it can be read up to the last rows written
+
+        :return: None
+        """
+        meta = {"num_rows": self.num_rows, "names": self.names,
+                "columns": {name: {"dtype": np.dtype(dtype).str, "shape": list(shape)}
+                            for name, (dtype, shape) in column_specs(len(self.names)).items()}}
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(path + ".tmp", path)
+
+
+class Trace:
+    """
+    Class to read a trace written by a TraceRecorder, without loading it into memory
+
+    Each column is opened as a read only memmap, so slicing it only reads the rows needed from disk
+
+    Attributes
+        directory: str for the path of the directory of the trace
+        names: list of str for the name of each direction
+        num_rows: int for the number of rows of the trace
+        columns: dict mapping the name of each column to its memmap, of shape (num_rows,) or (num_rows, directions)
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initializer for a Trace object
+
+        :param directory: str for the path of the directory of the trace
+        """
+        with open(os.path.join(directory, META_FILE)) as file:
+            meta = json.load(file)
+        self.directory = directory
+        self.names = meta["names"]
+        self.num_rows = meta["num_rows"]
+        self.columns = {}
+        for name, spec in meta["columns"].items():
+            shape = (self.num_rows,) + tuple(spec["shape"])
+            if self.num_rows == 0:
+                self.columns[name] = np.zeros(shape, dtype=spec["dtype"])
+            else:
+                self.columns[name] = np.memmap(os.path.join(directory, name + ".bin"), dtype=spec["dtype"], mode="r",
+                                               shape=shape)
+
+    def __len__(self) -> int:
+        """
+        Finds the number of rows of this trace
+
+        :return: int as described
+        """
+        return self.num_rows
+
+    def __getitem__(self, column: str) -> ndarray:
+        """
+        Finds a column of this trace
+
+        :param column: str for the name of the column
+        :return: memmap of the column as described
+        """
+        return self.columns[column]
+
+    def direction(self, name: str) -> dict:
+        """
+        Finds the columns of a single direction of this trace
+
+        :param name: str for the name of the direction
+        :return: dict of the queue_lengths and waits columns of the direction, as views into the memmaps
+        """
+        index = self.names.index(name)
+        return {"queue_lengths": self.columns["queue_lengths"][:, index], "waits": self.columns["waits"][:, index]}
@@ -0,0 +1,103 @@
+"""
+Benchmarks of the hot paths of a run, each over a range of queue lengths and numbers of directions, for
+pytest-benchmark
+
+Run with python -m pytest benchmarks/bench_hot_paths.py --benchmark-json benchmarks/baselines/current.json, and compare
+against a baseline with python -m benchmarks.compare check
+"""
+import numpy as np
+import pytest
+
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.lanes import Lanes
+
+pytest.importorskip("pytest_benchmark")
+
+QUEUE_LENGTHS = [10, 1000, 100000]
+DIRECTION_COUNTS = [2, 4, 16]
+LANE_COUNTS = [1, 2, 4, 8]
+
+
+def build_intersection(num_directions: int, queue_length: int) -> Intersection:
+    """
+    Builds an Intersection with the same number of vehicles queued for each direction, waiting for up to 100 each, with
+    seeded arrivals
+
+    :param num_directions: int for the number of directions
+    :param queue_length: int for the number of vehicles queued for each direction
+    :return: Intersection object as described
+    """
+    rng = np.random.default_rng(0)
+    directions = [Direction(str(index), np.sort(rng.uniform(0, 100, queue_length))[::-1], 3, 0.5, [0, index])
+                  for index in range(num_directions)]
+    return Intersection.from_directions(directions)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_direction_cycle(benchmark, queue_length):
+    intersection = build_intersection(4, queue_length)
+    snapshot = Intersection.load_snapshot(intersection.snapshot())
+
+    def setup() -> None:
+        """ Puts the queues back as they were before the last round """
+        intersection.restore(snapshot)
+
+    benchmark.pedantic(intersection.head_direction.cycle, args=(1,), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("num_lanes", LANE_COUNTS)
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_lanes_cycle(benchmark, num_lanes, queue_length):
+    intersection = build_intersection(4, queue_length)
+    if num_lanes > 1:
+        # A single lane takes the path of a Direction without lanes, that the others are compared against
+        head = intersection.head_direction
+        intersection.state.set_lanes(head.index, Lanes([str(lane) for lane in range(num_lanes)]))
+    snapshot = Intersection.load_snapshot(intersection.snapshot())
+
+    def setup() -> None:
+        """ Puts the lanes back as they were before the last round """
+        intersection.restore(snapshot)
+
+    benchmark.pedantic(intersection.head_direction.cycle, args=(1,), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_cycle_volume(benchmark, queue_length):
+    benchmark(build_intersection(4, queue_length).head_direction.cycle_volume)
+
+
+@pytest.mark.parametrize("num_directions", DIRECTION_COUNTS)
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_add_vehicles(benchmark, num_directions, queue_length):
+    benchmark(build_intersection(num_directions, queue_length).add_vehicles)
+
+
+@pytest.mark.parametrize("num_directions", DIRECTION_COUNTS)
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_add_waiting_time(benchmark, num_directions, queue_length):
+    benchmark(build_intersection(num_directions, queue_length).add_waiting_time, 2)
+
+
+@pytest.mark.parametrize("num_directions", DIRECTION_COUNTS)
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_avg_waiting_time(benchmark, num_directions, queue_length):
+    intersection = build_intersection(num_directions, queue_length)
+    benchmark(lambda: intersection.avg_waiting_time)
+
+
+@pytest.mark.parametrize("num_directions", DIRECTION_COUNTS)
+def test_list_is_circular(benchmark, num_directions):
+    benchmark(Intersection.list_is_circular, build_intersection(num_directions, 0).head_direction)
+
+
+@pytest.mark.parametrize("num_directions", DIRECTION_COUNTS)
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_controller_cycle(benchmark, num_directions, queue_length):
+    controller = Controller(build_intersection(num_directions, queue_length), 1)
+    # A first cycle draws the arrivals of a block of cycles ahead, which every round then starts from
+    controller.cycle()
+    snapshot = Intersection.load_snapshot(controller.snapshot())
+    benchmark.pedantic(controller.cycle, setup=lambda: controller.restore(snapshot), rounds=200)
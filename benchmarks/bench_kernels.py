@@ -0,0 +1,66 @@
+"""
+Benchmarks of the kernels of app.kernels under each backend, NumPy and Numba when it is installed, for pytest-benchmark
+
+Run with python -m pytest benchmarks/bench_kernels.py, and group the results by kernel to compare the backends with
+--benchmark-group-by=func
+"""
+import numpy as np
+import pytest
+
+from app import kernels
+from app.controller import Controller
+from app.intersection import Intersection
+
+from benchmarks.bench_hot_paths import build_intersection
+
+pytest.importorskip("pytest_benchmark")
+
+BACKENDS = [pytest.param(backend, marks=pytest.mark.skipif(backend == "numba" and kernels.numba is None,
+                                                           reason="Numba is not installed"))
+            for backend in kernels.BACKENDS]
+QUEUE_LENGTHS = [10, 1000]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    """ Switches to a backend for a benchmark, warming up its kernels so compiling them is not timed """
+    previous = kernels.backend
+    kernels.use_backend(request.param)
+    Controller(build_intersection(4, 10), 1).run(10)
+    yield request.param
+    kernels.use_backend(previous)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_cycle_volume(benchmark, backend, queue_length):
+    benchmark(build_intersection(4, queue_length).state.cycle_volume, 0)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_add_waiting_time(benchmark, backend, queue_length):
+    benchmark(build_intersection(4, queue_length).state.add_waiting_time, 2, 0)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_discharge(benchmark, backend, queue_length):
+    intersection = build_intersection(4, queue_length)
+    snapshot = Intersection.load_snapshot(intersection.snapshot())
+
+    def setup() -> None:
+        """ Puts the queues back as they were before the last round """
+        intersection.restore(snapshot)
+
+    benchmark.pedantic(intersection.state.dequeue, args=(0, queue_length // 2), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("queue_length", QUEUE_LENGTHS)
+def test_insert_arrivals(benchmark, backend, queue_length):
+    benchmark(build_intersection(4, queue_length).state.enqueue_counts, np.array([3, 1, 0, 2]))
+
+
+@pytest.mark.parametrize("num_cycles", [100, 10000])
+def test_run_cycles(benchmark, backend, num_cycles):
+    controller = Controller(build_intersection(4, 10), 1)
+    controller.run(1)
+    snapshot = Intersection.load_snapshot(controller.snapshot())
+    benchmark.pedantic(controller.run, args=(num_cycles,), setup=lambda: controller.restore(snapshot), rounds=5)
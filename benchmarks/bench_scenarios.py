@@ -0,0 +1,24 @@
+"""
+End to end benchmarks of running the default four way intersection for 10^5 and 10^6 cycles, for pytest-benchmark
+
+Run with python -m pytest benchmarks/bench_scenarios.py --benchmark-json benchmarks/baselines/current.json, and compare
+against a baseline with python -m benchmarks.compare check
+"""
+import pytest
+
+from app.main import DEFAULT_SCENARIO
+from app.scenario import Scenario, load_scenario
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("n_cycles", [10 ** 5, 10 ** 6])
+def test_run(benchmark, n_cycles):
+    spec = dict(load_scenario(DEFAULT_SCENARIO), seed=0)
+    controllers = []
+
+    def setup() -> None:
+        """ Builds a fresh Controller for the next round """
+        controllers.append(Scenario(spec).controller)
+
+    benchmark.pedantic(lambda: controllers[-1].run(n_cycles), setup=setup, rounds=1 if n_cycles >= 10 ** 6 else 3)
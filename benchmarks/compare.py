@@ -0,0 +1,126 @@
+"""
+Compares a run of the benchmark suite against a baseline, both saved as json by pytest-benchmark, and fails if any
+benchmark has slowed down by more than a threshold, or was run but is missing from the baseline, so is not gated
+
+Save a run as the baseline with python -m benchmarks.compare save RUN BASELINE, which keeps only the summary statistics
+of each benchmark, then check a later run with python -m benchmarks.compare check BASELINE RUN [--threshold 0.1]
+[--stat median] [--allow-missing]
+"""
+import argparse
+import json
+import os
+import sys
+
+STATS = ["min", "max", "mean", "median", "stddev", "iqr"]
+
+
+def load_stats(path: str, stat: str) -> dict:
+    """
+    Reads a statistic of every benchmark of a run saved as json by pytest-benchmark
+
+    :param path: str for the path of the json file
+    :param stat: str for the statistic to read, one of STATS
+    :return: dict mapping the full name of each benchmark to the statistic, in seconds
+    """
+    with open(path) as file:
+        run = json.load(file)
+    return {benchmark_name(benchmark): benchmark["stats"][stat] for benchmark in run["benchmarks"]}
+
+
+def benchmark_name(benchmark: dict) -> str:
+    """
+    Finds the name of a benchmark, from the name of its file and its own name, so that it is the same however the
+    suite was invoked
+
+    :param benchmark: dict for a benchmark of a run saved by pytest-benchmark
+    :return: str as described
+    """
+    path, _, name = benchmark["fullname"].partition("::")
+    return os.path.basename(path) + "::" + name
+
+
+def save_baseline(run_path: str, baseline_path: str) -> None:
+    """
+    Saves a run as a baseline, keeping the machine and commit it was run on and the summary statistics of each
+    benchmark, but not the timing of every round
+
+    :param run_path: str for the path of the json file of the run
+    :param baseline_path: str for the path to save the baseline to
+    :return: None
+    """
+    with open(run_path) as file:
+        run = json.load(file)
+    for benchmark in run["benchmarks"]:
+        benchmark["stats"].pop("data", None)
+    with open(baseline_path, "w") as file:
+        json.dump(run, file, indent=1)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Compares the timings of the benchmarks run in both a baseline and a current run
+
+    :param baseline: dict mapping the name of each benchmark to its time in the baseline
+    :param current: dict mapping the name of each benchmark to its time in the current run
+    :param threshold: float for the most that a benchmark may slow down by, relative to the baseline
+    :return: list of tuples of (name, baseline time, current time, relative change, if it regressed), one for each
+    benchmark in both runs, in order of name
+    """
+    assert threshold >= 0, "Threshold must be non-negative!"
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        change = current[name] / baseline[name] - 1 if baseline[name] > 0 else 0.0
+        rows.append((name, baseline[name], current[name], change, change > threshold))
+    return rows
+
+
+def main(argv: list = None) -> int:
+    """
+    Prints a table comparing a run of the benchmark suite against a baseline
+
+    :param argv: list of str for the command line arguments, if None then those given to this process are used
+    :return: int for the exit status, 1 if any benchmark regressed past the threshold, or any benchmark of the run is
+    missing from the baseline unless this is allowed, otherwise 0
+    """
+    parser = argparse.ArgumentParser(prog="benchmarks.compare", description="Compares benchmarks against a baseline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    save_parser = subparsers.add_parser("save", help="save a run as a baseline")
+    save_parser.add_argument("run", help="json file of the run, as saved by --benchmark-json")
+    save_parser.add_argument("baseline", help="json file to save the baseline to")
+    check_parser = subparsers.add_parser("check", help="check a run against a baseline")
+    check_parser.add_argument("baseline", help="json file of the baseline")
+    check_parser.add_argument("current", help="json file of the run to check, as saved by --benchmark-json")
+    check_parser.add_argument("--threshold", type=float, default=0.1,
+                              help="most that a benchmark may slow down by, relative to the baseline")
+    check_parser.add_argument("--stat", choices=STATS, default="median", help="statistic of each benchmark to compare")
+    check_parser.add_argument("--allow-missing", action="store_true",
+                              help="only warn about benchmarks of the run that are missing from the baseline, rather "
+                                   "than failing")
+    args = parser.parse_args(argv)
+
+    if args.command == "save":
+        save_baseline(args.run, args.baseline)
+        return 0
+    baseline = load_stats(args.baseline, args.stat)
+    current = load_stats(args.current, args.stat)
+    rows = compare(baseline, current, args.threshold)
+    width = max([len(row[0]) for row in rows] + [9])
+    print("{:<{}} {:>14} {:>14} {:>9}".format("benchmark", width, "baseline (s)", "current (s)", "change"))
+    for name, base, curr, change, regressed in rows:
+        print("{:<{}} {:>14.6g} {:>14.6g} {:>+8.1%}{}".format(name, width, base, curr, change,
+                                                              "  REGRESSED" if regressed else ""))
+    missing = sorted(set(current) - set(baseline))
+    for name in missing:
+        print("{:<{}} MISSING FROM BASELINE".format(name, width))
+    for name in sorted(set(baseline) - set(current)):
+        print("{:<{}} only in the baseline run".format(name, width))
+    regressions = sum(row[4] for row in rows)
+    print("{} of {} benchmarks regressed by more than {:.0%}".format(regressions, len(rows), args.threshold))
+    if missing:
+        print("{} benchmarks of the run are missing from the baseline and were not checked, save a new baseline with "
+              "python -m benchmarks.compare save".format(len(missing)), file=sys.stderr)
+    return 1 if regressions or (missing and not args.allow_missing) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
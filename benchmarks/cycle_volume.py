@@ -0,0 +1,63 @@
+"""
+Benchmark of finding the cycle volume of a Direction, comparing the binary search over prefix sums used by
+IntersectionState against scanning the waiting times one vehicle at a time
+
+Run with python -m benchmarks.cycle_volume
+"""
+from timeit import Timer
+
+import numpy as np
+
+from app.intersection_state import IntersectionState
+
+
+def scan_cycle_volume(waiting_times: np.ndarray, cycle_size: float) -> int:
+    """
+    Finds the cycle volume of a queue by removing vehicles from the front until enough waiting time has been removed
+
+    :param waiting_times: ndarray for the waiting times of the queue, from the front to the back
+    :param cycle_size: float for the proportion of the total waiting time to be left behind
+    :return: int for the cycle volume
+    """
+    curr_total = np.sum(waiting_times)
+    req_total = int(curr_total * cycle_size)
+    volume = 0
+    while curr_total > req_total:
+        curr_total -= waiting_times[volume]
+        volume += 1
+    return volume
+
+
+def time_per_call(func, min_time: float = 0.2) -> float:
+    """
+    Times a function, calling it enough times to take at least min_time seconds
+
+    :param func: function taking no arguments to be timed
+    :param min_time: float for the least total time to be spent timing, in seconds
+    :return: float for the best time for a single call, in seconds
+    """
+    timer = Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main() -> None:
+    """
+    Runs the benchmark for queue lengths from 10 to 10^6, printing a table of the results
+
+    :return: None
+    """
+    print("{:>10} {:>14} {:>14} {:>10}".format("length", "scan (us)", "search (us)", "speedup"))
+    for exponent in range(1, 7):
+        length = 10 ** exponent
+        waiting_times = np.linspace(2 * length, 1, length)
+        state = IntersectionState([waiting_times], [0], [0.5])
+        assert state.cycle_volume(0) == scan_cycle_volume(waiting_times, 0.5)
+        scan = time_per_call(lambda: scan_cycle_volume(waiting_times, 0.5), min_time=0.05)
+        search = time_per_call(lambda: state.cycle_volume(0))
+        print("{:>10} {:>14.2f} {:>14.2f} {:>9.0f}x".format(length, scan * 1e6, search * 1e6, scan / search))
+
+
+if __name__ == '__main__':
+    main()
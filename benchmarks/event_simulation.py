@@ -0,0 +1,48 @@
+"""
+Benchmark of simulating sparse traffic, comparing the fixed cycles of a Controller against an EventSimulation that
+rests its lights while the intersection is empty
+
+Run with python -m benchmarks.event_simulation
+"""
+from time import perf_counter
+
+from app.arrival import PoissonArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.event_simulation import EventSimulation
+from app.intersection import Intersection
+
+
+def build_controller(avg_flow: float) -> Controller:
+    """
+    Builds a Controller for an empty four way intersection, with Poisson arrivals
+
+    :param avg_flow: float for the average number of arrivals per cycle of each direction
+    :return: Controller object as described
+    """
+    directions = [Direction(name, _arrivals=PoissonArrivals(avg_flow)) for name in ("North", "East", "South", "West")]
+    for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+        direction.next = next_direction
+    return Controller(Intersection(directions[0]), 1)
+
+
+def main() -> None:
+    """
+    Runs the benchmark for a day of simulated time at a few flows, printing a table of the results
+
+    :return: None
+    """
+    until_time = 24 * 60 * 60
+    print("{:>10} {:>14} {:>14} {:>10}".format("avg flow", "cycles (s)", "events (s)", "speedup"))
+    for avg_flow in (0.01, 0.1, 1.0):
+        start = perf_counter()
+        build_controller(avg_flow).run(until_time=until_time)
+        fixed = perf_counter() - start
+        start = perf_counter()
+        EventSimulation(build_controller(avg_flow), 60, rest_when_empty=True).run(until_time=until_time)
+        events = perf_counter() - start
+        print("{:>10} {:>14.3f} {:>14.3f} {:>9.1f}x".format(avg_flow, fixed, events, fixed / events))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the memory and time taken to build an intersection of many approaches, all at once with
+Intersection.from_arrays, against linking Directions built one at a time and handing the head to Intersection
+
+Run with python -m benchmarks.footprint
+"""
+import gc
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from app.direction import Direction
+from app.intersection import Intersection
+
+
+def build_linked(num_approaches: int) -> Intersection:
+    """
+    Builds an intersection of empty approaches by linking Directions built one at a time
+
+    :param num_approaches: int for the number of approaches
+    :return: Intersection object as described
+    """
+    directions = [Direction(str(index), [], 1.0) for index in range(num_approaches)]
+    for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+        direction.next = next_direction
+    return Intersection(directions[0])
+
+
+def build_from_arrays(num_approaches: int) -> Intersection:
+    """
+    Builds an intersection of empty approaches all at once with Intersection.from_arrays
+
+    :param num_approaches: int for the number of approaches
+    :return: Intersection object as described
+    """
+    return Intersection.from_arrays([str(index) for index in range(num_approaches)], [()] * num_approaches,
+                                    np.ones(num_approaches))
+
+
+def measure(build, num_approaches: int) -> tuple:
+    """
+    Times building an intersection, and then measures the memory it holds per approach by building it again while
+    tracing allocations, which would slow the timing down
+
+    :param build: function taking the number of approaches and returning an Intersection
+    :param num_approaches: int for the number of approaches
+    :return: tuple of the float number of seconds building took, and the float number of bytes held per approach
+    """
+    start = perf_counter()
+    intersection = build(num_approaches)
+    seconds = perf_counter() - start
+    del intersection
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    intersection = build(num_approaches)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del intersection
+    return seconds, held / num_approaches
+
+
+def main() -> None:
+    """
+    Prints a table of the time taken to build intersections of a few sizes each way, and the memory held per approach
+
+    :return: None
+    """
+    print("{:>12} {:>12} {:>12} {:>16}".format("approaches", "build", "time (s)", "bytes/approach"))
+    for num_approaches in (1000, 10000, 100000):
+        builds = [("from_arrays", build_from_arrays)]
+        # Linking approaches one at a time builds a state for each, and walks the list with a set of nodes, so the
+        # largest size is left out
+        if num_approaches <= 10000:
+            builds.append(("linked", build_linked))
+        for name, build in builds:
+            seconds, per_approach = measure(build, num_approaches)
+            print("{:>12} {:>12} {:>12.3f} {:>16.0f}".format(num_approaches, name, seconds, per_approach))
+
+
+if __name__ == '__main__':
+    main()
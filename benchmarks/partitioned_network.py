@@ -0,0 +1,63 @@
+"""
+Benchmark of running a grid of junctions split into partitions, each run in a process of its own, for a growing number
+of partitions up to the number of CPUs
+
+Run with python -m benchmarks.partitioned_network
+"""
+import multiprocessing
+from time import perf_counter
+
+import numpy as np
+
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.partitioned_network import PartitionedNetwork
+
+
+def build_grid(size: int) -> tuple:
+    """
+    Builds the Controllers and links of a square grid of four way junctions, with vehicles going straight through
+
+    :param size: int for the number of junctions along each side of the grid
+    :return: tuple of the list of Controllers and the list of links
+    """
+    controllers = []
+    for j in range(size * size):
+        directions = [Direction(name, [], 1) for name in ("North", "East", "South", "West")]
+        for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+            direction.next = next_direction
+        controllers.append(Controller(Intersection(directions[0], np.random.default_rng([0, j])), 1))
+    links = []
+    for row in range(size):
+        for col in range(size - 1):
+            links.append((row * size + col, "West", row * size + col + 1, "West", 2))
+            links.append((row * size + col + 1, "East", row * size + col, "East", 2))
+            links.append((col * size + row, "North", (col + 1) * size + row, "North", 2))
+            links.append(((col + 1) * size + row, "South", col * size + row, "South", 2))
+    return controllers, links
+
+
+def main() -> None:
+    """
+    Runs the benchmark on a 100 by 100 grid, printing a table of the results
+
+    :return: None
+    """
+    controllers, links = build_grid(100)
+    n_steps = 200
+    print("{:>10} {:>14} {:>10}".format("partitions", "time (s)", "speedup"))
+    base = None
+    num_partitions = 1
+    while num_partitions <= multiprocessing.cpu_count():
+        network = PartitionedNetwork(controllers, links, num_partitions)
+        start = perf_counter()
+        network.run(n_steps)
+        elapsed = perf_counter() - start
+        base = base if base is not None else elapsed
+        print("{:>10} {:>14.3f} {:>9.2f}x".format(num_partitions, elapsed, base / elapsed))
+        num_partitions *= 2
+
+
+if __name__ == '__main__':
+    main()
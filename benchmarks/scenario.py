@@ -0,0 +1,59 @@
+"""
+Benchmark of building a large network of intersections from a scenario, a grid of four way intersections with each
+approach fed by the neighbouring intersection
+
+Run with python -m benchmarks.scenario
+"""
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from app.scenario import Scenario, load_scenario
+
+
+def grid_scenario(side: int) -> dict:
+    """
+    Describes a square grid of four way intersections, each linked to its neighbours
+
+    :param side: int for the number of intersections along each side of the grid
+    :return: dict describing the scenario, as for Scenario
+    """
+    names = ("North", "East", "South", "West")
+    intersections = [{"name": "{},{}".format(row, col), "directions": [{"name": name} for name in names]}
+                     for row in range(side) for col in range(side)]
+    links = []
+    for row in range(side):
+        for col in range(side):
+            junction = row * side + col
+            if col + 1 < side:
+                links.append([junction, "East", junction + 1, "West", 3])
+                links.append([junction + 1, "West", junction, "East", 3])
+            if row + 1 < side:
+                links.append([junction, "South", junction + side, "North", 3])
+                links.append([junction + side, "North", junction, "South", 3])
+    return {"seed": 0, "pass_durr": 1, "policy": "round_robin", "arrivals": {"kind": "poisson", "avg_flow": 1.5},
+            "intersections": intersections, "links": links}
+
+
+def main() -> None:
+    """
+    Writes grid scenarios of a few sizes to json, and times reading and building each, printing a table of the results
+
+    :return: None
+    """
+    print("{:>10} {:>12} {:>12}".format("junctions", "read (s)", "build (s)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for side in (10, 32, 100):
+            path = os.path.join(directory, "grid.json")
+            with open(path, "w") as file:
+                json.dump(grid_scenario(side), file)
+            start = perf_counter()
+            spec = load_scenario(path)
+            read = perf_counter() - start
+            scenario = Scenario(spec)
+            print("{:>10} {:>12.3f} {:>12.3f}".format(len(scenario.controllers), read, scenario.build_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from app.arrival import NormalArrivals, PoissonArrivals, TimeOfDayArrivals, ReplayArrivals
+
+
+class TestArrival(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(1)
+
+    def test_normal_arrivals(self):
+        arrivals = NormalArrivals(3).sample(1000, self.rng)
+        self.assertEqual((1000,), arrivals.shape)
+        self.assertTrue(np.all(arrivals >= 0))
+        # Rounding down takes half a vehicle off the mean
+        self.assertAlmostEqual(2.5, arrivals.mean(), delta=0.2)
+
+        # Test sampling replicas
+        self.assertEqual((10, 4), NormalArrivals(3).sample(10, self.rng, 4).shape)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, NormalArrivals(3).sample, -1, self.rng)
+
+    def test_poisson_arrivals(self):
+        arrivals = PoissonArrivals(5).sample(2000, self.rng)
+        self.assertAlmostEqual(5, arrivals.mean(), delta=0.2)
+        self.assertAlmostEqual(5, arrivals.var(), delta=0.6)
+        self.assertTrue(np.array_equal(np.zeros(10), PoissonArrivals(0).sample(10, self.rng)))
+        self.assertRaises(AssertionError, PoissonArrivals, -1)
+
+    def test_time_of_day_arrivals(self):
+        # A day of 10 cycles, with a peak from cycle 4 to 6
+        arrivals_1 = TimeOfDayArrivals([0, 4, 7], [0, 100, 0], 10)
+        self.assertAlmostEqual(30, arrivals_1.avg_flow)
+        self.assertTrue(np.array_equal([0, 100, 100, 0, 0], arrivals_1.rates_for(np.array([3, 4, 6, 7, 13]))))
+
+        # Test that samples carry on through the day, and over into the next
+        first = arrivals_1.sample(6, self.rng)
+        second = arrivals_1.sample(8, self.rng, 3)
+        self.assertTrue(np.array_equal([0] * 4, first[:4]))
+        self.assertTrue(np.all(first[4:] > 50))
+        self.assertTrue(np.all(second[0] > 50))
+        self.assertTrue(np.array_equal(np.zeros((7, 3)), second[1:]))
+        self.assertEqual(14, arrivals_1.cycle)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, TimeOfDayArrivals, [1, 4], [1, 2], 10)
+        self.assertRaises(AssertionError, TimeOfDayArrivals, [0, 4], [1], 10)
+        self.assertRaises(AssertionError, TimeOfDayArrivals, [0, 4], [1, 2], 4)
+
+    def test_replay_arrivals(self):
+        # Test with looping
+        arrivals_1 = ReplayArrivals([1, 2, 3])
+        self.assertTrue(np.array_equal([1, 2], arrivals_1.sample(2, self.rng)))
+        self.assertTrue(np.array_equal([[3, 3], [1, 1]], arrivals_1.sample(2, self.rng, 2)))
+
+        # Test without looping
+        arrivals_2 = ReplayArrivals([1, 2, 3], loop=False)
+        self.assertTrue(arrivals_2.can_arrive)
+        self.assertTrue(np.array_equal([1, 2], arrivals_2.sample(2, self.rng)))
+        # Test that sampling past the end pads with no arrivals
+        self.assertTrue(np.array_equal([[3], [0], [0]], arrivals_2.sample(3, self.rng, 1)))
+        self.assertFalse(arrivals_2.can_arrive)
+        self.assertTrue(np.array_equal(np.zeros(4), arrivals_2.sample(4, self.rng)))
+        self.assertRaises(AssertionError, ReplayArrivals, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import unittest
+
+from app.arrival import ReplayArrivals
+from app.async_controller import AsyncController, Supervisor
+from app.direction import Direction
+from app.intersection import Intersection
+from app.signal_policy import SignalPolicy
+
+
+def build_controller(time_scale: float) -> AsyncController:
+    """ Builds an AsyncController for a two way intersection without arrivals, whose first two cycles last 4 and 5 """
+    north = Direction("North", [8, 6, 5, 2, 1], _arrivals=ReplayArrivals([0]))
+    east = Direction("East", [3, 2, 2, 1, 0], _arrivals=ReplayArrivals([0]))
+    north.next = east
+    east.next = north
+    return AsyncController(Intersection(north), 1, time_scale)
+
+
+class AlwaysFirst(SignalPolicy):
+    """ Policy always serving the first Direction of an intersection """
+
+    def choose(self, controller) -> tuple:
+        direction = controller.intersection.directions[0]
+        return direction, direction.cycle_volume()
+
+
+class TestAsyncController(unittest.TestCase):
+
+    def test_cycle(self):
+        controller_1 = build_controller(0.01)
+
+        async def cycle_twice() -> float:
+            """ Cycles controller_1 twice, returning the real time taken """
+            start = asyncio.get_running_loop().time()
+            await controller_1.cycle_async()
+            await controller_1.cycle_async()
+            return asyncio.get_running_loop().time() - start
+
+        self.assertGreaterEqual(asyncio.run(cycle_twice()), (4 + 5) * 0.01)
+        self.assertEqual(2, controller_1.num_cycles)
+        self.assertEqual(4 + 5, controller_1.intersection.clock)
+        self.assertRaises(AssertionError, AsyncController, controller_1.intersection, 1, 0)
+
+        # Test that cycle is still run without an event loop, as for any Controller
+        controller_1.cycle()
+        self.assertEqual(3, controller_1.num_cycles)
+
+    def test_policy(self):
+        # Test that the policy is passed on to the Controller, always serving North and leaving East alone
+        intersection_1 = build_controller(0.001).intersection
+        controller_1 = AsyncController(intersection_1, 1, 0.001, AlwaysFirst())
+        self.assertEqual(2, asyncio.run(controller_1.run_async(2)))
+        self.assertEqual(5, intersection_1.directions[1].num_vehicles)
+        self.assertLess(intersection_1.directions[0].num_vehicles, 5)
+
+    def test_run_async(self):
+        controller_1 = build_controller(0.001)
+        reports = []
+        self.assertEqual(10, asyncio.run(controller_1.run_async(10, report=reports.append)))
+        self.assertEqual([controller_1] * 10, reports)
+        self.assertRaises(AssertionError, asyncio.run, controller_1.run_async())
+
+    def test_supervisor(self):
+        # Test that intersections are paced concurrently, taking as long as one of them rather than all of them
+        supervisor_1 = Supervisor([build_controller(0.002) for i in range(200)])
+        start = time.monotonic()
+        self.assertEqual([20] * 200, supervisor_1.run(20))
+        elapsed = time.monotonic() - start
+        clock = supervisor_1.controllers[0].intersection.clock
+        self.assertGreaterEqual(elapsed, clock * 0.002)
+        self.assertLess(elapsed, clock * 0.002 * 20)
+        self.assertGreaterEqual(supervisor_1.max_lateness, 0)
+
+        # Test running until a time
+        supervisor_1.run(until_time=clock + 10)
+        for controller in supervisor_1.controllers:
+            self.assertGreaterEqual(controller.intersection.clock, clock + 10)
+
+        self.assertRaises(AssertionError, supervisor_1.add_controller, object())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals, TimeOfDayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+
+
+class TestController(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.north_1 = Direction("North", [8, 6, 5, 2, 1], 3)
+        self.east_1 = Direction("East", [3, 2, 2, 1, 0], 2)
+        self.north_1.next = self.east_1
+        self.east_1.next = self.north_1
+        self.controller_1 = Controller(Intersection(self.north_1), 1)
+
+    def test_cycle(self):
+        # Test that the next direction is emptied and then moved on from
+        self.controller_1.cycle()
+        self.assertIs(self.east_1, self.controller_1.next_direction)
+        self.assertEqual(1, self.controller_1.num_cycles)
+        self.assertEqual(2 + 2, self.controller_1.intersection.clock)
+
+    def test_run(self):
+        # Test with a number of cycles
+        reports = []
+        self.assertEqual(10, self.controller_1.run(10, report_every=4, report=reports.append))
+        self.assertEqual(10, self.controller_1.num_cycles)
+        self.assertEqual([self.controller_1] * 2, reports)
+
+        # Test with a time to run until
+        self.controller_1.run(until_time=self.controller_1.intersection.clock + 100)
+        self.assertGreaterEqual(self.controller_1.intersection.clock, 100)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, self.controller_1.run)
+        self.assertRaises(AssertionError, self.controller_1.run, 1, 1.0)
+        self.assertRaises(AssertionError, self.controller_1.run, -1)
+        self.assertRaises(AssertionError, self.controller_1.run, 1, None, 0, print)
+        self.assertRaises(AssertionError, self.controller_1.run, 1, None, 1)
+
+
+    def test_snapshot(self):
+        # Test that a restored Controller carries on exactly as it would have
+        self.controller_1.run(7)
+        blob = self.controller_1.snapshot()
+        self.controller_1.run(20)
+        clock = self.controller_1.intersection.clock
+        queues = [direction.waiting_times for direction in self.controller_1.intersection.directions]
+        self.controller_1.restore(blob)
+        self.assertEqual(7, self.controller_1.num_cycles)
+        self.assertIs(self.east_1, self.controller_1.next_direction)
+        self.controller_1.run(20)
+        self.assertEqual(clock, self.controller_1.intersection.clock)
+        for direction, queue in zip(self.controller_1.intersection.directions, queues):
+            self.assertTrue(np.array_equal(queue, direction.waiting_times))
+
+    def test_fork(self):
+        self.controller_1.run(7)
+        branch_1 = self.controller_1.fork()
+        branch_2 = self.controller_1.fork(rng=np.random.default_rng(1))
+        self.assertIsNot(self.controller_1.intersection, branch_1.intersection)
+        self.assertEqual(["North", "East"], [direction.name for direction in branch_1.intersection.directions])
+        self.assertEqual("East", branch_1.next_direction.name)
+
+        # Test that a branch draws the same arrivals, unless given a new stream
+        self.controller_1.run(30)
+        branch_1.run(30)
+        branch_2.run(30)
+        self.assertEqual(self.controller_1.intersection.state.cum_waiting_time(),
+                         branch_1.intersection.state.cum_waiting_time())
+        self.assertEqual(self.controller_1.intersection.delay_stats().summary(),
+                         branch_1.intersection.delay_stats().summary())
+        self.assertFalse(np.array_equal(self.north_1.take_arrivals(100),
+                                        branch_2.intersection.head_direction.take_arrivals(100)))
+
+    def test_fork_schedule(self):
+        # Test that a branch with a new stream carries on through the day from the same point as its parent
+        north_1 = Direction("North", [], 0, _arrivals=TimeOfDayArrivals([0, 5], [0, 100], 10), _rng=1)
+        east_1 = Direction("East", [], 0, _arrivals=TimeOfDayArrivals([0, 3], [100, 0], 10), _rng=2)
+        north_1.next = east_1
+        east_1.next = north_1
+        controller_1 = Controller(Intersection(north_1), 1)
+        controller_1.run(7)
+        branch_1 = controller_1.fork(rng=np.random.default_rng(3))
+
+        def upcoming(controller):
+            state = controller.intersection.state
+            return np.vstack((state.arrival_block[state.arrival_pos:],
+                              np.column_stack([direction.take_arrivals(40)
+                                               for direction in controller.intersection.directions])))
+
+        rows_1, rows_2 = upcoming(controller_1), upcoming(branch_1)
+        self.assertTrue(np.array_equal(rows_1 > 0, rows_2 > 0))
+        self.assertFalse(np.array_equal(rows_1, rows_2))
+        for direction_1, direction_2 in zip(controller_1.intersection.directions, branch_1.intersection.directions):
+            self.assertEqual(direction_1.arrivals.cycle, direction_2.arrivals.cycle)
+
+    def test_short_replay(self):
+        # Test that a replay shorter than the arrivals drawn ahead runs past its end with no more arrivals
+        north_1 = Direction("North", [], 0, _arrivals=ReplayArrivals([2, 1, 3], loop=False))
+        east_1 = Direction("East", [], 0, _arrivals=ReplayArrivals([1], loop=False))
+        north_1.next = east_1
+        east_1.next = north_1
+        controller_1 = Controller(Intersection(north_1), 1)
+        controller_1.cycle()
+        self.assertEqual(50, controller_1.run(50))
+        self.assertFalse(north_1.can_arrive or east_1.can_arrive)
+        self.assertEqual(7, controller_1.intersection.state.total_vehicles
+                         + controller_1.intersection.delay_stats().count)
+
+
+if __name__ == '__main__':
+    unittest.main()
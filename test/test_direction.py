@@ -1,5 +1,8 @@
 import unittest
 
+import numpy as np
+
+from app.arrival import PoissonArrivals, ReplayArrivals
 from app.direction import Direction
 
 
@@ -27,6 +30,59 @@ class TestDirection(unittest.TestCase):
         # Test with string input
         self.assertRaises(AssertionError, self.direction_1.add_vehicles, "a string")
 
+    def test_take_arrivals(self):
+        # Test that arrivals are handed out in the order they were drawn, however they are taken
+        self.direction_1.rng = np.random.default_rng(1)
+        arrivals = np.concatenate([self.direction_1.take_arrivals(1), self.direction_1.take_arrivals(5000),
+                                   self.direction_1.take_arrivals(1)])
+        expected = np.abs(np.floor(3 + np.random.default_rng(1).standard_normal(5002)))
+        self.assertTrue(np.array_equal(expected, arrivals))
+
+        # Test that arrivals are reproducible from a seed
+        direction_2 = Direction("direction_2", [], 3, _rng=np.random.default_rng(2))
+        direction_3 = Direction("direction_3", [], 3, _rng=np.random.default_rng(2))
+        for i in range(5):
+            direction_2.add_vehicles()
+            direction_3.add_vehicles()
+        self.assertEqual(len(direction_2), len(direction_3))
+
+    def test_arrivals(self):
+        # Test with a replayed process
+        direction_2 = Direction("direction_2", [], _arrivals=ReplayArrivals([1, 2, 3]))
+        self.assertEqual(2, direction_2.avg_flow)
+        for i in range(4):
+            direction_2.add_vehicles()
+        self.assertEqual(1 + 2 + 3 + 1, len(direction_2))
+
+        # Test that changing the average flow redraws arrivals already drawn
+        self.direction_1.arrivals = PoissonArrivals(0)
+        self.direction_1.add_vehicles()
+        self.direction_1.avg_flow = 1000
+        self.direction_1.add_vehicles()
+        self.assertGreater(len(self.direction_1), 500)
+
+        # Test setting the average flow of a process that does not allow it
+        def set_avg_flow(direction: Direction, val: any) -> None:
+            """ Function to test avg_flow setter"""
+            direction.avg_flow = val
+
+        self.assertRaises(AttributeError, set_avg_flow, direction_2, 3)
+
+    def test_cycle(self):
+        # Test normally, the front vehicles making up half the waiting time are emptied
+        direction_2 = Direction("direction_2", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], 4)
+        self.assertEqual(4, direction_2.cycle_volume())
+        self.assertEqual(4 * 1.5 + 2, direction_2.cycle(1.5))
+        self.assertEqual(6, len(direction_2))
+
+        # Test that the waits of the vehicles served are recorded
+        self.assertEqual(4, direction_2.delays.count)
+        self.assertEqual(11, direction_2.delays.max)
+        self.assertEqual(39 / 4, direction_2.delays.mean)
+
+        # Test with an empty direction, only the time to switch directions is taken
+        self.assertEqual(2, self.direction_1.cycle(1))
+
     def test_cycle_size(self):
         # Test normally
         self.direction_1.cycle_size = 0.1
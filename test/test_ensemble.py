@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.ensemble import Ensemble
+from app.intersection import Intersection
+
+
+class FixedNormal:
+    """ Stand in for a Generator, whose normal draws are always half a vehicle above the mean """
+
+    def normal(self, loc, size=None):
+        return np.broadcast_to(np.asarray(loc) + 0.5, size if size is not None else np.shape(loc)).copy()
+
+    def standard_normal(self, size=None):
+        return self.normal(0.0, size)
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self) -> None:
+        north_1 = Direction("North", [8, 6, 5, 2, 1], 3)
+        east_1 = Direction("East", [3, 2, 2, 1, 0], 2)
+        south_1 = Direction("South", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], 4)
+        north_1.next = east_1
+        east_1.next = south_1
+        south_1.next = north_1
+        self.controller_1 = Controller(Intersection(north_1), 1)
+
+    def test_cycle(self):
+        # Test that with the same arrivals, every replica follows the Controller exactly, including growing the buffer
+        ensemble_1 = Ensemble(self.controller_1, 3)
+        ensemble_1.rng = FixedNormal()
+        for direction in self.controller_1.intersection.directions:
+            direction.rng = FixedNormal()
+        for i in range(60):
+            self.assertTrue(np.allclose(self.controller_1.intersection.avg_waiting_time, ensemble_1.avg_waiting_times))
+            self.assertTrue(np.array_equal([self.controller_1.intersection.num_vehicles] * 3,
+                                           ensemble_1.num_vehicles))
+            self.controller_1.cycle()
+            ensemble_1.cycle()
+        self.assertTrue(np.array_equal([self.controller_1.intersection.clock] * 3, ensemble_1.clocks))
+        self.assertGreater(ensemble_1.state.capacities.max(), 16)
+        ensemble_1.state.verify()
+
+    def test_remove_direction(self):
+        # Test that after removing a direction, moving the last index into its place, every replica serves the
+        # directions in the same order as the Controller, following the linked list rather than their indices
+        directions = [Direction(name, [6, 4, 3, 1], 2, _arrivals=ReplayArrivals([1, 0, 2])) for name in "ABCDE"]
+        controller_1 = Controller(Intersection.from_directions(directions), 1)
+        controller_1.intersection.remove_direction(directions[1])
+        ensemble_1 = Ensemble(controller_1, 2)
+        for i in range(12):
+            self.assertEqual(controller_1.next_direction.index, ensemble_1.next_index)
+            self.assertTrue(np.array_equal([controller_1.intersection.state.lengths] * 2, ensemble_1.lengths))
+            controller_1.cycle()
+            ensemble_1.cycle()
+        self.assertEqual(["A", "C", "D", "E"], [direction.name for direction in controller_1.intersection])
+
+    def test_cycle_volumes(self):
+        ensemble_1 = Ensemble(self.controller_1, 2)
+        for index in range(3):
+            volume = self.controller_1.intersection.state.cycle_volume(index)
+            self.assertTrue(np.array_equal([volume] * 2, ensemble_1.cycle_volumes(index)))
+
+    def test_summary(self):
+        # Test that replicas differ, and the confidence interval covers the mean
+        ensemble_1 = Ensemble(self.controller_1, 50, seed=1)
+        ensemble_1.run(30)
+        self.assertGreater(np.unique(ensemble_1.avg_waiting_times).size, 1)
+        summary = ensemble_1.summary()
+        stat = summary["avg_waiting_time"]
+        self.assertAlmostEqual(ensemble_1.avg_waiting_times.mean(), stat["mean"])
+        self.assertLess(stat["ci_low"], stat["mean"])
+        self.assertGreater(stat["ci_high"], stat["mean"])
+
+        # Test that runs are reproducible with a seed
+        ensemble_2 = Ensemble(self.controller_1, 50, seed=1)
+        ensemble_2.run(30)
+        self.assertTrue(np.array_equal(ensemble_1.avg_waiting_times, ensemble_2.avg_waiting_times))
+
+        # Test with bad input
+        self.assertRaises(AssertionError, ensemble_1.summary, 1)
+        self.assertRaises(AssertionError, Ensemble, self.controller_1, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
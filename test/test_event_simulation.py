@@ -0,0 +1,144 @@
+import copy
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.event_simulation import EventQueue, EventSimulation
+from app.intersection import Intersection
+from app.signal_policy import LongestQueueFirst, PhasePlan
+
+
+class TestEventSimulation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        north_1 = Direction("North", [8, 6, 5, 2, 1], _arrivals=ReplayArrivals([0]))
+        east_1 = Direction("East", [3, 2, 2, 1, 0], _arrivals=ReplayArrivals([0]))
+        south_1 = Direction("South", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], _arrivals=ReplayArrivals([0]))
+        north_1.next = east_1
+        east_1.next = south_1
+        south_1.next = north_1
+        self.controller_1 = Controller(Intersection(north_1), 1)
+
+    def test_event_queue(self):
+        queue_1 = EventQueue()
+        self.assertEqual(float("inf"), queue_1.peek_time())
+        queue_1.push(3.0, 1)
+        queue_1.push(1.0, 2, 0)
+        queue_1.push(1.0, 0, 1)
+        self.assertEqual(3, len(queue_1))
+        self.assertEqual(1.0, queue_1.peek_time())
+
+        # Test that ties come out in the order they were pushed
+        self.assertEqual((1.0, 2, 0), queue_1.pop())
+        self.assertEqual((1.0, 0, 1), queue_1.pop())
+        self.assertEqual((3.0, 1, None), queue_1.pop())
+
+    def test_run(self):
+        # Test that without arrivals, phases follow the cycles of a Controller exactly. A phase ends as its last
+        # vehicle leaves, the switch before the next phase being the last 2 seconds of a Controller cycle
+        controller_2 = copy.deepcopy(self.controller_1)
+        simulation_1 = EventSimulation(self.controller_1, 10)
+        for i in range(12):
+            simulation_1.run(1)
+            controller_2.cycle()
+            self.assertEqual(controller_2.num_cycles, self.controller_1.num_cycles)
+            self.assertEqual(controller_2.next_direction.name, self.controller_1.next_direction.name)
+            self.assertEqual(controller_2.intersection.clock, simulation_1.clock + 2)
+            for direction_1, direction_2 in zip(self.controller_1.intersection.directions,
+                                                controller_2.intersection.directions):
+                self.assertTrue(np.array_equal(direction_2.waiting_times, direction_1.waiting_times + 2))
+
+        # Test with bad input
+        self.assertRaises(AssertionError, simulation_1.run)
+        self.assertRaises(AssertionError, simulation_1.run, -1)
+        self.assertRaises(AssertionError, EventSimulation, self.controller_1, 0)
+
+    def test_policy(self):
+        # Test that the policy of the Controller picks the direction of each phase, as it does each cycle
+        self.controller_1.policy = LongestQueueFirst()
+        controller_2 = copy.deepcopy(self.controller_1)
+        simulation_1 = EventSimulation(self.controller_1, 10)
+        simulation_1.run(1)
+        self.assertEqual([5, 5], [direction.num_vehicles for direction in self.controller_1.intersection.directions[:2]])
+        self.assertLess(self.controller_1.intersection.get_direction("South").num_vehicles, 10)
+        self.assertEqual("North", self.controller_1.next_direction.name)
+        controller_2.cycle()
+        for i in range(8):
+            simulation_1.run(1)
+            controller_2.cycle()
+            self.assertEqual(controller_2.next_direction.name, self.controller_1.next_direction.name)
+            for direction_1, direction_2 in zip(self.controller_1.intersection.directions,
+                                                controller_2.intersection.directions):
+                self.assertTrue(np.array_equal(direction_2.waiting_times, direction_1.waiting_times + 2))
+
+        # Test that a plan of phases is rejected
+        self.controller_1.policy = PhasePlan([{"North": None}])
+        self.assertRaises(AssertionError, EventSimulation, self.controller_1, 10)
+
+    def test_departures(self):
+        # Test that vehicles leave one at a time, North serving 8 and 6 at times 1 and 2
+        simulation_1 = EventSimulation(self.controller_1, 10)
+        simulation_1.run(until_time=1)
+        self.assertEqual(1, simulation_1.num_served)
+        self.assertEqual(9, simulation_1.served_waiting_time)
+        self.assertEqual(4, self.controller_1.intersection.directions[0].num_vehicles)
+        simulation_1.run(until_time=1.5)
+        self.assertEqual(1.5, simulation_1.clock)
+        simulation_1.run(until_time=3.9)
+        self.assertEqual(2, simulation_1.num_served)
+        self.assertEqual(8.5, simulation_1.avg_served_waiting_time)
+        self.assertEqual(1, self.controller_1.num_cycles)
+
+    def test_arrivals(self):
+        # Test that the vehicles of an arrival period arrive one at a time within it
+        for direction in self.controller_1.intersection.directions:
+            direction.waiting_times = []
+        self.controller_1.intersection.directions[1].arrivals = ReplayArrivals([3, 0])
+        simulation_1 = EventSimulation(self.controller_1, 1000, rest_when_empty=True)
+        simulation_1.run(until_time=999.99)
+        self.assertEqual(3, simulation_1.num_served + self.controller_1.intersection.num_vehicles)
+
+    def test_rest_when_empty(self):
+        for direction in self.controller_1.intersection.directions:
+            direction.waiting_times = []
+
+        # Test that the lights keep switching between empty directions without resting
+        simulation_1 = EventSimulation(copy.deepcopy(self.controller_1), 10)
+        simulation_1.run(until_time=1000)
+        self.assertEqual(501, simulation_1.controller.num_cycles)
+
+        # Test that resting skips straight from one arrival period to the next
+        simulation_2 = EventSimulation(self.controller_1, 10, rest_when_empty=True)
+        self.assertEqual(102, simulation_2.run(until_time=1000))
+        self.assertEqual(0, self.controller_1.num_cycles)
+        self.assertEqual(1000, simulation_2.clock)
+
+        # Test that an arrival wakes the lights up, serving the new vehicle
+        self.controller_1.intersection.directions[2].arrivals = ReplayArrivals([1] + [0] * 100)
+        simulation_2.run(until_time=1100)
+        self.assertEqual(1, simulation_2.num_served)
+        self.assertEqual(0, self.controller_1.intersection.num_vehicles)
+
+    def test_stalled(self):
+        # Test that running for cycles stops once the lights rest with no vehicle able to arrive
+        for direction in self.controller_1.intersection.directions:
+            direction.waiting_times = []
+        simulation_1 = EventSimulation(self.controller_1, 10, rest_when_empty=True)
+        self.assertFalse(simulation_1.stalled)
+        self.assertEqual(2, simulation_1.run(n_cycles=1))
+        self.assertTrue(simulation_1.stalled)
+        self.assertEqual(0, self.controller_1.num_cycles)
+
+        # Test that the lights are not stalled while a vehicle could still arrive
+        self.controller_1.intersection.directions[0].arrivals = ReplayArrivals([0, 0, 1])
+        self.assertFalse(simulation_1.stalled)
+        simulation_1.run(n_cycles=1)
+        self.assertEqual(1, simulation_1.num_served + self.controller_1.intersection.num_vehicles)
+        self.assertEqual(1, self.controller_1.num_cycles)
+
+
+if __name__ == '__main__':
+    unittest.main()
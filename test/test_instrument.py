@@ -0,0 +1,134 @@
+import cProfile
+import itertools
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from app.controller import Controller
+from app.direction import Direction
+from app.instrument import Instruments, PhaseStats, write_profile
+from app.intersection import Intersection
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self) -> None:
+        north_1 = Direction("North", [8, 6, 5, 2, 1], 3, _rng=0)
+        east_1 = Direction("East", [3, 2, 2, 1, 0], 2, _rng=1)
+        north_1.next = east_1
+        east_1.next = north_1
+        self.controller_1 = Controller(Intersection(north_1), 1)
+
+    def test_phase_stats(self):
+        stats_1 = PhaseStats()
+        self.assertEqual(0, stats_1.quantile(0.5))
+        for duration in [100, 200, 300, 5000]:
+            stats_1.record(duration)
+        self.assertEqual((4, 5600, 5000), (stats_1.count, stats_1.total_ns, stats_1.max_ns))
+        # Test that quantiles are found to within a factor of two
+        self.assertTrue(200 <= stats_1.quantile(0.5) <= 400)
+        self.assertEqual(5000, stats_1.quantile(1))
+        self.assertRaises(AssertionError, stats_1.quantile, 2)
+
+    def test_controller(self):
+        # Test that nothing is timed by default
+        self.assertIsNone(self.controller_1.instruments)
+        self.controller_1.instruments = Instruments()
+        self.controller_1.run(20, report_every=5, report=lambda controller: None)
+        summary = self.controller_1.instruments.summary()
+        self.assertEqual(["choose", "cycle_volume", "discharge", "add_waiting_time", "add_vehicles", "report"],
+                         list(summary))
+        self.assertEqual([20, 20, 20, 20, 20, 4], [phase["count"] for phase in summary.values()])
+        self.assertAlmostEqual(1, sum(phase["share"] for phase in summary.values()))
+        self.assertTrue(all(phase["max_us"] >= phase["mean_us"] > 0 for phase in summary.values()))
+        self.assertNotIn("max_alloc_kib", summary["choose"])
+        self.assertEqual(7, len(self.controller_1.instruments.report().splitlines()))
+
+    def test_track_allocations(self):
+        instruments_1 = Instruments(track_allocations=True)
+        self.controller_1.instruments = instruments_1
+        self.controller_1.run(10)
+        instruments_1.close()
+        summary = instruments_1.summary()
+        self.assertTrue(all(phase["max_alloc_kib"] >= phase["mean_alloc_kib"] >= 0 for phase in summary.values()))
+        self.assertIn("max (KiB)", instruments_1.report())
+
+    def test_write_profile(self):
+        # Test profiling a real run, with the kernels and instruments it calls, each timed phase being reported
+        self.controller_1.instruments = Instruments()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.prof")
+            profile = cProfile.Profile()
+            profile.enable()
+            self.controller_1.run(50, report_every=10, report=lambda controller: controller.intersection.avg_waiting_time)
+            self.controller_1.instruments = None
+            self.controller_1.run(50)
+            profile.disable()
+            write_profile(profile, path)
+            self.assertTrue(os.path.exists(path))
+            with open(path + ".folded") as file:
+                lines = file.read().splitlines()
+            total = sum(self_time for _, _, self_time, _, _ in pstats.Stats(path).stats.values())
+        # Test that every line is a stack of frames and a positive number of microseconds, adding up to the whole run
+        self.assertGreater(len(lines), 0)
+        micros = 0
+        for line in lines:
+            stack, line_micros = line.rsplit(" ", 1)
+            self.assertGreater(int(line_micros), 0)
+            micros += int(line_micros)
+        self.assertLessEqual(micros, total * 1e6)
+        self.assertGreater(micros, total * 1e6 * 0.9)
+        self.assertTrue(any("run_cycles" in line for line in lines))
+        self.assertTrue(any("(pick)" in line for line in lines))
+        self.assertTrue(any("(lap)" in line for line in lines))
+
+    def test_write_profile_paths(self):
+        # Test that a call graph with an exponential number of paths through it is folded quickly, keeping a bounded
+        # number of stacks for each function
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "layers.prof")
+            profile = cProfile.Profile()
+            profile.enable()
+            call_layers(LAYERS)
+            profile.disable()
+            start = time.perf_counter()
+            write_profile(profile, path, max_paths=8)
+            self.assertLess(time.perf_counter() - start, 10)
+            with open(path + ".folded") as file:
+                stacks = [line.rsplit(" ", 1)[0] for line in file.read().splitlines()]
+        for layer in range(1, len(LAYERS)):
+            for function in LAYERS[layer]:
+                ending = [stack for stack in stacks if stack.endswith("(" + function.__name__ + ")")]
+                self.assertLessEqual(len(ending), 8)
+        self.assertTrue(any(stack.startswith("[other callers]") for stack in stacks))
+
+
+def build_layers(num_layers: int, width: int) -> list:
+    """
+    Builds layers of functions, each call of one calling the next function of the next layer in turn. So called width
+    times, every function calls every function of the next layer, giving width ** num_layers paths through few calls
+    """
+    layers = [[] for layer in range(num_layers)]
+    for layer in reversed(range(num_layers)):
+        for position in range(width):
+            def function(layers=layers, layer=layer, calls=itertools.count()) -> int:
+                if layer + 1 == len(layers):
+                    return sum(range(20))
+                return layers[layer + 1][next(calls) % len(layers[layer + 1])]()
+            function.__name__ = "layer{}_{}".format(layer, position)
+            function.__code__ = function.__code__.replace(co_name=function.__name__)
+            layers[layer].append(function)
+    return layers
+
+
+def call_layers(layers: list) -> int:
+    """ Calls every function of the first of a number of layers enough times for every path to be taken """
+    return sum(function() for function in layers[0] for call in range(len(layers[0]) ** 2))
+
+
+LAYERS = build_layers(24, 4)
+
+if __name__ == '__main__':
+    unittest.main()
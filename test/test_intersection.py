@@ -2,6 +2,7 @@ import unittest
 
 import numpy as np
 
+from app.arrival import ReplayArrivals
 from app.direction import Direction
 from app.intersection import Intersection
 
@@ -40,6 +41,126 @@ class TestIntersection(unittest.TestCase):
         self.assertTrue(np.array_equal(north_1.waiting_times, np.add(waiting_times_n_b, prev_cycle_durr)))
         self.assertTrue(np.array_equal(west_1.waiting_times, np.add(waiting_times_w_b, prev_cycle_durr)))
 
+    def test_add_vehicles(self) -> None:
+        def build(seed: int) -> Intersection:
+            """ Builds an intersection like intersection_1, seeded with seed """
+            directions = [Direction(name, [], flow) for name, flow in (("North", 3), ("East", 2), ("South", 4))]
+            for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+                direction.next = next_direction
+            return Intersection(directions[0], np.random.default_rng(seed))
+
+        # Test that arrivals follow each Direction's own stream, spawned from the seed
+        inter_1 = build(1)
+        children = np.random.default_rng(1).spawn(3)
+        for i in range(3):
+            inter_1.add_vehicles()
+        for direction, child in zip(inter_1.directions, children):
+            expected = np.abs(np.floor(direction.avg_flow + child.standard_normal(3))).sum()
+            self.assertEqual(expected, direction.num_vehicles)
+
+        # Test that runs are reproducible from a seed, and differ between seeds
+        inter_2, inter_3 = build(1), build(2)
+        for i in range(3):
+            inter_2.add_vehicles()
+            inter_3.add_vehicles()
+        self.assertTrue(np.array_equal(inter_1.state.lengths, inter_2.state.lengths))
+        self.assertFalse(np.array_equal(inter_1.state.lengths, inter_3.state.lengths))
+
+        # Test that changing a Direction redraws the arrivals the intersection has already drawn for it
+        inter_1.directions[1].arrivals = ReplayArrivals([100])
+        num_vehicles = inter_1.directions[1].num_vehicles
+        inter_1.add_vehicles()
+        self.assertEqual(num_vehicles + 100, inter_1.directions[1].num_vehicles)
+
+    def test_delay_stats(self) -> None:
+        # Test that the delays of every direction are merged
+        self.intersection_1.directions[0].cycle(1)
+        self.intersection_1.directions[2].cycle(1)
+        stats = self.intersection_1.delay_stats()
+        self.assertEqual(2 + 4, stats.count)
+        self.assertEqual(11, stats.max)
+        self.assertAlmostEqual((8 + 6 + 11 + 10 + 9 + 9) / 6, stats.mean)
+
+    def test_from_directions(self) -> None:
+        directions = [Direction(name, [1, 2]) for name in ("North", "East", "South")]
+        inter_1 = Intersection.from_directions(directions)
+        self.assertIs(directions[0], inter_1.head_direction)
+        self.assertIs(directions[0], directions[2].next)
+        self.assertEqual(3, inter_1.num_directions)
+        self.assertEqual(6, inter_1.num_vehicles)
+        self.assertTrue(Intersection.list_is_circular(inter_1.head_direction))
+
+        # Test adding to an intersection built this way
+        inter_1.add_direction(Direction("West", [4]))
+        self.assertEqual(7, inter_1.num_vehicles)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, Intersection.from_directions, [Direction("North")])
+
+    def test_from_arrays(self) -> None:
+        inter_1 = Intersection.from_arrays(["North", "East", "South"], [[8, 6, 5], [], [4]], [1, 2, 3],
+                                           [0.5, 0.25, 0.75], np.random.default_rng(0))
+        self.assertEqual(["North", "East", "South"], [direction.name for direction in inter_1.directions])
+        self.assertIs(inter_1.head_direction, inter_1.directions[2].next)
+        self.assertTrue(np.array_equal([8, 6, 5], inter_1.head_direction.waiting_times))
+        self.assertEqual([1, 2, 3], [direction.avg_flow for direction in inter_1.directions])
+        self.assertEqual(0.25, inter_1.directions[1].cycle_size)
+        self.assertEqual(4, inter_1.num_vehicles)
+        inter_1.state.verify()
+
+        # Test that it runs just like an intersection built a Direction at a time
+        inter_2 = Intersection.from_directions([Direction("North", [8, 6, 5], 1), Direction("East", [], 2, 0.25),
+                                                Direction("South", [4], 3, 0.75)], rng=np.random.default_rng(0))
+        for inter in (inter_1, inter_2):
+            for i in range(10):
+                inter.head_direction.cycle(1)
+                inter.add_waiting_time(3)
+                inter.add_vehicles()
+        self.assertTrue(np.array_equal(inter_2.state.lengths, inter_1.state.lengths))
+        self.assertEqual(inter_2.state.cum_waiting_time(), inter_1.state.cum_waiting_time())
+
+        # Test that nodes have no dict of attributes
+        self.assertRaises(AttributeError, setattr, inter_1, "colour", "red")
+        self.assertRaises(AttributeError, setattr, inter_1.head_direction, "colour", "red")
+
+        # Test with bad input
+        self.assertRaises(AssertionError, Intersection.from_arrays, ["North", "East"], [[1]], [1, 2])
+        self.assertRaises(AssertionError, Intersection.from_arrays, ["North"], [[1]], [1])
+
+    def test_snapshot(self) -> None:
+        inter_1 = self.intersection_1
+        for i in range(5):
+            inter_1.add_waiting_time(3)
+            inter_1.add_vehicles()
+        blob = inter_1.snapshot(self.south_1, 5)
+        queues = [direction.waiting_times for direction in inter_1.directions]
+        arrivals = [direction.take_arrivals(20) for direction in inter_1.directions]
+
+        # Test that restoring puts back the queues, clock and arrivals still to come
+        inter_1.add_waiting_time(7)
+        self.north_1.cycle(1)
+        self.assertEqual((self.south_1, 5), inter_1.restore(blob))
+        self.assertEqual(15, inter_1.clock)
+        for direction, queue, arrival in zip(inter_1.directions, queues, arrivals):
+            self.assertTrue(np.array_equal(queue, direction.waiting_times))
+            self.assertTrue(np.array_equal(arrival, direction.take_arrivals(20)))
+        self.assertEqual(0, self.north_1.delays.count)
+        inter_1.state.verify()
+
+        # Test restoring into another intersection, from decoded arrays
+        directions = [Direction(direction.name) for direction in inter_1.directions]
+        for direction, next_direction in zip(directions, directions[1:] + directions[:1]):
+            direction.next = next_direction
+        inter_2 = Intersection(directions[0])
+        self.assertEqual((None, 0), inter_2.restore(Intersection.snapshot(inter_1)))
+        inter_2.restore(Intersection.load_snapshot(blob))
+        self.assertEqual(inter_1.num_vehicles, inter_2.num_vehicles)
+        self.assertEqual(inter_1.state.cum_waiting_time(), inter_2.state.cum_waiting_time())
+
+        # Test with bad input
+        inter_2.remove_direction(directions[0])
+        self.assertRaises(AssertionError, inter_2.restore, blob)
+
     def test_add_direction(self) -> None:
         # Test normally
         new_direction = Direction("new", [1, 1], 3)
@@ -76,6 +197,7 @@ class TestIntersection(unittest.TestCase):
 
         # Test with a direction that is not in the linked list
         self.assertFalse(self.intersection_1.remove_direction(self.north_1))
+        self.assertEqual(3, self.intersection_1.num_directions)
 
         # Test with None input
         self.assertFalse(self.intersection_1.remove_direction(None))
@@ -86,6 +208,53 @@ class TestIntersection(unittest.TestCase):
         self.intersection_1.head_direction = direction_1
         self.assertRaises(AssertionError, self.intersection_1.remove_direction, direction_1)
 
+    def test_ring(self):
+        inter_1 = self.intersection_1
+        for i in range(3):
+            inter_1.add_vehicles()
+        queues = {direction.name: direction.waiting_times for direction in inter_1}
+        for name in ("a", "b", "c"):
+            inter_1.add_direction(Direction(name, [2, 1]))
+            queues[name] = np.array([2.0, 1.0])
+
+        # Test that iterating follows the linked list, however the directions were added and removed
+        self.assertTrue(inter_1.remove_direction(self.west_1))
+        self.assertTrue(inter_1.remove_direction(self.north_1))
+        del queues["East"], queues["North"]
+        order = []
+        curr = inter_1.head_direction
+        for i in range(inter_1.num_directions):
+            order.append(curr.name)
+            curr = curr.next
+        self.assertEqual(["c", "South", "West", "a", "b"], order)
+        self.assertEqual(order, [direction.name for direction in inter_1])
+
+        # Test that every direction keeps its own queue, in a consistent state
+        self.assertEqual(list(range(5)), [direction.index for direction in inter_1.directions])
+        for direction in inter_1:
+            self.assertTrue(np.array_equal(queues[direction.name], direction.waiting_times))
+        self.assertEqual(sum(queue.size for queue in queues.values()), inter_1.num_vehicles)
+        inter_1.state.verify()
+        for i in range(10):
+            inter_1.head_direction.cycle(1)
+            inter_1.add_waiting_time(2)
+            inter_1.add_vehicles()
+        inter_1.state.verify()
+
+        # Test finding directions by name
+        self.assertIs(self.south_1, inter_1.get_direction("South"))
+        self.assertIsNone(inter_1.get_direction("North"))
+        self.assertIn("a", inter_1)
+        self.assertNotIn("East", inter_1)
+        self.assertNotIn(self.west_1, inter_1)
+
+        # Test building from directions given in another order
+        directions = [Direction(name) for name in ("North", "East", "South")]
+        inter_2 = Intersection.from_directions(directions, order=[2, 0, 1])
+        self.assertEqual(["South", "North", "East"], [direction.name for direction in inter_2])
+        self.assertIs(directions[0], directions[2].next)
+        self.assertRaises(AssertionError, Intersection.from_directions, directions, order=[0, 0, 1])
+
     def test___contains__(self):
         # Test with None input
         self.assertFalse(None in self.intersection_1)
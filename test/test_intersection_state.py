@@ -0,0 +1,196 @@
+import unittest
+
+import numpy as np
+
+from app.intersection_state import IntersectionState
+
+
+class TestIntersectionState(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.state_1 = IntersectionState([[8, 6, 5, 2, 1], [3, 2], []], [3, 2, 4], [0.5, 0.5, 0.5])
+
+    def test_queue(self):
+        self.assertTrue(np.array_equal([8, 6, 5, 2, 1], self.state_1.queue(0)))
+        self.assertTrue(np.array_equal([], self.state_1.queue(2)))
+
+        # Test that a copy is returned
+        queue = self.state_1.queue(1)
+        queue += 1
+        self.assertTrue(np.array_equal([3, 2], self.state_1.queue(1)))
+
+    def test_add_waiting_time(self):
+        # Test with all directions, which should only advance the clock
+        buffer = self.state_1.buffer.copy()
+        self.state_1.add_waiting_time(2)
+        self.assertEqual(2, self.state_1.clock)
+        self.assertTrue(np.array_equal(buffer, self.state_1.buffer))
+        self.assertTrue(np.array_equal([10, 8, 7, 4, 3], self.state_1.queue(0)))
+        self.assertTrue(np.array_equal([5, 4], self.state_1.queue(1)))
+        self.assertEqual(0, self.state_1.cum_waiting_time(2))
+
+        # Test with a single direction
+        self.state_1.add_waiting_time(1, 1)
+        self.assertTrue(np.array_equal([6, 5], self.state_1.queue(1)))
+        self.assertEqual(32, self.state_1.cum_waiting_time(0))
+
+    def test_enqueue_and_dequeue(self):
+        # Test enqueuing more vehicles than a segment has room for
+        self.state_1.enqueue(1, np.arange(20))
+        self.assertEqual(22, self.state_1.lengths[1])
+        self.assertTrue(np.array_equal([8, 6, 5, 2, 1], self.state_1.queue(0)))
+        self.assertTrue(np.array_equal(np.concatenate(([3, 2], np.arange(20))), self.state_1.queue(1)))
+
+        # Test dequeuing
+        self.assertTrue(np.array_equal([8, 6], self.state_1.dequeue(0, 2)))
+        self.assertTrue(np.array_equal([5, 2, 1], self.state_1.queue(0)))
+        self.assertRaises(AssertionError, self.state_1.dequeue, 0, 4)
+
+    def test_ring(self):
+        # Test that a queue wraps around its segment without the buffer being reallocated
+        buffer = self.state_1.buffer
+        self.state_1.dequeue(0, 4)
+        self.state_1.enqueue(0, [7, 6, 5, 4, 3, 2])
+        self.assertIs(buffer, self.state_1.buffer)
+        self.assertTrue(np.array_equal([1, 7, 6, 5, 4, 3, 2], self.state_1.queue(0)))
+        self.assertTrue(np.array_equal([1, 7, 6], self.state_1.dequeue(0, 3)))
+        self.assertEqual(14, self.state_1.cum_waiting_time(0))
+
+        # Test growing a segment that has wrapped around
+        self.state_1.enqueue_counts(np.array([10, 0, 0]))
+        self.assertTrue(np.array_equal([5, 4, 3, 2] + [0] * 10, self.state_1.queue(0)))
+        self.assertTrue(np.array_equal([3, 2], self.state_1.queue(1)))
+
+    def test_enqueue_counts(self):
+        self.state_1.enqueue_counts(np.array([1, 0, 10]))
+        self.assertTrue(np.array_equal([6, 2, 10], self.state_1.lengths))
+        self.assertTrue(np.array_equal([8, 6, 5, 2, 1, 0], self.state_1.queue(0)))
+
+        # Test that arrivals gain waiting time from then on
+        self.state_1.add_waiting_time(1)
+        self.assertEqual(10, self.state_1.cum_waiting_time(2))
+        self.assertEqual(45, self.state_1.cum_waiting_time())
+
+    def test_served_waiting_time(self):
+        def check(state: IntersectionState) -> None:
+            """ Checks the prefix sums of every queue of state against a full recompute """
+            for index in range(state.num_directions):
+                sums = np.concatenate(([0], np.cumsum(state.queue(index))))
+                for count, expected in enumerate(sums):
+                    self.assertAlmostEqual(expected, state.served_waiting_time(index, count))
+
+        check(self.state_1)
+
+        # Test across the clock advancing, serving, arrivals, wrapping around and growing
+        self.state_1.add_waiting_time(3)
+        self.state_1.dequeue(0, 3)
+        self.state_1.enqueue_counts(np.array([5, 1, 2]))
+        check(self.state_1)
+        self.state_1.add_waiting_time(1.5)
+        self.state_1.add_waiting_time(2, 1)
+        self.state_1.enqueue(0, [4, 3])
+        check(self.state_1)
+        self.state_1.enqueue_counts(np.array([20, 0, 0]))
+        self.state_1.add_waiting_time(1)
+        check(self.state_1)
+
+        # Test that the sums start again once a queue is emptied
+        self.state_1.dequeue(2, 2)
+        self.state_1.enqueue(2, [1, 2])
+        self.assertEqual(0, self.state_1.prefix_bases[2])
+        check(self.state_1)
+
+    def test_cycle_volume(self):
+        # Test normally, 22 * 0.5 = 11 must be left, so removing 8 and 6 is enough
+        self.assertEqual(2, self.state_1.cycle_volume(0))
+
+        # Test with an empty queue, and a queue that has not waited at all
+        self.assertEqual(0, self.state_1.cycle_volume(2))
+        self.state_1.enqueue_counts(np.array([0, 0, 4]))
+        self.assertEqual(0, self.state_1.cycle_volume(2))
+
+        # Test against a scan over the waiting times
+        self.state_1.add_waiting_time(2.5)
+        self.state_1.cycle_sizes[:] = [0.1, 0.9, 0.3]
+        for index in range(self.state_1.num_directions):
+            waiting_times = self.state_1.queue(index)
+            curr_total = waiting_times.sum()
+            req_total = int(curr_total * self.state_1.cycle_sizes[index])
+            volume = 0
+            while curr_total > req_total:
+                curr_total -= waiting_times[volume]
+                volume += 1
+            self.assertEqual(volume, self.state_1.cycle_volume(index))
+
+    def test_cum_waiting_times(self):
+        self.assertTrue(np.array_equal([22, 5, 0], self.state_1.cum_waiting_times()))
+        self.assertEqual(27, self.state_1.cum_waiting_time())
+        self.assertEqual(7, self.state_1.num_vehicles)
+
+    def test_build_many(self):
+        # Test that each state is laid out the same as when built on its own
+        queues = [[8, 6, 5, 2, 1], [3, 2], [], list(range(20, 0, -1)), [7]]
+        states = IntersectionState.build_many([3, 2], [len(queue) for queue in queues], np.concatenate(queues),
+                                              [3, 2, 4, 1, 1], [0.5, 0.5, 0.5, 0.3, 0.6])
+        self.assertEqual(2, len(states))
+        for state, built in zip(states, [self.state_1, IntersectionState(queues[3:], [1, 1], [0.3, 0.6])]):
+            for field in ("lengths", "capacities", "offsets", "heads", "buffer", "prefix", "arrival_sums",
+                          "cycle_sizes"):
+                self.assertTrue(np.array_equal(getattr(built, field), getattr(state, field)))
+            self.assertEqual(built.num_vehicles, state.num_vehicles)
+            self.assertEqual(built.cum_waiting_time(), state.cum_waiting_time())
+
+        # Test that states sharing arrays do not change each other
+        states[0].enqueue_counts(np.array([1, 20, 3]))
+        states[0].dequeue(0, 2)
+        self.assertTrue(np.array_equal(queues[3], states[1].queue(0)))
+        self.assertTrue(np.array_equal([7], states[1].queue(1)))
+        states[1].verify()
+
+    def test_counters(self):
+        # Test that the running totals follow every change, checked against a full recompute as they go
+        self.state_1.debug = True
+        self.state_1.enqueue_counts(np.array([2, 0, 3]))
+        self.state_1.add_waiting_time(2)
+        self.state_1.add_waiting_time(1.5, 0)
+        self.state_1.dequeue(0, 4)
+        self.state_1.enqueue(1, np.arange(20))
+        self.state_1.set_queue(2, [4, 4])
+        self.assertEqual(self.state_1.lengths.sum(), self.state_1.num_vehicles)
+        self.assertAlmostEqual(self.state_1.cum_waiting_times().sum(), self.state_1.cum_waiting_time())
+
+        # Test that emptying every queue clears the totals
+        for index in range(self.state_1.num_directions):
+            self.state_1.dequeue(index, int(self.state_1.lengths[index]))
+        self.assertEqual(0, self.state_1.total_arrival_sum)
+
+        # Test that counters out of step are caught
+        self.state_1.total_vehicles += 1
+        self.assertRaises(AssertionError, self.state_1.verify)
+
+
+    def test_add_and_remove_row(self):
+        self.state_1.debug = True
+        self.state_1.add_waiting_time(1)
+        self.assertEqual(3, self.state_1.add_row([4, 3], 1.5, 0.25))
+        self.assertTrue(np.array_equal([4, 3], self.state_1.queue(3)))
+        self.assertEqual((1.5, 0.25), (self.state_1.avg_flows[3], self.state_1.cycle_sizes[3]))
+        self.assertEqual(5 + 2 + 2, self.state_1.num_vehicles)
+
+        # Test that the last row takes the place of the one removed
+        self.state_1.remove_row(0)
+        self.assertEqual(3, self.state_1.num_directions)
+        self.assertTrue(np.array_equal([4, 3], self.state_1.queue(0)))
+        self.assertTrue(np.array_equal([4, 3], self.state_1.queue(1)))
+        self.assertEqual(4, self.state_1.num_vehicles)
+        self.assertAlmostEqual(4 + 3 + 4 + 3, self.state_1.cum_waiting_time())
+
+        # Test that the segment left unused is dropped once the buffer is laid out again
+        self.state_1.enqueue(2, np.zeros(50))
+        self.assertEqual(self.state_1.capacities.sum(), self.state_1.buffer.size)
+        self.assertTrue(np.array_equal([4, 3], self.state_1.queue(0)))
+        self.assertRaises(AssertionError, self.state_1.remove_row, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from app import kernels
+from app.controller import Controller
+from app.direction import Direction
+from app.ensemble import Ensemble
+from app.intersection import Intersection
+from app.intersection_state import IntersectionState
+
+AVAILABLE_BACKENDS = [backend for backend in kernels.BACKENDS if backend != "numba" or kernels.numba is not None]
+
+
+class TestKernels(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.backend = kernels.backend
+
+    def tearDown(self) -> None:
+        kernels.use_backend(self.backend)
+
+    @staticmethod
+    def build_controller() -> Controller:
+        directions = [Direction(name, waiting_times, flow, _rng=index) for index, (name, waiting_times, flow) in
+                      enumerate([("North", [8, 6, 5, 2, 1], 3), ("East", [3, 2, 2, 1, 0], 2),
+                                 ("South", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], 4), ("West", [], 5)])]
+        return Controller(Intersection.from_directions(directions), 1)
+
+    def test_use_backend(self):
+        self.assertRaises(AssertionError, kernels.use_backend, "cython")
+        if kernels.numba is None:
+            self.assertEqual("numpy", kernels.backend)
+            self.assertRaises(AssertionError, kernels.use_backend, "numba")
+
+    def test_kernels(self):
+        # Test that every backend changes a state just as the others do
+        results = []
+        for backend in AVAILABLE_BACKENDS:
+            kernels.use_backend(backend)
+            state = IntersectionState([[8, 6, 5, 2, 1], [3, 2], []], [3, 2, 4], [0.5, 0.25, 0.5])
+            state.add_waiting_time(2)
+            state.enqueue_counts(np.array([3, 20, 1]))
+            state.add_waiting_time(1.5, 1)
+            volumes = [state.cycle_volume(index) for index in range(3)]
+            served = [state.dequeue(index, volume) for index, volume in enumerate(volumes)]
+            state.verify()
+            results.append((volumes, served, [state.queue(index) for index in range(3)], state.cum_waiting_time()))
+        for volumes, served, queues, total in results[1:]:
+            self.assertEqual(results[0][0], volumes)
+            for expected, actual in zip(results[0][1] + results[0][2], served + queues):
+                self.assertTrue(np.allclose(expected, actual))
+            self.assertAlmostEqual(results[0][3], total)
+
+    def test_run_cycles(self):
+        for backend in AVAILABLE_BACKENDS:
+            kernels.use_backend(backend)
+            # Test that running cycles at once gives the same run as running them one at a time
+            fused, single = self.build_controller(), self.build_controller()
+            self.assertEqual(300, fused.run(300))
+            for i in range(300):
+                single.cycle()
+            for controller in (fused, single):
+                controller.intersection.state.verify()
+            self.assertTrue(np.array_equal(single.intersection.state.lengths, fused.intersection.state.lengths))
+            self.assertEqual(single.intersection.clock, fused.intersection.clock)
+            self.assertAlmostEqual(single.intersection.avg_waiting_time, fused.intersection.avg_waiting_time)
+            self.assertIs(fused.intersection.directions[300 % 4], fused.next_direction)
+            self.assertEqual(300, fused.num_cycles)
+            for expected, actual in zip(single.intersection.directions, fused.intersection.directions):
+                self.assertEqual(expected.delays.count, actual.delays.count)
+                self.assertAlmostEqual(expected.delays.mean, actual.delays.mean)
+
+            # Test that reports are still made
+            reports = []
+            fused.run(10, report_every=4, report=lambda controller: reports.append(controller.num_cycles))
+            self.assertEqual([304, 308], reports)
+
+    def test_ensemble(self):
+        # Test that the kernels for many rows, each with its own clock, give the same run under every backend
+        results = []
+        for backend in AVAILABLE_BACKENDS:
+            kernels.use_backend(backend)
+            ensemble_1 = Ensemble(self.build_controller(), 20, seed=3)
+            ensemble_1.run(100)
+            ensemble_1.state.verify()
+            results.append((ensemble_1.lengths.copy(), ensemble_1.clocks.copy(), ensemble_1.avg_waiting_times))
+        for lengths, clocks, avg_waiting_times in results[1:]:
+            self.assertTrue(np.array_equal(results[0][0], lengths))
+            self.assertTrue(np.allclose(results[0][1], clocks))
+            self.assertTrue(np.allclose(results[0][2], avg_waiting_times))
+
+    def test_bad_input(self):
+        state = self.build_controller().intersection.state
+        self.assertRaises(AssertionError, kernels.run_cycles, state, 1, np.array([1, 2, 3, 0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.intersection_state import IntersectionState
+from app.lanes import Lanes
+
+
+class TestLanes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        IntersectionState.debug = True
+        self.north_1 = Direction("North", [8, 6, 5, 2, 1], _arrivals=ReplayArrivals([4]),
+                                 _lanes=Lanes(["left", "straight"], [1, 2]))
+        self.east_1 = Direction("East", [3, 2, 2, 1, 0], _arrivals=ReplayArrivals([1]))
+        self.north_1.next = self.east_1
+        self.east_1.next = self.north_1
+        self.intersection_1 = Intersection(self.north_1)
+
+    def tearDown(self) -> None:
+        IntersectionState.debug = False
+
+    def test_init(self):
+        self.assertRaises(AssertionError, Lanes, ["straight"])
+        self.assertRaises(AssertionError, Lanes, ["left", "left"])
+        self.assertRaises(AssertionError, Lanes, ["left", "straight"], [1, 0])
+        self.assertTrue(np.allclose([0.25, 0.75], Lanes(["left", "straight"], shares=[1, 3]).shares))
+
+    def test_split_and_assign(self):
+        lanes_1 = Lanes(["left", "straight", "right"], shares=[1, 2, 1])
+        self.assertTrue(np.array_equal([1, 3, 1], lanes_1.split(5)))
+        self.assertEqual(0, lanes_1.split(0).sum())
+        # Test that vehicles are interleaved between the lanes rather than filling one first
+        self.assertTrue(np.array_equal([0, 1, 0, 1, 0], Lanes(["left", "straight"]).assign(5)))
+
+    def test_direction(self):
+        self.assertTrue(np.array_equal([8, 5, 1], self.north_1.state.lane_queues(self.north_1.index)[0]))
+        self.assertTrue(np.array_equal([8, 6, 5, 2, 1], self.north_1.waiting_times))
+        self.assertEqual(5, self.north_1.num_vehicles)
+        self.assertEqual(22, self.north_1.cum_waiting_time)
+        self.assertEqual(2, self.north_1.cycle_volume())
+
+        # Test that each lane is emptied for its own cycle volume, the slowest setting the length of the cycle
+        self.assertEqual(3, self.north_1.cycle(1))
+        self.assertEqual(3, self.north_1.num_vehicles)
+        self.assertTrue(np.array_equal([5, 2, 1], self.north_1.waiting_times))
+        self.assertEqual(2, self.north_1.delays.count)
+
+        # Test serving a single movement
+        self.assertEqual(3, self.north_1.cycle(1, movements=["left"]))
+        self.assertTrue(np.array_equal([2, 1], self.north_1.waiting_times))
+
+        # Test that a volume for the whole direction is shared between its lanes
+        self.north_1.waiting_times = [9, 8, 7, 6]
+        self.assertEqual(4, self.north_1.cycle(1, volume=3))
+        self.assertTrue(np.array_equal([6], self.north_1.waiting_times))
+
+    def test_intersection(self):
+        self.intersection_1.add_waiting_time(2)
+        self.assertEqual(32 + 18, self.intersection_1.state.cum_waiting_time())
+        self.north_1.add_waiting_time(1)
+        self.assertTrue(np.array_equal([11, 9, 8, 5, 4], self.north_1.waiting_times))
+        self.intersection_1.add_vehicles()
+        self.assertEqual(9, self.north_1.num_vehicles)
+        self.assertEqual(15, self.intersection_1.num_vehicles)
+        self.assertTrue(np.array_equal([2, 2], self.north_1.lanes.state.lengths - [3, 2]))
+
+        # Test that lanes are kept through snapshots, and by directions moving between intersections
+        blob = self.intersection_1.snapshot()
+        queues = self.north_1.state.lane_queues(self.north_1.index)
+        self.north_1.cycle(1)
+        self.intersection_1.restore(blob)
+        for queue, restored in zip(queues, self.north_1.state.lane_queues(self.north_1.index)):
+            self.assertTrue(np.array_equal(queue, restored))
+        south_1 = Direction("South", [4, 3], _lanes=Lanes(["left", "straight", "right"]))
+        self.intersection_1.add_direction(south_1)
+        self.assertTrue(self.intersection_1.remove_direction(self.north_1))
+        self.assertIsNotNone(south_1.lanes)
+        self.assertTrue(np.array_equal([4, 3], south_1.waiting_times))
+        for queue, detached in zip(queues, self.north_1.state.lane_queues(self.north_1.index)):
+            self.assertTrue(np.array_equal(queue, detached))
+
+    def test_controller(self):
+        controller_1 = Controller(self.intersection_1, 1)
+        controller_1.run(20)
+        self.assertEqual(4 * 20 + 5, self.north_1.num_vehicles + self.north_1.delays.count)
+        branch = controller_1.fork()
+        branch.run(5)
+        controller_1.run(5)
+        self.assertTrue(np.array_equal(controller_1.intersection.state.lengths, branch.intersection.state.lengths))
+        self.assertIsNot(self.north_1.lanes, branch.intersection.get_direction("North").lanes)
+
+
+if __name__ == '__main__':
+    unittest.main()
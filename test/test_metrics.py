@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from app.metrics import QuantileSketch, DelayStats
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.delays = np.random.default_rng(0).exponential(30, 20000)
+
+    def test_quantile_sketch(self):
+        sketch_1 = QuantileSketch(0.01)
+        self.assertTrue(np.isnan(sketch_1.quantile(0.5)))
+        sketch_1.add(self.delays)
+        for q in (0.01, 0.5, 0.95, 0.99, 1):
+            expected = np.quantile(self.delays, q, method="lower")
+            self.assertLessEqual(abs(sketch_1.quantile(q) - expected), 0.0101 * expected)
+
+        # Test with zeros, which are counted on their own
+        sketch_2 = QuantileSketch(0.01)
+        sketch_2.add([0, 0, 0, 5])
+        self.assertEqual(0, sketch_2.quantile(0.5))
+        self.assertAlmostEqual(5, sketch_2.quantile(1), delta=0.05)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, QuantileSketch, 0)
+        self.assertRaises(AssertionError, sketch_1.quantile, 1.5)
+
+    def test_bounded_memory(self):
+        # Test that the lowest buckets are folded together, leaving the high quantiles as accurate as before
+        sketch_1 = QuantileSketch(0.01, max_buckets=100)
+        sketch_1.add(np.geomspace(1e-3, 1e6, 10000))
+        self.assertEqual(100, sketch_1.counts.size)
+        self.assertAlmostEqual(1e6, sketch_1.quantile(1), delta=1e4)
+
+    def test_merge(self):
+        # Test that merging the stats of parts gives the same as adding every delay to one
+        stats_1 = DelayStats()
+        stats_1.add(self.delays)
+        parts = [DelayStats() for i in range(3)]
+        for part, chunk in zip(parts, np.array_split(self.delays, 3)):
+            for cycle in np.array_split(chunk, 500):
+                part.add(cycle)
+        merged = DelayStats()
+        for part in parts:
+            merged.merge(part)
+        self.assertEqual(stats_1.count, merged.count)
+        self.assertAlmostEqual(stats_1.mean, merged.mean)
+        self.assertAlmostEqual(stats_1.variance, merged.variance, places=6)
+        self.assertEqual(stats_1.max, merged.max)
+        self.assertTrue(np.array_equal(stats_1.sketch.counts, merged.sketch.counts))
+        self.assertRaises(AssertionError, merged.sketch.merge, QuantileSketch(0.05))
+
+    def test_delay_stats(self):
+        stats_1 = DelayStats()
+        self.assertTrue(np.isnan(stats_1.max))
+        self.assertEqual(0, stats_1.variance)
+        stats_1.add(np.array([3.0, 1.0]))
+        stats_1.add(np.array([2.0]))
+        self.assertEqual(3, stats_1.count)
+        self.assertEqual(2, stats_1.mean)
+        self.assertEqual(1, stats_1.variance)
+        self.assertEqual(3, stats_1.max)
+        summary = stats_1.summary()
+        self.assertEqual(["count", "mean", "std", "max", "p50", "p95", "p99"], list(summary))
+        self.assertAlmostEqual(2, summary["p50"], delta=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
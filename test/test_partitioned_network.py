@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.partitioned_network import PartitionedNetwork, partition_junctions
+from app.road_network import RoadNetwork
+
+
+def build_corridor(num_junctions: int, seed: int) -> tuple:
+    """ Builds the Controllers and links of a two way corridor, with the arrivals of every junction seeded """
+    controllers = []
+    for j in range(num_junctions):
+        west = Direction("West", [8, 6, 5, 2, 1], 2)
+        east = Direction("East", [3, 2, 2, 1, 0], 1)
+        north = Direction("North", [], 3)
+        west.next = east
+        east.next = north
+        north.next = west
+        controllers.append(Controller(Intersection(west, np.random.default_rng([seed, j])), 1))
+    links = [(j, "West", j + 1, "West", j % 3) for j in range(num_junctions - 1)] \
+        + [(j + 1, "East", j, "East", 1) for j in range(num_junctions - 1)]
+    return controllers, links
+
+
+class TestPartitionedNetwork(unittest.TestCase):
+
+    def test_partition_junctions(self):
+        # Test that a corridor is cut into runs of neighbouring junctions
+        controllers, links = build_corridor(10, 0)
+        self.assertTrue(np.array_equal([0] * 4 + [1] * 3 + [2] * 3, partition_junctions(10, links, 3)))
+
+        # Test that junctions without links are still given a partition
+        self.assertTrue(np.array_equal([0, 0, 1, 1], partition_junctions(4, [], 2)))
+        self.assertRaises(AssertionError, partition_junctions, 4, [], 0)
+
+    def test_run(self):
+        # Test that the results match the network run as a whole, however it is partitioned
+        network_1 = RoadNetwork(*build_corridor(12, 1))
+        network_1.run(40)
+        for partitions in (None, [0, 1] * 6, [2] * 4 + [0] * 4 + [1] * 4):
+            partitioned_1 = PartitionedNetwork(*build_corridor(12, 1), num_partitions=3, partitions=partitions)
+            partitioned_1.run(40)
+            self.assertEqual(len(set(partitions or [0, 1, 2])), partitioned_1.num_partitions)
+            self.assertTrue(np.array_equal(network_1.clocks, partitioned_1.clocks))
+            self.assertTrue(np.array_equal(network_1.num_vehicles, partitioned_1.num_vehicles))
+            self.assertTrue(np.allclose(network_1.cum_waiting_times, partitioned_1.cum_waiting_times))
+            self.assertTrue(np.allclose(network_1.avg_waiting_times, partitioned_1.avg_waiting_times))
+            self.assertEqual(network_1.num_exited, partitioned_1.num_exited)
+            self.assertEqual(network_1.num_in_transit, partitioned_1.num_in_transit)
+
+        # Test that every run starts from the Controllers as given
+        partitioned_1.run(40)
+        self.assertTrue(np.array_equal(network_1.clocks, partitioned_1.clocks))
+        self.assertRaises(AssertionError, partitioned_1.run, -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import copy
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.road_network import RoadNetwork
+
+
+def build_controller(counts: list = (3, 0, 5, 1)) -> Controller:
+    """ Builds a Controller for an intersection with a West and an East approach, replaying recorded arrivals """
+    west = Direction("West", [8, 6, 5, 2, 1], _arrivals=ReplayArrivals(counts))
+    east = Direction("East", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], _arrivals=ReplayArrivals(counts[::-1]))
+    west.next = east
+    east.next = west
+    return Controller(Intersection(west), 1)
+
+
+class TestRoadNetwork(unittest.TestCase):
+
+    def test_step(self):
+        # Test that junctions without links follow their Controllers exactly, including growing the buffer
+        controllers = [build_controller(), build_controller([40])]
+        network_1 = RoadNetwork([build_controller(), build_controller([40])])
+        for i in range(30):
+            network_1.step()
+            for controller in controllers:
+                controller.cycle()
+            self.assertTrue(np.allclose([controller.intersection.avg_waiting_time for controller in controllers],
+                                        network_1.avg_waiting_times))
+            self.assertTrue(np.array_equal([controller.intersection.num_vehicles for controller in controllers],
+                                           network_1.num_vehicles))
+            self.assertTrue(np.array_equal([controller.intersection.clock for controller in controllers],
+                                           network_1.clocks))
+        self.assertTrue(np.allclose(controllers[1].intersection.directions[1].waiting_times, network_1.queue(3)))
+        network_1.state.verify()
+
+    def test_remove_direction(self):
+        # Test that after removing a direction, moving the last index into its place, a junction serves its approaches
+        # in the same order as its Controller, following the linked list rather than their indices
+        directions = [Direction(name, [6, 4, 3, 1], _arrivals=ReplayArrivals([1, 0, 2])) for name in "ABCDE"]
+        controller_1 = Controller(Intersection.from_directions(directions), 1)
+        controller_1.intersection.remove_direction(directions[1])
+        network_1 = RoadNetwork([copy.deepcopy(controller_1)])
+        for i in range(12):
+            self.assertEqual(controller_1.next_direction.index, network_1.phases[0])
+            self.assertTrue(np.array_equal(controller_1.intersection.state.lengths, network_1.lengths))
+            controller_1.cycle()
+            network_1.step()
+
+    def test_links(self):
+        # Test a corridor, where vehicles going East through junction 0 reach the West approach of junction 1
+        network_1 = RoadNetwork([build_controller([0]), build_controller([0])], [(0, "West", 1, "West", 2)])
+        self.assertEqual(2, network_1.downstream[0])
+        self.assertEqual(-1, network_1.downstream[1])
+
+        # Junction 0 first serves 2 vehicles from West, which take 2 steps to reach junction 1
+        network_1.step()
+        self.assertEqual(2, network_1.num_in_transit)
+        self.assertEqual(3, network_1.lengths[0])
+        self.assertEqual(2, network_1.num_exited)
+        self.assertEqual(3, network_1.lengths[2])
+        network_1.step()
+        self.assertEqual(2, network_1.num_in_transit)
+        self.assertEqual(3, network_1.lengths[2])
+
+        # Junction 1 then serves 2 of its 3 West vehicles, as the 2 from junction 0 arrive
+        network_1.step()
+        self.assertEqual(3 - 2 + 2, network_1.lengths[2])
+
+        # Test that vehicles are never lost
+        network_1.run(40)
+        self.assertEqual(30, network_1.num_vehicles.sum() + network_1.num_in_transit + network_1.num_exited)
+
+        # Test with bad input
+        self.assertRaises(AssertionError, RoadNetwork, [build_controller()], [(0, "North", 0, "East", 1)])
+        self.assertRaises(AssertionError, RoadNetwork, [build_controller()], [(0, "West", 0, "East", -1)])
+        self.assertRaises(AssertionError, network_1.run, -1)
+
+    def test_scale(self):
+        # Test a corridor of a thousand junctions, each linked to the next
+        num_junctions = 1000
+        links = [(j, "West", j + 1, "West", 1 + j % 3) for j in range(num_junctions - 1)]
+        network_1 = RoadNetwork([build_controller() for j in range(num_junctions)], links)
+        self.assertEqual(2 * num_junctions, network_1.num_approaches)
+        network_1.run(50)
+        self.assertEqual(50, network_1.num_steps)
+        arrived = num_junctions * (15 + sum(([3, 0, 5, 1] * 13)[:50]) + sum(([1, 5, 0, 3] * 13)[:50]))
+        self.assertEqual(arrived, network_1.num_vehicles.sum() + network_1.num_in_transit + network_1.num_exited)
+
+
+if __name__ == '__main__':
+    unittest.main()
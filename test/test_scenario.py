@@ -0,0 +1,173 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app import main, scenario
+from app.arrival import NormalArrivals, PoissonArrivals, ReplayArrivals
+from app.scenario import Scenario, load_scenario, build_arrivals, build_policy
+from app.signal_policy import RoundRobin, MaxPressure, MaxWeight, PhasePlan
+
+SPEC = {
+    "seed": 7,
+    "pass_durr": 2,
+    "arrivals": {"kind": "poisson", "avg_flow": 1.5},
+    "intersections": [
+        {"name": "A", "policy": "max_pressure", "directions": [
+            {"name": "North", "waiting_times": [8, 6, 5], "avg_flow": 3},
+            {"name": "East", "arrivals": {"kind": "replay", "counts": [1, 2]}, "cycle_size": 0.25},
+        ]},
+        {"name": "B", "pass_durr": 1, "policy": {"kind": "max_weight"}, "directions": [
+            {"name": "West", "waiting_times": [4]},
+            {"name": "South"},
+            {"name": "East"},
+        ]},
+    ],
+    "links": [["A", "East", "B", "West", 3]],
+    "exports": [[1, "East"]],
+}
+
+
+class TestScenario(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_build(self):
+        scenario_1 = Scenario(SPEC)
+        self.assertEqual(["A", "B"], scenario_1.names)
+        self.assertGreater(scenario_1.build_time, 0)
+        a, b = (controller.intersection for controller in scenario_1.controllers)
+        self.assertEqual(["North", "East"], [direction.name for direction in a.directions])
+        self.assertIs(a.directions[0], a.directions[1].next)
+        self.assertTrue(np.array_equal([8, 6, 5], a.directions[0].waiting_times))
+        self.assertEqual((3, 1), (a.num_vehicles, b.num_vehicles))
+        self.assertEqual(0.25, a.directions[1].cycle_size)
+        self.assertEqual([2, 1], [controller.pass_durr for controller in scenario_1.controllers])
+
+        # Test that anything left out is taken from the top level
+        self.assertIsInstance(a.directions[0].arrivals, PoissonArrivals)
+        self.assertEqual(3, a.directions[0].avg_flow)
+        self.assertIsInstance(a.directions[1].arrivals, ReplayArrivals)
+        self.assertEqual(1.5, b.directions[1].avg_flow)
+        self.assertIsInstance(scenario_1.controllers[1].policy, MaxWeight)
+
+        # Test that links are found by name, and seen by a max_pressure policy
+        self.assertEqual([(0, "East", 1, "West", 3)], scenario_1.links)
+        self.assertEqual([(1, "East")], scenario_1.exports)
+        policy = scenario_1.controllers[0].policy
+        self.assertIsInstance(policy, MaxPressure)
+        self.assertTrue(np.array_equal([0, 1], policy.downstream(scenario_1.controllers[0])))
+
+        # Test that the queues are laid out the same as an Intersection builds them
+        a.state.verify()
+        b.state.verify()
+        self.assertEqual(8 + 6 + 5, a.state.cum_waiting_time())
+        scenario_1.controllers[0].run(10)
+        a.state.verify()
+
+    def test_network(self):
+        round_robin = dict(SPEC, intersections=[dict(inter, policy="round_robin") for inter in SPEC["intersections"]])
+        self.assertEqual(2, Scenario(round_robin).network().num_junctions)
+        self.assertEqual(2, Scenario(dict(round_robin, policy="max_weight")).network().num_junctions)
+
+        # Test that a network rejects a policy or lanes it cannot honour
+        self.assertRaises(AssertionError, Scenario(SPEC).network)
+        lanes = [{"movement": "left"}, {"movement": "straight"}]
+        with_lanes = dict(round_robin, intersections=[round_robin["intersections"][0],
+                                                      dict(round_robin["intersections"][1], directions=[
+                                                          {"name": "West", "lanes": lanes}, {"name": "East"}])])
+        self.assertRaises(AssertionError, Scenario(with_lanes).network)
+
+    def test_lanes(self):
+        lanes = [{"movement": "left", "saturation": 0.5, "share": 1}, {"movement": "straight", "share": 3}]
+        scenario_1 = Scenario({"policy": {"kind": "phases", "phases": [{"North": ["straight"], "South": ["straight"]},
+                                                                      {"North": ["left"], "South": ["left"]}]},
+                               "directions": [{"name": "North", "waiting_times": [8, 6, 5, 2], "lanes": lanes},
+                                              {"name": "South", "lanes": lanes}]})
+        controller_1 = scenario_1.controller
+        north = controller_1.intersection.get_direction("North")
+        self.assertEqual(["left", "straight"], north.lanes.movements)
+        self.assertTrue(np.array_equal([0.5, 1], north.lanes.saturations))
+        self.assertTrue(np.array_equal([0.25, 0.75], north.lanes.shares))
+        self.assertTrue(np.array_equal([8, 6, 5, 2], north.waiting_times))
+        self.assertIsInstance(controller_1.policy, PhasePlan)
+        controller_1.run(10)
+        controller_1.intersection.state.verify()
+
+    def test_seed(self):
+        # Test that the arrivals only depend on the scenario
+        arrivals = [[direction.take_arrivals(50) for direction in Scenario(SPEC).controllers[1].intersection.directions]
+                    for i in range(2)]
+        for first, second in zip(*arrivals):
+            self.assertTrue(np.array_equal(first, second))
+        self.assertFalse(np.array_equal(arrivals[0][1], arrivals[0][2]))
+
+    def test_load_scenario(self):
+        json_path = os.path.join(self.dir.name, "scenario.json")
+        with open(json_path, "w") as file:
+            json.dump(SPEC, file)
+        self.assertEqual(SPEC, load_scenario(json_path))
+        toml_path = os.path.join(self.dir.name, "scenario.toml")
+        with open(toml_path, "w") as file:
+            file.write('pass_durr = 1\n[[directions]]\nname = "North"\n[[directions]]\nname = "East"\navg_flow = 2\n')
+        scenario_1 = Scenario.from_file(toml_path)
+        self.assertEqual(2, scenario_1.controller.intersection.num_directions)
+        self.assertIsInstance(scenario_1.controller.policy, RoundRobin)
+        if scenario.yaml is not None:
+            yaml_path = os.path.join(self.dir.name, "scenario.yaml")
+            with open(yaml_path, "w") as file:
+                file.write("directions:\n  - name: North\n  - name: East\n")
+            self.assertEqual(["North", "East"], [d["name"] for d in load_scenario(yaml_path)["directions"]])
+
+        # Test with bad input
+        self.assertRaises(AssertionError, load_scenario, os.path.join(self.dir.name, "scenario.txt"))
+
+    def test_main(self):
+        # Test that a network scenario is run for a number of cycles, rejecting the options it cannot honour
+        path = os.path.join(self.dir.name, "scenario.json")
+        with open(path, "w") as file:
+            json.dump(dict(SPEC, intersections=[dict(inter, policy="round_robin")
+                                                for inter in SPEC["intersections"]]), file)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            main.main(["run", "--cycles", "5", "--scenario", path])
+        self.assertIn("Ran 2 intersections for 5 cycles", output.getvalue())
+        for options in (["--until", "10"], ["--cycles", "5", "--report-every", "1"],
+                        ["--cycles", "5", "--trace", self.dir.name], ["--cycles", "5", "--instrument"],
+                        ["--cycles", "5", "--instrument", "--track-allocations"],
+                        ["--cycles", "5", "--profile", os.path.join(self.dir.name, "run.prof")]):
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()) as errors, \
+                    self.assertRaises(SystemExit):
+                main.main(["run", "--scenario", path] + options)
+            self.assertIn("road network", errors.getvalue())
+
+        # Test that a network scenario with a policy other than round_robin is rejected
+        with open(path, "w") as file:
+            json.dump(SPEC, file)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()) as errors, \
+                self.assertRaises(SystemExit):
+            main.main(["run", "--cycles", "5", "--scenario", path])
+        self.assertIn("intersection A must have no policy other than round_robin", errors.getvalue())
+
+    def test_bad_input(self):
+        self.assertIsInstance(build_arrivals(None, 2), NormalArrivals)
+        self.assertIsInstance(build_policy(), RoundRobin)
+        self.assertRaises(AssertionError, build_arrivals, {"kind": "uniform"})
+        self.assertRaises(AssertionError, build_policy, "fixed_time")
+        self.assertRaises(AssertionError, Scenario, {"intersections": []})
+        self.assertRaises(AssertionError, Scenario, {"directions": [{"name": "North"}]})
+        self.assertRaises(AssertionError, Scenario, {"directions": [{"name": "North"}, {"name": "North"}]})
+        self.assertRaises(AssertionError, Scenario, dict(SPEC, links=[["C", "East", "B", "West", 3]]))
+        with self.assertRaises(AssertionError):
+            Scenario(SPEC).controller
+
+
+if __name__ == '__main__':
+    unittest.main()
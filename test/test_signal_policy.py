@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+
+from app.arrival import ReplayArrivals
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.lanes import Lanes
+from app.signal_policy import RoundRobin, LongestQueueFirst, MaxWeight, MaxPressure, PhasePlan
+
+
+class TestSignalPolicy(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.north_1 = Direction("North", [8, 6, 5, 2, 1], _arrivals=ReplayArrivals([0]))
+        self.east_1 = Direction("East", [3, 2, 2, 1, 0], _arrivals=ReplayArrivals([0]))
+        self.south_1 = Direction("South", [11, 10, 9, 9, 6, 5, 4, 4, 2, 1], _arrivals=ReplayArrivals([0]))
+        self.north_1.next = self.east_1
+        self.east_1.next = self.south_1
+        self.south_1.next = self.north_1
+        self.controller_1 = Controller(Intersection(self.north_1), 1)
+
+    def test_round_robin(self):
+        self.assertEqual((self.north_1, 2), RoundRobin().choose(self.controller_1))
+        self.controller_1.next_direction = self.east_1
+        self.assertEqual((self.east_1, 2), RoundRobin().choose(self.controller_1))
+
+    def test_longest_queue_first(self):
+        self.assertEqual((self.south_1, 4), LongestQueueFirst().choose(self.controller_1))
+
+        # Test that ties go to the first direction
+        self.south_1.waiting_times = [1]
+        self.assertEqual((self.north_1, 2), LongestQueueFirst().choose(self.controller_1))
+
+    def test_max_weight(self):
+        self.assertEqual((self.south_1, 4), MaxWeight().choose(self.controller_1))
+
+        # Test that a single vehicle that has waited long enough wins over a long queue
+        self.east_1.waiting_times = [100]
+        self.assertEqual((self.east_1, 1), MaxWeight().choose(self.controller_1))
+
+    def test_max_pressure(self):
+        # Test that without anything downstream it serves the longest queue
+        self.assertEqual((self.south_1, 4), MaxPressure().choose(self.controller_1))
+
+        # Test with the South approach backed up downstream
+        policy_1 = MaxPressure(lambda controller: np.array([0, 0, 8]))
+        self.assertEqual((self.north_1, 2), policy_1.choose(self.controller_1))
+
+    def test_phase_plan(self):
+        north_1 = Direction("North", [8, 6, 5, 2], _arrivals=ReplayArrivals([0]), _lanes=Lanes(["left", "straight"]))
+        south_1 = Direction("South", [9, 7, 3, 3], _arrivals=ReplayArrivals([0]), _lanes=Lanes(["left", "straight"]))
+        east_1 = Direction("East", [3, 2], _arrivals=ReplayArrivals([0]))
+        intersection_1 = Intersection.from_directions([north_1, south_1, east_1])
+        plan_1 = PhasePlan([{"North": ["straight"], "South": ["straight"]}, {"North": ["left"], "South": ["left"]},
+                            {"East": None}])
+        controller_1 = Controller(intersection_1, 1, plan_1)
+        phase, volume = plan_1.choose(controller_1)
+        self.assertEqual(([north_1, south_1], None), (phase.directions, volume))
+
+        # Test that the straight lanes of opposing approaches are served together, taking as long as the slowest
+        controller_1.cycle()
+        self.assertTrue(np.array_equal([5], north_1.state.lane_queues(north_1.index)[1]))
+        self.assertEqual([3, 3, 2], [len(north_1), len(south_1), len(east_1)])
+        self.assertEqual(1 + 2, intersection_1.clock)
+        self.assertEqual(["left"], controller_1.next_direction.movements[0])
+        controller_1.cycle()
+        controller_1.cycle()
+        self.assertEqual([2, 2, 1], [len(north_1), len(south_1), len(east_1)])
+        self.assertIs(north_1, controller_1.next_direction.directions[0])
+
+        # Test that a plan carries on from the phase of a restored snapshot
+        controller_1.cycle()
+        branch = controller_1.fork()
+        self.assertEqual(["left"], plan_1.choose(branch)[0].movements[0])
+        self.assertRaises(AssertionError, PhasePlan([{"West": None}]).choose, controller_1)
+
+    def test_controller(self):
+        # Test that the Controller serves the direction picked by its policy, moving on from it
+        self.controller_1.policy = LongestQueueFirst()
+        self.controller_1.cycle()
+        self.assertEqual(10 - 4, self.south_1.num_vehicles)
+        self.assertEqual(5, self.north_1.num_vehicles)
+        self.assertIs(self.north_1, self.controller_1.next_direction)
+        self.assertEqual(4 + 2, self.controller_1.intersection.clock)
+
+        # Test that without arrivals the intersection is emptied, never picking an empty direction along the way
+        clock = self.controller_1.intersection.clock
+        self.controller_1.run(until_time=clock + 100)
+        self.assertEqual(0, self.controller_1.intersection.num_vehicles)
+
+
+if __name__ == '__main__':
+    unittest.main()
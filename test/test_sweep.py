@@ -0,0 +1,91 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app import sweep
+
+SCENARIO = {
+    "pass_durr": 1,
+    "directions": [
+        {"name": "North", "waiting_times": [8, 6, 5, 2, 1], "avg_flow": 3},
+        {"name": "East", "waiting_times": [3, 2, 2, 1, 0], "avg_flow": 2},
+    ]
+}
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.dir.name, "sweep.csv")
+        self.grid_1 = {"cycle_size": [0.3, 0.6], "pass_durr": [1, 2], "avg_flow.East": [1, 4]}
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def read_rows(self) -> dict:
+        """ Reads the rows of the output, keyed by the key of their point """
+        with open(self.output_path, newline="") as file:
+            return {row["key"]: row for row in csv.DictReader(file)}
+
+    def test_grid_points(self):
+        points = sweep.grid_points(self.grid_1)
+        self.assertEqual(8, len(points))
+        self.assertIn({"cycle_size": 0.6, "pass_durr": 1, "avg_flow.East": 4}, points)
+
+    def test_build_controller(self):
+        controller = sweep.build_controller(SCENARIO, {"cycle_size": 0.3, "avg_flow.East": 4, "pass_durr": 2})
+        north = controller.intersection.head_direction
+        self.assertEqual(2, controller.pass_durr)
+        self.assertEqual([0.3, 0.3], [north.cycle_size, north.next.cycle_size])
+        self.assertEqual([3, 4], [north.avg_flow, north.next.avg_flow])
+        self.assertIs(north, north.next.next)
+
+    def test_run_point(self):
+        # Test that the mean average waiting time is sampled through a long run, and every cycle of a short one
+        point = {"cycle_size": 0.3}
+        short = sweep.run_point(SCENARIO, point, 50, sweep.point_seed(point, 1))
+        controller = sweep.build_controller(SCENARIO, point, np.random.default_rng(sweep.point_seed(point, 1)))
+        samples = []
+        for i in range(50):
+            controller.cycle()
+            samples.append(controller.intersection.avg_waiting_time)
+        self.assertAlmostEqual(sum(samples) / 50, short["mean_avg_waiting_time"])
+        self.assertEqual(controller.intersection.clock, short["clock"])
+        long = sweep.run_point(SCENARIO, point, 20 * sweep.MEAN_SAMPLES, sweep.point_seed(point, 1))
+        self.assertGreater(long["mean_avg_waiting_time"], 0)
+        self.assertEqual(0.0, sweep.run_point(SCENARIO, point, 0, sweep.point_seed(point, 1))["mean_avg_waiting_time"])
+
+    def test_sweep(self):
+        # Test normally
+        self.assertEqual(8, sweep.sweep(SCENARIO, self.grid_1, 50, self.output_path, seed=1, max_workers=2))
+        rows = self.read_rows()
+        self.assertEqual(8, len(rows))
+
+        # Test that a sweep is resumed, only running points that are not done yet
+        grid_2 = dict(self.grid_1, pass_durr=[1, 2, 3])
+        self.assertEqual(4, sweep.sweep(SCENARIO, grid_2, 50, self.output_path, seed=1, max_workers=2))
+        self.assertEqual(0, sweep.sweep(SCENARIO, grid_2, 50, self.output_path, seed=1, max_workers=2))
+        self.assertEqual(12, len(self.read_rows()))
+
+        # Test that a row left partly written by an interrupted sweep is run again
+        with open(self.output_path) as file:
+            content = file.read()
+        with open(self.output_path, "w", newline="") as file:
+            file.write(content[:content.rindex(",")])
+        self.assertEqual(1, sweep.sweep(SCENARIO, grid_2, 50, self.output_path, seed=1, max_workers=2))
+        with open(self.output_path) as file:
+            self.assertEqual(content.splitlines()[:-1], file.read().splitlines()[:-1])
+        self.assertEqual(12, len(self.read_rows()))
+
+        # Test that results are reproducible, however the grid is laid out
+        os.remove(self.output_path)
+        sweep.sweep(SCENARIO, dict(self.grid_1, pass_durr=[2, 1]), 50, self.output_path, seed=1, max_workers=1)
+        self.assertEqual(rows, self.read_rows())
+
+
+if __name__ == '__main__':
+    unittest.main()
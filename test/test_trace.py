@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app import trace
+from app.controller import Controller
+from app.direction import Direction
+from app.intersection import Intersection
+from app.trace import TraceRecorder, Trace
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temp_dir.name, "trace")
+        self.recorder_1 = TraceRecorder(self.directory, ["North", "East"], chunk_size=4)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def record_rows(self, num_rows: int) -> None:
+        for row in range(num_rows):
+            self.recorder_1.record(row, 2.0 * row, row % 2, 2.0, np.array([row, row + 1]), np.array([0.5 * row, row]))
+
+    def test_record(self):
+        # Test that rows are only written once a chunk is full
+        self.record_rows(3)
+        self.assertEqual(0, len(Trace(self.directory)))
+        self.record_rows(2)
+        self.assertEqual(4, len(Trace(self.directory)))
+        with open(os.path.join(self.directory, trace.META_FILE)) as file:
+            self.assertEqual(4, json.load(file)["num_rows"])
+
+        # Test that closing writes the rest
+        self.recorder_1.close()
+        self.assertEqual(5, len(Trace(self.directory)))
+
+        # Test with bad input
+        self.assertRaises(AssertionError, self.recorder_1.record, 6, 12.0, 0, 2.0, np.array([1]), np.array([0.5]))
+        self.assertRaises(AssertionError, TraceRecorder, self.directory, ["North"], 0)
+        if trace.pyarrow is None:
+            self.assertRaises(AssertionError, TraceRecorder, self.directory, ["North"], 4, True)
+
+    def test_read(self):
+        self.record_rows(10)
+        self.recorder_1.close()
+        trace_1 = Trace(self.directory)
+        self.assertIsInstance(trace_1["time"], np.memmap)
+        self.assertEqual((10, 2), trace_1["queue_lengths"].shape)
+        self.assertTrue(np.array_equal(np.arange(10), trace_1["cycle"]))
+        self.assertTrue(np.array_equal([12.0, 14.0, 16.0], trace_1["time"][6:9]))
+        self.assertTrue(np.array_equal(np.arange(1, 11), trace_1.direction("East")["queue_lengths"]))
+        self.assertTrue(np.array_equal(0.5 * np.arange(10), trace_1.direction("North")["waits"]))
+
+    @unittest.skipIf(trace.pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        recorder_2 = TraceRecorder(self.directory, ["North", "East"], chunk_size=4, parquet=True)
+        for row in range(6):
+            recorder_2.record(row, 2.0 * row, 0, 2.0, np.array([row, row]), np.array([row, row]))
+        recorder_2.close()
+        table = trace.pyarrow.parquet.read_table(os.path.join(self.directory, trace.PARQUET_FILE))
+        self.assertEqual(6, table.num_rows)
+        self.assertEqual(list(range(6)), table.column("queue_East").to_pylist())
+
+    def test_controller(self):
+        # Test that a row is recorded at the end of every cycle of a Controller
+        north_1 = Direction("North", [8, 6, 5, 2, 1], 3)
+        east_1 = Direction("East", [3, 2, 2, 1, 0], 2)
+        north_1.next = east_1
+        east_1.next = north_1
+        controller_1 = Controller(Intersection(north_1), 1)
+        controller_1.trace = TraceRecorder(self.directory, ["North", "East"], chunk_size=4)
+        controller_1.run(9)
+        controller_1.trace.close()
+        trace_1 = Trace(self.directory)
+        self.assertTrue(np.array_equal(np.arange(1, 10), trace_1["cycle"]))
+        self.assertTrue(np.array_equal([0, 1] * 4 + [0], trace_1["served"]))
+        self.assertEqual(controller_1.intersection.clock, trace_1["time"][-1])
+        self.assertTrue(np.array_equal(controller_1.intersection.state.lengths, trace_1["queue_lengths"][-1]))
+        self.assertTrue(np.all(np.diff(trace_1["time"]) > 0))
+
+        # Test that a trace is not carried on once a direction is added
+        controller_1.trace = TraceRecorder(self.directory, ["North", "East"], chunk_size=4)
+        controller_1.intersection.add_direction(Direction("South", [4, 2], 1))
+        self.assertRaises(AssertionError, controller_1.run, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()